@@ -3,16 +3,20 @@ import logging
 import os
 import sys
 
+import yaml
 from kubernetes import client
 from kubernetes.config import list_kube_config_contexts, load_kube_config
 
 from k8s_handle import config
 from k8s_handle import settings
+from k8s_handle import template_graph
 from k8s_handle import templating
-from k8s_handle.exceptions import ProvisioningError, ResourceNotAvailableError
+from k8s_handle.exceptions import DeadlineExceededError, ProvisioningError, ResourceNotAvailableError
 from k8s_handle.filesystem import InvalidYamlError
+from k8s_handle.k8s.api_clients import ApiClientRegistry
 from k8s_handle.k8s.provisioner import Provisioner
 from k8s_handle.k8s.diff import Diff
+from k8s_handle.k8s.warning_handler import WarningHandler
 
 COMMAND_DEPLOY = 'deploy'
 COMMAND_DIFF = 'diff'
@@ -43,21 +47,31 @@ def handler_render(args):
     templating.Renderer(
         settings.TEMPLATES_DIR,
         args.get('tags'),
-        args.get('skip_tags')
+        args.get('skip_tags'),
+        args.get('render_jobs', 1)
     ).generate_by_context(context)
 
 
+def handler_affected(args):
+    sections = template_graph.affected(args.get('since'), args.get('section'), args.get('base_config'),
+                                       args.get('tags'), args.get('skip_tags'))
+    log.info('Affected sections: {}'.format(', '.join(sections) or 'none'))
+    sys.stdout.write(yaml.safe_dump(sections, default_flow_style=False))
+
+
 def handler_diff(args):
     _handler_deploy_destroy(args, COMMAND_DIFF)
 
 
 def _handler_deploy_destroy(args, command):
     context = config.load_context_section(args.get('section'))
+    # rendered templates are passed to the executor in memory, files are written only if they're asked for
     resources = templating.Renderer(
         settings.TEMPLATES_DIR,
         args.get('tags'),
-        args.get('skip_tags')
-    ).generate_by_context(context)
+        args.get('skip_tags'),
+        args.get('render_jobs', 1)
+    ).render_by_context(context, keep=args.get('keep_rendered') or args.get('dry_run'))
 
     if args.get('dry_run'):
         return
@@ -68,7 +82,12 @@ def _handler_deploy_destroy(args, command):
         config.PriorityEvaluator(args, context, os.environ),
         args.get('use_kubeconfig'),
         args.get('sync_mode'),
-        args.get('show_logs')
+        args.get('show_logs'),
+        args.get('parallel', 1),
+        args.get('deferred_wait', False),
+        args.get('timeout'),
+        args.get('server_side_apply', False),
+        args.get('force', False)
     )
 
 
@@ -79,11 +98,17 @@ def _handler_apply_delete(args, command):
         config.PriorityEvaluator(args, {}, os.environ),
         args.get('use_kubeconfig'),
         args.get('sync_mode'),
-        args.get('show_logs')
+        args.get('show_logs'),
+        args.get('parallel', 1),
+        args.get('deferred_wait', False),
+        args.get('timeout'),
+        args.get('server_side_apply', False),
+        args.get('force', False)
     )
 
 
-def _handler_provision(command, resources, priority_evaluator, use_kubeconfig, sync_mode, show_logs):
+def _handler_provision(command, resources, priority_evaluator, use_kubeconfig, sync_mode, show_logs, parallel=1,
+                       deferred_wait=False, timeout=None, server_side_apply=False, force=False):
     kubeconfig_namespace = None
 
     if priority_evaluator.environment_deprecated():
@@ -101,19 +126,23 @@ def _handler_provision(command, resources, priority_evaluator, use_kubeconfig, s
         client.Configuration.set_default(priority_evaluator.k8s_client_configuration())
 
     settings.K8S_NAMESPACE = priority_evaluator.k8s_namespace_default(kubeconfig_namespace)
+    settings.K8S_QPS, settings.K8S_BURST, settings.K8S_MAX_IN_FLIGHT = priority_evaluator.k8s_rate_limits()
     log.info('Default namespace "{}"'.format(settings.K8S_NAMESPACE))
 
     if not settings.K8S_NAMESPACE:
         log.info("Default namespace is not set. "
                  "This may lead to provisioning error, if namespace is not set for each resource.")
 
+    api_registry = ApiClientRegistry(warning_handler=WarningHandler())
+    api_registry.discovery.warm_up()
+
     if command == COMMAND_DIFF:
-        executor = Diff()
+        executor = Diff(api_registry)
     else:
-        executor = Provisioner(command, sync_mode, show_logs)
+        executor = Provisioner(command, sync_mode, show_logs, api_registry, parallel, deferred_wait, timeout,
+                               server_side_apply, force)
 
-    for resource in resources:
-        executor.run(resource)
+    executor.run_all(resources)
 
 
 parser = argparse.ArgumentParser(description='CLI utility generate k8s resources by templates and apply it to cluster')
@@ -127,11 +156,21 @@ parser_target_config.add_argument('--tags', action='append', required=False,
                                   help='Only use templates tagged with these values')
 parser_target_config.add_argument('--skip-tags', action='append', required=False,
                                   help='Only use templates whose tags do not match these values')
+parser_target_config.add_argument('--render-jobs', type=int, required=False, default=settings.RENDER_JOBS,
+                                  help='Number of processes rendering templates, 1 to render them in this process')
+parser_target_config.add_argument('--templates-cache-dir', required=False, default=settings.TEMPLATES_CACHE_DIR,
+                                  help='Directory to cache compiled templates in between runs')
+parser_target_config.add_argument('--render-cache-dir', required=False, default=settings.RENDER_CACHE_DIR,
+                                  help='Directory to cache rendered templates in, may be shared by runs and CI jobs')
 
 parser_target_resource = argparse.ArgumentParser(add_help=False)
 parser_target_resource.add_argument('-r', '--resource', required=True, type=str,
                                     help='Resource spec path, absolute (started with slash) or relative from TEMP_DIR')
 
+parser_rendering = argparse.ArgumentParser(add_help=False)
+parser_rendering.add_argument('--keep-rendered', action='store_true', required=False, default=False,
+                              help='Write rendered templates to TEMP_DIR as the render command does')
+
 parser_deprecated = argparse.ArgumentParser(add_help=False)
 parser_deprecated.add_argument('--dry-run', required=False, action='store_true',
                                help='Don\'t run kubectl commands. Deprecated, use "k8s-handle template" instead')
@@ -142,13 +181,46 @@ parser_provisioning.add_argument('--sync-mode', action='store_true', required=Fa
 parser_provisioning.add_argument('--tries', type=int, required=False, default=360,
                                  help='Count of tries to check deployment status')
 parser_provisioning.add_argument('--retry-delay', type=int, required=False, default=5,
-                                 help='Sleep between tries in seconds')
+                                 help='Max sleep between tries in seconds, the sleep grows from --min-retry-delay')
+parser_provisioning.add_argument('--min-retry-delay', type=float, required=False, default=settings.POLL_MIN_DELAY,
+                                 help='Sleep after the first try in seconds')
+parser_provisioning.add_argument('--wait-timeout', type=int, required=False,
+                                 help='Max time in seconds to wait for a resource, --tries * --retry-delay by default')
 parser_provisioning.add_argument('--strict', action='store_true', required=False,
                                  help='Check existence of all env variables in config.yaml and stop if var is not set')
 parser_provisioning.add_argument('--use-kubeconfig', action='store_true', required=False,
                                  help='Try to use kube config')
 parser_provisioning.add_argument('--k8s-handle-debug', action='store_true', required=False,
                                  help='Show K8S client debug messages')
+parser_provisioning.add_argument('--parallel', type=int, required=False, default=1,
+                                 help='Count of resources provisioned concurrently, in order of their dependencies')
+parser_provisioning.add_argument('--timeout', type=int, required=False,
+                                 help='Max time in seconds of the whole run, pending resources are reported then')
+parser_provisioning.add_argument('--deferred-wait', action='store_true', required=False, default=False,
+                                 help='In sync mode wait for all workloads together after all resources are applied')
+parser_provisioning.add_argument('--force', action='store_true', required=False, default=False,
+                                 help='Replace resources even if their templates are not changed since the last deploy')
+parser_provisioning.add_argument('--server-side-apply', action='store_true', required=False, default=False,
+                                 help='Apply resources on the server side with a single request per resource')
+parser_provisioning.add_argument('--force-conflicts', action='store_true', required=False, default=False,
+                                 help='On server-side apply take over the fields managed by other field managers')
+parser_provisioning.add_argument('--discovery-cache-dir', required=False, default=settings.K8S_DISCOVERY_CACHE_DIR,
+                                 help='Directory to cache API discovery results in between runs')
+parser_provisioning.add_argument('--pool-maxsize', type=int, required=False, default=settings.K8S_POOL_MAXSIZE,
+                                 help='Max number of keep-alive connections to the K8S API server')
+parser_provisioning.add_argument('--connect-timeout', type=int, required=False, default=settings.K8S_CONNECT_TIMEOUT,
+                                 help='Timeout in seconds of establishing connection to the K8S API server, '
+                                      '0 to disable')
+parser_provisioning.add_argument('--request-timeout', type=int, required=False, default=settings.K8S_READ_TIMEOUT,
+                                 help='Timeout in seconds of reading response of the K8S API server, 0 to disable')
+parser_provisioning.add_argument('--k8s-qps', type=float, required=False,
+                                 help='Max requests per second to the K8S API server, unlimited by default')
+parser_provisioning.add_argument('--k8s-burst', type=int, required=False,
+                                 help='Max requests sent at once above --k8s-qps')
+parser_provisioning.add_argument('--k8s-max-in-flight', type=int, required=False,
+                                 help='Max requests to the K8S API server in progress, unlimited by default')
+parser_provisioning.add_argument('--api-report', required=False, default=settings.K8S_API_REPORT,
+                                 help='JSON file to write the report of requests to the K8S API server to')
 
 parser_logs = argparse.ArgumentParser(add_help=False)
 parser_logs.add_argument('--show-logs', action='store_true', required=False, default=False, help='Show logs for jobs')
@@ -161,7 +233,7 @@ arguments_connection.add_argument('--k8s-token', required=False, help='K8S token
 
 parser_deploy = subparsers.add_parser(
     'deploy',
-    parents=[parser_provisioning, parser_target_config, parser_logs, parser_deprecated],
+    parents=[parser_provisioning, parser_target_config, parser_rendering, parser_logs, parser_deprecated],
     help='Do attempt to create specs from templates and deploy K8S resources of the selected section')
 parser_deploy.set_defaults(func=handler_deploy)
 
@@ -170,7 +242,8 @@ parser_apply = subparsers.add_parser('apply', parents=[parser_provisioning, pars
 parser_apply.set_defaults(func=handler_apply)
 
 parser_destroy = subparsers.add_parser('destroy',
-                                       parents=[parser_provisioning, parser_target_config, parser_deprecated],
+                                       parents=[parser_provisioning, parser_target_config, parser_rendering,
+                                                parser_deprecated],
                                        help='Do attempt to destroy K8S resources of the selected section')
 parser_destroy.set_defaults(func=handler_destroy)
 
@@ -183,12 +256,33 @@ parser_template = subparsers.add_parser('render', parents=[parser_target_config]
                                              'Created resources will be placed into the TEMP_DIR')
 parser_template.set_defaults(func=handler_render)
 
-parser_diff = subparsers.add_parser('diff', parents=[parser_target_config],
+parser_diff = subparsers.add_parser('diff', parents=[parser_target_config, parser_rendering],
                                     help='Show diff between current rendered yamls and apiserver yamls')
 parser_diff.add_argument('--use-kubeconfig', action='store_true', required=False,
                          help='Try to use kube config')
+parser_diff.add_argument('--discovery-cache-dir', required=False, default=settings.K8S_DISCOVERY_CACHE_DIR,
+                         help='Directory to cache API discovery results in between runs')
+parser_diff.add_argument('--api-report', required=False, default=settings.K8S_API_REPORT,
+                         help='JSON file to write the report of requests to the K8S API server to')
 parser_diff.set_defaults(func=handler_diff)
 
+parser_affected = subparsers.add_parser('affected',
+                                        help='List sections and templates affected by changed files, '
+                                             'e.g. to skip deploys of unchanged sections')
+parser_affected.add_argument('--since', nargs='+', required=True,
+                             help='Changed files, e.g. from git diff --name-only, relative to the current directory')
+parser_affected.add_argument('-s', '--section', action='append', required=False,
+                             help='Section to check, all sections of the config by default')
+parser_affected.add_argument('-c', '--config', required=False, help='Config file, default: config.yaml')
+parser_affected.add_argument('--base-config', required=False,
+                             help='Config file before the changes to compare sections with, otherwise any change of '
+                                  'the config affects all templates')
+parser_affected.add_argument('--tags', action='append', required=False,
+                             help='Only use templates tagged with these values')
+parser_affected.add_argument('--skip-tags', action='append', required=False,
+                             help='Only use templates whose tags do not match these values')
+parser_affected.set_defaults(func=handler_affected)
+
 
 def main():
     # INFO furiousassault: backward compatibility rough attempt
@@ -219,9 +313,20 @@ def main():
     settings.CHECK_DAEMONSET_STATUS_TRIES = args_dict.get('tries')
     settings.CHECK_STATUS_TIMEOUT = args_dict.get('retry_delay')
     settings.CHECK_DAEMONSET_STATUS_TIMEOUT = args_dict.get('retry_delay')
+    settings.WAIT_TIMEOUT = args_dict.get('wait_timeout')
+    settings.POLL_MIN_DELAY = args_dict.get('min_retry_delay', settings.POLL_MIN_DELAY)
     settings.GET_ENVIRON_STRICT = args_dict.get('strict')
     settings.COUNT_LOG_LINES = args_dict.get('tail_lines')
     settings.CONFIG_FILE = args_dict.get('config') or settings.CONFIG_FILE
+    settings.TEMPLATES_CACHE_DIR = args_dict.get('templates_cache_dir', settings.TEMPLATES_CACHE_DIR)
+    settings.RENDER_CACHE_DIR = args_dict.get('render_cache_dir', settings.RENDER_CACHE_DIR)
+    settings.K8S_POOL_MAXSIZE = max(args_dict.get('pool_maxsize', settings.K8S_POOL_MAXSIZE),
+                                    args_dict.get('parallel', 1))
+    settings.K8S_CONNECT_TIMEOUT = args_dict.get('connect_timeout', settings.K8S_CONNECT_TIMEOUT)
+    settings.K8S_READ_TIMEOUT = args_dict.get('request_timeout', settings.K8S_READ_TIMEOUT)
+    settings.K8S_DISCOVERY_CACHE_DIR = args_dict.get('discovery_cache_dir', settings.K8S_DISCOVERY_CACHE_DIR)
+    settings.K8S_FORCE_CONFLICTS = args_dict.get('force_conflicts', settings.K8S_FORCE_CONFLICTS)
+    settings.K8S_API_REPORT = args_dict.get('api_report', settings.K8S_API_REPORT)
 
     try:
         args.func(args_dict)
@@ -231,6 +336,9 @@ def main():
     except InvalidYamlError as e:
         log.error('{}'.format(e))
         sys.exit(1)
+    except DeadlineExceededError as e:
+        log.error('Timeout exceeded: {}'.format(e))
+        sys.exit(1)
     except RuntimeError as e:
         log.error('RuntimeError: {}'.format(e))
         sys.exit(1)
@@ -31,6 +31,10 @@ KEY_K8S_NAMESPACE = 'k8s_namespace'
 KEY_K8S_NAMESPACE_ENV = KEY_K8S_NAMESPACE.upper()
 KEY_K8S_HANDLE_DEBUG = 'k8s_handle_debug'
 
+KEY_K8S_QPS = 'k8s_qps'
+KEY_K8S_BURST = 'k8s_burst'
+KEY_K8S_MAX_IN_FLIGHT = 'k8s_max_in_flight'
+
 
 class PriorityEvaluator:
     def __init__(self, cli_arguments, context_arguments, environment):
@@ -66,6 +70,14 @@ class PriorityEvaluator:
         configuration.debug = self._k8s_handle_debug()
         return configuration
 
+    def k8s_rate_limits(self):
+        """
+        Returns QPS, burst and max in flight requests to the API server, they may differ for clusters of sections.
+        """
+        return (float(self._k8s_rate_limit(KEY_K8S_QPS, settings.K8S_QPS)),
+                int(self._k8s_rate_limit(KEY_K8S_BURST, settings.K8S_BURST)),
+                int(self._k8s_rate_limit(KEY_K8S_MAX_IN_FLIGHT, settings.K8S_MAX_IN_FLIGHT)))
+
     def environment_deprecated(self):
         return self.environment.get(KEY_K8S_MASTER_URI_ENV_DEPRECATED) or \
                self.environment.get(KEY_K8S_CA_BASE64_URI_ENV_DEPRECATED)
@@ -95,6 +107,14 @@ class PriorityEvaluator:
             self.cli_arguments.get(KEY_K8S_HANDLE_DEBUG),
             self.context_arguments.get(KEY_K8S_HANDLE_DEBUG) in [True, 'true', 'True'])
 
+    def _k8s_rate_limit(self, key, default):
+        value = PriorityEvaluator._first(
+            self.cli_arguments.get(key),
+            self.context_arguments.get(key),
+            self.environment.get(key.upper()))
+
+        return default if value is None else value
+
     @staticmethod
     def _first(*arguments):
         if not arguments:
@@ -157,24 +177,47 @@ def _update_context_recursively(context, include_history=[]):
         return context
 
 
-def load_context_section(section):
+def find_included_files(value):
+    """
+    Returns paths of files included into the value of a variable with {{ file='...' }}.
+    """
+    if isinstance(value, dict):
+        return [path for item in value.values() for path in find_included_files(item)]
+
+    if isinstance(value, list):
+        return [path for item in value for path in find_included_files(item)]
+
+    if isinstance(value, str):
+        matches = INCLUDE_RE.match(value)
+        return [matches.group('file')] if matches else []
+
+    return []
+
+
+def load_context_section(section, config_file=None):
+    config_file = config_file or settings.CONFIG_FILE
+
     if not section:
         raise RuntimeError('Empty section specification is not allowed')
 
     if section == settings.COMMON_SECTION_NAME:
         raise RuntimeError('Section "{}" is not intended to deploy'.format(settings.COMMON_SECTION_NAME))
 
-    context = load_yaml(settings.CONFIG_FILE)
+    return get_context_section(load_yaml(config_file), section, config_file)
+
 
+def get_context_section(context, section, config_file):
+    """
+    Returns the context of the section of the config already loaded from the config_file.
+    """
     if context is None:
-        raise RuntimeError('Config file "{}" is empty'.format(settings.CONFIG_FILE))
+        raise RuntimeError('Config file "{}" is empty'.format(config_file))
 
     if section not in context:
-        raise RuntimeError('Section "{}" not found in config file "{}"'.format(section, settings.CONFIG_FILE))
+        raise RuntimeError('Section "{}" not found in config file "{}"'.format(section, config_file))
 
     # delete all sections except common and used section
-    context.setdefault(settings.COMMON_SECTION_NAME, {})
-    context = {key: context[key] for key in [settings.COMMON_SECTION_NAME, section]}
+    context = {key: context.get(key, {}) for key in [settings.COMMON_SECTION_NAME, section]}
     context = _update_context_recursively(context)
 
     if section and section in context:
@@ -182,7 +225,7 @@ def load_context_section(section):
 
     if 'templates' not in context and 'kubectl' not in context:
         raise RuntimeError(
-            'Section "templates" or "kubectl" not found in config file "{}"'.format(settings.CONFIG_FILE))
+            'Section "templates" or "kubectl" not found in config file "{}"'.format(config_file))
 
     validate_dashes(context)
     return context
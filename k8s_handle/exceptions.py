@@ -2,6 +2,10 @@ class ProvisioningError(Exception):
     pass
 
 
+class ResourceExistsError(ProvisioningError):
+    pass
+
+
 class ResourceNotAvailableError(Exception):
     pass
 
@@ -16,3 +20,7 @@ class InvalidYamlError(Exception):
 
 class TemplateRenderingError(Exception):
     pass
+
+
+class DeadlineExceededError(Exception):
+    pass
@@ -1,4 +1,5 @@
 import atexit
+import fnmatch
 import logging
 import os
 import tempfile
@@ -33,3 +34,31 @@ def write_file_tmp(data):
     f.flush()
     atexit.register(remove_file, f.name)
     return f.name
+
+
+def prune_directory(directory, pattern, max_size):
+    """
+    Removes files matching pattern used least recently, by their mtime, until the rest of them fit in max_size bytes.
+    """
+    entries = []
+
+    for filename in fnmatch.filter(os.listdir(directory), pattern):
+        try:
+            stat = os.stat(os.path.join(directory, filename))
+        except OSError:
+            continue  # removed by another process
+
+        entries.append((stat.st_mtime, stat.st_size, filename))
+
+    size = sum(entry_size for _, entry_size, _ in entries)
+
+    for _, entry_size, filename in sorted(entries):
+        if size <= max_size:
+            break
+
+        try:
+            os.remove(os.path.join(directory, filename))
+        except OSError:
+            pass
+
+        size -= entry_size
@@ -1,86 +1,101 @@
 import logging
 from time import sleep
 
-from kubernetes import client
+from kubernetes import client, watch
 from kubernetes.client.rest import ApiException
 
 from k8s_handle import settings
-from k8s_handle.exceptions import ProvisioningError
+from k8s_handle.exceptions import ProvisioningError, ResourceExistsError
 from k8s_handle.transforms import add_indent, split_str_by_capital_letters
-from .api_extensions import ResourcesAPI
-from .api_clients import ApiClientWithWarningHandler
+from .api_clients import ApiClientRegistry
 from .mocks import K8sClientMock
+from .encoding import encode
+from .polling import PollingPolicy
+from .retry import RetryPolicy
+from .view import view
 
 log = logging.getLogger(__name__)
 
 RE_CREATE_TRIES = 10
 RE_CREATE_TIMEOUT = 1
 
+# the connection of a watch request is idle until some event happens, so its read timeout must exceed the watch one
+WATCH_READ_TIMEOUT_RESERVE = 10
 
-class Adapter:
-    api_versions = {
-        'v1': client.CoreV1Api,
-        'batch/v1': client.BatchV1Api,
-        'policy/v1': client.PolicyV1Api,
-        'storage.k8s.io/v1': client.StorageV1Api,
-        'apps/v1': client.AppsV1Api,
-        'autoscaling/v1': client.AutoscalingV1Api,
-        'autoscaling/v2': client.AutoscalingV2Api,
-        'rbac.authorization.k8s.io/v1': client.RbacAuthorizationV1Api,
-        'scheduling.k8s.io/v1': client.SchedulingV1Api,
-        'networking.k8s.io/v1': client.NetworkingV1Api,
-        'apiextensions.k8s.io/v1': client.ApiextensionsV1Api,
-    }
-    kinds_builtin = [
-        'ConfigMap', 'CronJob', 'DaemonSet', 'Deployment', 'Endpoints',
-        'Job', 'Namespace', 'PodDisruptionBudget', 'ResourceQuota',
-        'Secret', 'Service', 'ServiceAccount', 'StatefulSet', 'StorageClass',
-        'PersistentVolume', 'PersistentVolumeClaim', 'HorizontalPodAutoscaler',
-        'Role', 'RoleBinding', 'ClusterRole', 'ClusterRoleBinding', 'CustomResourceDefinition',
-        'PriorityClass', 'PodSecurityPolicy', 'LimitRange', 'NetworkPolicy'
-    ]
 
+class Adapter:
     def __init__(self, spec):
         self.body = spec
         self.kind = spec.get('kind', "")
         self.name = spec.get('metadata', {}).get('name')
         self.namespace = spec.get('metadata', {}).get('namespace', "") or settings.K8S_NAMESPACE
 
-    @staticmethod
-    def get_instance(spec, api_custom_objects=None, api_resources=None, warning_handler=None):
-        api_client = ApiClientWithWarningHandler(warning_handler=warning_handler)
+    def _watch(self, list_method, resource_version, timeout, *args, return_type=None, **kwargs):
+        kwargs['field_selector'] = 'metadata.name={}'.format(self.name)
+        kwargs['timeout_seconds'] = timeout
+        kwargs['_request_timeout'] = timeout + WATCH_READ_TIMEOUT_RESERVE
 
-        # due to https://github.com/kubernetes-client/python/issues/387
-        if spec.get('kind') in Adapter.kinds_builtin:
-            if spec.get('apiVersion') == 'test/test':
-                return AdapterBuiltinKind(spec, K8sClientMock(spec.get('metadata', {}).get('name')))
+        if resource_version:
+            kwargs['resource_version'] = resource_version
 
-            api = Adapter.api_versions.get(spec.get('apiVersion'))
+        for event in watch.Watch(return_type=return_type).stream(list_method, *args, **kwargs):
+            yield event['type'], event['object']
 
-            if not api:
-                return None
+    def apply(self):
+        raise RuntimeError('Server-side apply of {} "{}" is not supported'.format(self.kind, self.name))
+
+    def get_metadata(self):
+        """
+        Returns the resource with at least its metadata, or None if it doesn't exist. Use it when the rest
+        of the resource isn't needed.
+        """
+        return self.get()
+
+    @staticmethod
+    def get_instance(spec, warning_handler=None, api_registry=None, refresh=True):
+        """
+        Returns the adapter of the kind served in the apiVersion of the spec, or None if the server doesn't serve it.
+        refresh is like the one of ApiClientRegistry.endpoint().
+        """
+        if spec.get('apiVersion') == 'test/test':
+            return AdapterBuiltinKind(spec, K8sClientMock(spec.get('metadata', {}).get('name')))
+
+        api_registry = api_registry or ApiClientRegistry(warning_handler=warning_handler)
+
+        endpoint = api_registry.endpoint(spec.get('apiVersion'), spec.get('kind'), refresh=refresh)
 
-            return AdapterBuiltinKind(spec, api(api_client=api_client))
+        if endpoint is None:
+            return None
 
-        api_custom_objects = api_custom_objects or client.CustomObjectsApi(api_client=api_client)
-        api_resources = api_resources or ResourcesAPI(api_client=api_client)
-        return AdapterCustomKind(spec, api_custom_objects, api_resources)
+        return AdapterDynamicKind(spec, endpoint, api_registry.api(client.CoreV1Api),
+                                  api_registry.api(client.AppsV1Api), api_registry.retry_policy)
 
 
 class AdapterBuiltinKind(Adapter):
-    def __init__(self, spec, api=None):
+    def __init__(self, spec, api=None, core_api=None, retry_policy=None):
         super().__init__(spec)
+        self.retry_policy = retry_policy or RetryPolicy()
         self.kind = split_str_by_capital_letters(spec['kind'])
         self.replicas = spec.get('spec', {}).get('replicas')
         self.api = api
-
-    def get(self):
+        # pods are always served by CoreV1Api, the mocked client implements everything by itself
+        self.core_api = core_api or api
+        # JSON of the body sent by dynamic kinds, it's encoded again only when the body is changed
+        self._encoded = None
+
+    def get(self, raw=False):
+        """
+        Returns the resource or None if it doesn't exist. With raw=True the resource may be returned as a view
+        of its JSON instead of the model of the client, when it's only read.
+        """
+        return self._get(lambda: self._read(raw))
+
+    def get_metadata(self):
+        return self._get(self._read_metadata)
+
+    def _get(self, read):
         try:
-            if hasattr(self.api, "read_namespaced_{}".format(self.kind)):
-                response = getattr(self.api, 'read_namespaced_{}'.format(self.kind))(
-                    self.name, namespace=self.namespace)
-            else:
-                response = getattr(self.api, 'read_{}'.format(self.kind))(self.name)
+            response = self.retry_policy.call(read, 'read {} "{}"'.format(self.kind, self.name))
         except ApiException as e:
             if e.reason == 'Not Found':
                 return None
@@ -89,12 +104,63 @@ class AdapterBuiltinKind(Adapter):
 
         return response
 
-    def get_pods_by_selector(self, label_selector):
+    def watch(self, resource_version=None, timeout=None, raw=False):
+        """
+        Returns a generator of (event type, object) of the resource changes after the resource_version,
+        or None if the API doesn't support watching of the kind. raw is like the one of get().
+        """
+        if hasattr(self.api, 'list_namespaced_{}'.format(self.kind)):
+            return self._watch(getattr(self.api, 'list_namespaced_{}'.format(self.kind)), resource_version, timeout,
+                               namespace=self.namespace)
+
+        if hasattr(self.api, 'list_{}'.format(self.kind)):
+            return self._watch(getattr(self.api, 'list_{}'.format(self.kind)), resource_version, timeout)
+
+        return None
+
+    def list(self, raw=False):
+        """
+        Returns all resources of the kind in the namespace, or None if the API doesn't support listing of the kind.
+        raw is like the one of get().
+        """
+        try:
+            if hasattr(self.api, 'list_namespaced_{}'.format(self.kind)):
+                return getattr(self.api, 'list_namespaced_{}'.format(self.kind))(namespace=self.namespace).items
+
+            if hasattr(self.api, 'list_{}'.format(self.kind)):
+                return getattr(self.api, 'list_{}'.format(self.kind))().items
+        except ApiException as e:
+            log.error('Exception when calling "list_namespaced_{}": {}'.format(self.kind, add_indent(e.body)))
+            raise ProvisioningError(e)
+
+        return None
+
+    def list_pods(self, label_selector):
+        """
+        Returns pods of the namespace matching the label selector, or None if the API doesn't support listing of pods.
+        """
+        if not hasattr(self.core_api, 'list_namespaced_pod'):
+            return None
+
         try:
-            if not isinstance(self.api, K8sClientMock):
-                self.api = client.CoreV1Api()
+            return self.core_api.list_namespaced_pod(namespace=self.namespace, label_selector=label_selector).items
+        except ApiException as e:
+            log.error('Exception when calling CoreV1Api->list_namespaced_pod: {}'.format(add_indent(e.body)))
+            raise ProvisioningError(e)
 
-            return self.api.list_namespaced_pod(
+    def list_replica_sets(self, label_selector):
+        if not hasattr(self.api, 'list_namespaced_replica_set'):
+            return None
+
+        try:
+            return self.api.list_namespaced_replica_set(namespace=self.namespace, label_selector=label_selector).items
+        except ApiException as e:
+            log.error('Exception when calling AppsV1Api->list_namespaced_replica_set: {}'.format(add_indent(e.body)))
+            raise ProvisioningError(e)
+
+    def get_pods_by_selector(self, label_selector):
+        try:
+            return self.core_api.list_namespaced_pod(
                 namespace=self.namespace, label_selector='job-name={}'.format(label_selector))
 
         except ApiException as e:
@@ -103,10 +169,7 @@ class AdapterBuiltinKind(Adapter):
 
     def read_pod_status(self, name):
         try:
-            if not isinstance(self.api, K8sClientMock):
-                self.api = client.CoreV1Api()
-
-            return self.api.read_namespaced_pod_status(name, namespace=self.namespace)
+            return self.core_api.read_namespaced_pod_status(name, namespace=self.namespace)
         except ApiException as e:
             log.error('Exception when calling CoreV1Api->read_namespaced_pod_status: {}', e)
             raise e
@@ -114,25 +177,24 @@ class AdapterBuiltinKind(Adapter):
     def read_pod_logs(self, name, container):
         log.info('Read logs for pod "{}", container "{}"'.format(name, container))
         try:
-            if not isinstance(self.api, K8sClientMock):
-                self.api = client.CoreV1Api()
             if settings.COUNT_LOG_LINES:
-                return self.api.read_namespaced_pod_log(name, namespace=self.namespace, timestamps=True,
-                                                        tail_lines=settings.COUNT_LOG_LINES, container=container)
-            return self.api.read_namespaced_pod_log(name, namespace=self.namespace, timestamps=True,
-                                                    container=container)
+                return self.core_api.read_namespaced_pod_log(name, namespace=self.namespace, timestamps=True,
+                                                             tail_lines=settings.COUNT_LOG_LINES, container=container)
+            return self.core_api.read_namespaced_pod_log(name, namespace=self.namespace, timestamps=True,
+                                                         container=container)
         except ApiException as e:
             log.error('Exception when calling CoreV1Api->read_namespaced_pod_log: {}', e)
             raise e
 
     def create(self):
         try:
-            if hasattr(self.api, "create_namespaced_{}".format(self.kind)):
-                return getattr(self.api, 'create_namespaced_{}'.format(self.kind))(
-                    body=self.body, namespace=self.namespace)
-
-            return getattr(self.api, 'create_{}'.format(self.kind))(body=self.body)
+            return self.retry_policy.call(self._create, 'create {} "{}"'.format(self.kind, self.name),
+                                          on_exists=self.get)
         except ApiException as e:
+            # left to the caller, the resource may have been created after it was found missing
+            if e.status == 409:
+                raise ResourceExistsError(e)
+
             log.error('Exception when calling "create_namespaced_{}": {}'.format(self.kind, add_indent(e.body)))
             raise ProvisioningError(e)
         except ValueError as e:
@@ -145,23 +207,20 @@ class AdapterBuiltinKind(Adapter):
 
     def replace(self, parameters):
         try:
-            if self.kind in ['service', 'custom_resource_definition', 'pod_disruption_budget']:
+            if self._keeps_resource_version():
                 if 'resourceVersion' in parameters:
                     self.body['metadata']['resourceVersion'] = parameters['resourceVersion']
+                    self._encoded = None
 
             if self.kind in ['service']:
                 if 'clusterIP' not in self.body['spec'] and 'clusterIP' in parameters:
                     self.body['spec']['clusterIP'] = parameters['clusterIP']
+                    self._encoded = None
 
-            if self.kind in ['custom_resource_definition']:
-                return self.api.replace_custom_resource_definition(
-                    self.name, self.body,
-                )
+            request = self._replace
 
             if self.kind in ['service_account']:
-                return getattr(self.api, 'patch_namespaced_{}'.format(self.kind))(
-                    name=self.name, body=self.body, namespace=self.namespace
-                )
+                request = self._patch
 
             # Use patch() for Secrets with ServiceAccount's token to preserve data fields (ca.crt, token, namespace),
             # "kubernetes.io/service-account.uid" annotation and "kubernetes.io/legacy-token-last-used" label
@@ -174,16 +233,11 @@ class AdapterBuiltinKind(Adapter):
                         'annotations' in self.body['metadata'] and
                         'kubernetes.io/service-account.name' in self.body['metadata']['annotations']):
 
-                    return getattr(self.api, 'patch_namespaced_{}'.format(self.kind))(
-                        name=self.name, body=self.body, namespace=self.namespace
-                    )
+                    request = self._patch
 
-            if hasattr(self.api, "replace_namespaced_{}".format(self.kind)):
-                return getattr(self.api, 'replace_namespaced_{}'.format(self.kind))(
-                    name=self.name, body=self.body, namespace=self.namespace)
-
-            return getattr(self.api, 'replace_{}'.format(self.kind))(
-                name=self.name, body=self.body)
+            # the resource may be changed by controllers after it was read
+            return self.retry_policy.call(request, 'replace {} "{}"'.format(self.kind, self.name),
+                                          on_conflict=self._refresh_resource_version)
         except ApiException as e:
             if self.kind in ['pod_disruption_budget'] and e.status == 422:
                 return self.re_create()
@@ -192,13 +246,8 @@ class AdapterBuiltinKind(Adapter):
 
     def delete(self):
         try:
-            if hasattr(self.api, "delete_namespaced_{}".format(self.kind)):
-                return getattr(self.api, 'delete_namespaced_{}'.format(self.kind))(
-                    name=self.name, body=client.V1DeleteOptions(propagation_policy='Foreground'),
-                    namespace=self.namespace)
-
-            return getattr(self.api, 'delete_{}'.format(self.kind))(
-                name=self.name, body=client.V1DeleteOptions(propagation_policy='Foreground'))
+            return self.retry_policy.call(lambda: self._delete(client.V1DeleteOptions(propagation_policy='Foreground')),
+                                          'delete {} "{}"'.format(self.kind, self.name))
         except ApiException as e:
             if e.reason == 'Not Found':
                 return None
@@ -208,127 +257,165 @@ class AdapterBuiltinKind(Adapter):
     def re_create(self):
         log.info('Re-creating {}'.format(self.kind))
         self.body['metadata'].pop('resourceVersion', None)
+        self._encoded = None
         self.delete()
 
-        for i in range(0, RE_CREATE_TRIES):
-            if self.get() is not None:
-                sleep(RE_CREATE_TIMEOUT)
+        poller = PollingPolicy.from_tries(RE_CREATE_TRIES, RE_CREATE_TIMEOUT).start()
+
+        while self.get_metadata() is not None:
+            delay = poller.next_delay()
+            if delay is None:
+                break
+
+            sleep(delay)
 
         return self.create()
 
+    def _keeps_resource_version(self):
+        return self.kind in ['service', 'custom_resource_definition', 'pod_disruption_budget']
 
-class AdapterCustomKind(Adapter):
-    def __init__(self, spec, api_custom_objects, api_resources):
-        super().__init__(spec)
-        self.api = api_custom_objects
-        self.api_resources = api_resources
-        self.plural = None
+    def _refresh_resource_version(self):
+        if not self._keeps_resource_version():
+            return
 
-        try:
-            api_version_splitted = spec.get('apiVersion').split('/', 1)
-            self.group = api_version_splitted[0]
-            self.version = api_version_splitted[1]
-        except (IndexError, AttributeError):
-            self.group = None
-            self.version = None
+        resource = self.get_metadata()
+        metadata = None if resource is None else (
+            resource.get('metadata') if isinstance(resource, dict) else resource.metadata)
 
-        resources_list = self.api_resources.list_api_resource_arbitrary(self.group, self.version)
+        if isinstance(metadata, dict):
+            self.body['metadata']['resourceVersion'] = metadata.get('resourceVersion')
+        elif metadata is not None:
+            self.body['metadata']['resourceVersion'] = metadata.resource_version
 
-        if not resources_list:
-            return
+        self._encoded = None
 
-        for resource in resources_list.resources:
-            if resource.kind != self.kind:
-                continue
+    def _read(self, raw=False):
+        # typed API classes always deserialize responses into models
+        if hasattr(self.api, "read_namespaced_{}".format(self.kind)):
+            return getattr(self.api, 'read_namespaced_{}'.format(self.kind))(self.name, namespace=self.namespace)
 
-            self.plural = resource.name
+        return getattr(self.api, 'read_{}'.format(self.kind))(self.name)
 
-            if not resource.namespaced:
-                self.namespace = ""
+    def _read_metadata(self):
+        # typed API classes can't request metadata only
+        return self._read()
 
-            break
+    def _create(self):
+        if hasattr(self.api, "create_namespaced_{}".format(self.kind)):
+            return getattr(self.api, 'create_namespaced_{}'.format(self.kind))(
+                body=self.body, namespace=self.namespace)
 
-    def get(self):
-        self._validate()
+        return getattr(self.api, 'create_{}'.format(self.kind))(body=self.body)
 
-        try:
-            if self.namespace:
-                return self.api.get_namespaced_custom_object(
-                    self.group, self.version, self.namespace, self.plural, self.name
-                )
+    def _replace(self):
+        if hasattr(self.api, "replace_namespaced_{}".format(self.kind)):
+            return getattr(self.api, 'replace_namespaced_{}'.format(self.kind))(
+                name=self.name, body=self.body, namespace=self.namespace)
 
-            return self.api.get_cluster_custom_object(self.group, self.version, self.plural, self.name)
+        return getattr(self.api, 'replace_{}'.format(self.kind))(name=self.name, body=self.body)
 
-        except ApiException as e:
-            if e.reason == 'Not Found':
-                return None
+    def _patch(self):
+        return getattr(self.api, 'patch_namespaced_{}'.format(self.kind))(
+            name=self.name, body=self.body, namespace=self.namespace)
 
-            log.error('{}'.format(add_indent(e.body)))
-            raise ProvisioningError(e)
+    def _delete(self, options):
+        if hasattr(self.api, "delete_namespaced_{}".format(self.kind)):
+            return getattr(self.api, 'delete_namespaced_{}'.format(self.kind))(
+                name=self.name, body=options, namespace=self.namespace)
 
-    def create(self):
-        self._validate()
+        return getattr(self.api, 'delete_{}'.format(self.kind))(name=self.name, body=options)
 
-        try:
-            if self.namespace:
-                return self.api.create_namespaced_custom_object(
-                    self.group, self.version, self.namespace, self.plural, self.body
-                )
 
-            return self.api.create_cluster_custom_object(self.group, self.version, self.plural, self.body)
+class AdapterDynamicKind(AdapterBuiltinKind):
+    """
+    Adapter of any kind discovered on the server: requests go straight to the precomputed endpoint of the kind
+    instead of methods of typed API classes looked up on every call.
+    """
 
-        except ApiException as e:
-            log.error('{}'.format(add_indent(e.body)))
-            raise ProvisioningError(e)
+    def __init__(self, spec, endpoint, core_api=None, apps_api=None, retry_policy=None):
+        super().__init__(spec, endpoint, core_api, retry_policy)
+        self.endpoint = endpoint
+        self.apps_api = apps_api
 
-    def delete(self):
-        self._validate()
+        # custom kinds may be named like builtin ones, e.g. Service of Knative, but must not be handled like them
+        if not endpoint.typed:
+            self.kind = spec['kind']
 
-        try:
-            if self.namespace:
-                return self.api.delete_namespaced_custom_object(
-                    self.group, self.version, self.namespace, self.plural, self.name,
-                    body=client.V1DeleteOptions(propagation_policy='Foreground')
-                )
+    def watch(self, resource_version=None, timeout=None, raw=False):
+        if not self.endpoint.supports('watch'):
+            return None
 
-            return self.api.delete_cluster_custom_object(
-                self.group, self.version, self.plural, self.name,
-                body=client.V1DeleteOptions(propagation_policy='Foreground')
-            )
+        if not raw:
+            return self._watch(self.endpoint.list, resource_version, timeout, namespace=self.namespace,
+                               return_type=self.endpoint.model)
 
-        except ApiException as e:
-            if e.reason == 'Not Found':
-                return None
+        events = self._watch(self.endpoint.list, resource_version, timeout, namespace=self.namespace,
+                             return_type='object')
+        return ((event_type, view(obj, self.endpoint.model)) for event_type, obj in events)
+
+    def list(self, raw=False):
+        if not self.endpoint.supports('list'):
+            return None
 
-            log.error(
-                '{}'.format(add_indent(e.body)))
+        try:
+            response = self.endpoint.list(namespace=self.namespace, raw=raw)
+        except ApiException as e:
+            log.error('Exception when listing {}: {}'.format(self.endpoint.plural, add_indent(e.body)))
             raise ProvisioningError(e)
 
-    def replace(self, parameters):
-        self._validate()
+        return response['items'] if isinstance(response, dict) else response.items
 
-        if 'resourceVersion' in parameters:
-            self.body['metadata']['resourceVersion'] = parameters['resourceVersion']
+    def list_replica_sets(self, label_selector):
+        if self.apps_api is None:
+            return None
 
         try:
-            if self.namespace:
-                return self.api.replace_namespaced_custom_object(
-                    self.group, self.version, self.namespace, self.plural, self.name, self.body
-                )
-
-            return self.api.replace_cluster_custom_object(
-                self.group, self.version, self.plural, self.name, self.body
-            )
+            return self.apps_api.list_namespaced_replica_set(
+                namespace=self.namespace, label_selector=label_selector).items
         except ApiException as e:
-            log.error('{}'.format(add_indent(e.body)))
+            log.error('Exception when calling AppsV1Api->list_namespaced_replica_set: {}'.format(add_indent(e.body)))
             raise ProvisioningError(e)
 
-    def _validate(self):
-        if not self.plural:
-            raise RuntimeError("No valid plural name of resource definition discovered")
+    def apply(self):
+        try:
+            return self.retry_policy.call(
+                lambda: self.endpoint.apply(self.name, self._encoded_body(), force=settings.K8S_FORCE_CONFLICTS,
+                                            namespace=self.namespace),
+                'apply {} "{}"'.format(self.endpoint.kind, self.name))
+        except ApiException as e:
+            log.error('Exception when applying {} "{}": {}'.format(self.endpoint.kind, self.name, add_indent(e.body)))
+
+            if e.status == 409:
+                log.error('Fields of {} "{}" are managed by other field managers, use --force-conflicts to take '
+                          'them over'.format(self.endpoint.kind, self.name))
+
+            raise ProvisioningError(e)
+
+    def _keeps_resource_version(self):
+        # updates of custom resources are rejected without it
+        return not self.endpoint.typed or super()._keeps_resource_version()
+
+    def _read(self, raw=False):
+        return self.endpoint.read(self.name, namespace=self.namespace, raw=raw)
+
+    def _read_metadata(self):
+        return self.endpoint.read_metadata(self.name, namespace=self.namespace)
+
+    def _create(self):
+        return self.endpoint.create(self._encoded_body(), namespace=self.namespace)
+
+    def _replace(self):
+        return self.endpoint.replace(self.name, self._encoded_body(), namespace=self.namespace)
+
+    def _patch(self):
+        return self.endpoint.patch(self.name, self._encoded_body(), namespace=self.namespace)
+
+    def _encoded_body(self):
+        # the body is encoded once instead of being serialized by the client on every request and retry
+        if self._encoded is None:
+            self._encoded = encode(self.body)
 
-        if not self.group:
-            raise RuntimeError("No valid resource definition group discovered")
+        return self._encoded
 
-        if not self.version:
-            raise RuntimeError("No valid version of resource definition supplied")
+    def _delete(self, options):
+        return self.endpoint.delete(self.name, body=options, namespace=self.namespace)
@@ -1,21 +1,74 @@
 import re
 import logging
+import threading
+from time import monotonic
 
+from kubernetes import client
 from kubernetes.client.api_client import ApiClient
+from kubernetes.client.rest import ApiException
 
-from k8s_handle.exceptions import InvalidWarningHeader
+from k8s_handle import settings
+from k8s_handle.exceptions import DeadlineExceededError, InvalidWarningHeader
+from .discovery import CachedResourcesAPI
+from .dynamic import ResourceEndpoint
+from .encoding import RESTClientWithEncodedBodies
+from .instrumentation import RequestMetrics, body_size, response_size
+from .retry import RetryPolicy
+from .throttling import RateLimiter
 
 log = logging.getLogger(__name__)
 
+# requests rejected by the server with 429 Too Many Requests are sent again up to this count of times
+RATE_LIMIT_RETRIES = 5
+# delay before a rejected request is sent again if the server doesn't set Retry-After
+RATE_LIMIT_RETRY_AFTER = 1
+
 
 class ApiClientWithWarningHandler(ApiClient):
     def __init__(self, *args, **kwargs):
         self.warning_handler = kwargs.pop("warning_handler", None)
+        self.request_timeout = kwargs.pop("request_timeout", None)
+        self.deadline = kwargs.pop("deadline", None)
+        self.rate_limiter = kwargs.pop("rate_limiter", None) or RateLimiter()
+        self.metrics = kwargs.pop("metrics", None)
 
         ApiClient.__init__(self, *args, **kwargs)
+        self.rest_client = RESTClientWithEncodedBodies(self.configuration)
 
     def request(self, *args, **kwargs):
-        response_data = ApiClient.request(self, *args, **kwargs)
+        if kwargs.get("_request_timeout") is None and self.request_timeout is not None:
+            kwargs["_request_timeout"] = self.request_timeout
+
+        request_timeout = kwargs.get("_request_timeout")
+        long_running = any(name == "watch" and value for name, value in kwargs.get("query_params") or [])
+        rejections = 0
+
+        while True:
+            with self.rate_limiter.limit(self.deadline, long_running):
+                if self.deadline is not None:
+                    kwargs["_request_timeout"] = self._limit_timeout(request_timeout, self.deadline - monotonic())
+
+                attempt, started = rejections + 1, monotonic()
+                response_data = status = None
+
+                try:
+                    response_data = ApiClient.request(self, *args, **kwargs)
+                    status = response_data.status
+                    break
+                except ApiException as e:
+                    status = e.status
+
+                    # the request is rejected by API Priority and Fairness of the server before it's handled
+                    if e.status != 429 or rejections >= RATE_LIMIT_RETRIES:
+                        raise
+
+                    rejections += 1
+                    delay = self._retry_after(e.headers)
+                    log.warning("Too many requests to the API server, retry in {} sec.".format(delay))
+                    self.rate_limiter.pause(delay)
+                finally:
+                    if self.metrics is not None:
+                        self._record(args, kwargs, status, monotonic() - started, response_data, attempt)
 
         if self.warning_handler is not None:
             headers = response_data.getheaders()
@@ -25,6 +78,30 @@ class ApiClientWithWarningHandler(ApiClient):
 
         return response_data
 
+    def _record(self, args, kwargs, status, latency, response_data, attempt):
+        method, url = args[:2]
+        self.metrics.record(method, url, kwargs.get("query_params"), status, latency, body_size(kwargs.get("body")),
+                            response_size(response_data), attempt)
+
+    @staticmethod
+    def _retry_after(headers):
+        try:
+            return max(int((headers or {}).get("Retry-After")), 0)
+        except (TypeError, ValueError):
+            return RATE_LIMIT_RETRY_AFTER
+
+    @staticmethod
+    def _limit_timeout(timeout, remaining):
+        if remaining <= 0:
+            raise DeadlineExceededError("Deadline exceeded, request is not sent")
+
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect, read = None, timeout
+
+        return min(connect or remaining, remaining), min(read or remaining, remaining)
+
     @staticmethod
     def _handle_warnings(headers, handler):
         try:
@@ -152,3 +229,150 @@ class ApiClientWithWarningHandler(ApiClient):
             raise InvalidWarningHeader("Invalid warning header: invalid quoted string: missing closing quote")
 
         return (result, remainder)
+
+
+class ApiClientRegistry:
+    """
+    Run-scoped holder of a single pooled ApiClient and of the typed API instances built on top of it,
+    so every resource of a run reuses the same keep-alive connections instead of opening its own.
+    """
+
+    def __init__(self, warning_handler=None, configuration=None):
+        self.warning_handler = warning_handler
+        self._configuration = configuration
+        self._api_client = None
+        self._apis = {}
+        self._discovery = None
+        self._endpoints = {}
+        self._deadline = None
+        self._rate_limiter = None
+        self._retry_policy = None
+        self._metrics = None
+        self._lock = threading.RLock()
+
+    @property
+    def deadline(self):
+        return self._deadline
+
+    @deadline.setter
+    def deadline(self, deadline):
+        """
+        Monotonic time after which requests are not sent, timeouts of requests are limited by it as well.
+        """
+        with self._lock:
+            self._deadline = deadline
+
+            if self._api_client is not None:
+                self._api_client.deadline = deadline
+
+    @property
+    def api_client(self):
+        with self._lock:
+            if self._api_client is None:
+                configuration = self._configuration or client.Configuration.get_default_copy()
+
+                if settings.K8S_POOL_MAXSIZE:
+                    configuration.connection_pool_maxsize = settings.K8S_POOL_MAXSIZE
+
+                self._api_client = ApiClientWithWarningHandler(
+                    configuration=configuration,
+                    warning_handler=self.warning_handler,
+                    request_timeout=self._request_timeout(),
+                    deadline=self._deadline,
+                    rate_limiter=self.rate_limiter,
+                    metrics=self.metrics)
+
+            return self._api_client
+
+    @property
+    def rate_limiter(self):
+        with self._lock:
+            if self._rate_limiter is None:
+                self._rate_limiter = RateLimiter(settings.K8S_QPS, settings.K8S_BURST, settings.K8S_MAX_IN_FLIGHT)
+
+            return self._rate_limiter
+
+    @property
+    def retry_policy(self):
+        with self._lock:
+            if self._retry_policy is None:
+                self._retry_policy = RetryPolicy()
+
+            return self._retry_policy
+
+    @property
+    def metrics(self):
+        with self._lock:
+            if self._metrics is None:
+                self._metrics = RequestMetrics()
+
+            return self._metrics
+
+    def report(self):
+        """
+        Logs how requests of the run to the API server went, written to settings.K8S_API_REPORT as well if it's set.
+        It's called when the run ends, with a failure as well, so its own errors are logged instead of raised.
+        """
+        try:
+            self.metrics.report(settings.K8S_API_REPORT, extra={
+                'retried': dict(self.retry_policy.counts),
+                'throttled': {'time': self.rate_limiter.throttled_time,
+                              'delayed': self.rate_limiter.throttled_requests,
+                              'rejected': self.rate_limiter.rejected_requests}})
+            self.rate_limiter.report()
+            self.retry_policy.report()
+        except (OSError, TypeError, ValueError) as e:
+            log.error('Unable to report requests to the API server: {}'.format(e))
+
+    def api(self, api_class):
+        with self._lock:
+            if api_class not in self._apis:
+                self._apis[api_class] = api_class(api_client=self.api_client)
+
+            return self._apis[api_class]
+
+    @property
+    def discovery(self):
+        with self._lock:
+            if self._discovery is None:
+                self._discovery = CachedResourcesAPI(
+                    self.api(client.ApisApi),
+                    server=self.api_client.configuration.host,
+                    cache_dir=settings.K8S_DISCOVERY_CACHE_DIR,
+                    ttl=settings.K8S_DISCOVERY_CACHE_TTL,
+                    workers=settings.K8S_POOL_MAXSIZE or 1)
+
+            return self._discovery
+
+    def endpoint(self, api_version, kind, refresh=True):
+        """
+        Returns the endpoint of the kind built from its discovery once per run, or None if the server doesn't serve
+        the kind in the api_version. With refresh=False only the kinds discovered so far are looked up, the discovery
+        of an unknown kind isn't requested again.
+        """
+        key = (api_version, kind)
+
+        with self._lock:
+            endpoint = self._endpoints.get(key)
+
+        if endpoint is None:
+            if refresh:
+                resource = self.discovery.resource(api_version, kind)
+            else:
+                resource = self.discovery.find(api_version, kind)
+
+            if resource is None:
+                return None
+
+            with self._lock:
+                endpoint = self._endpoints.setdefault(
+                    key, ResourceEndpoint(self.api_client, api_version, resource, settings.K8S_FIELD_MANAGER))
+
+        return endpoint
+
+    @staticmethod
+    def _request_timeout():
+        if not settings.K8S_CONNECT_TIMEOUT and not settings.K8S_READ_TIMEOUT:
+            return None
+
+        return settings.K8S_CONNECT_TIMEOUT or None, settings.K8S_READ_TIMEOUT or None
@@ -0,0 +1,108 @@
+import hashlib
+import json
+
+CONTENT_HASH_ANNOTATION = 'k8s-handle/content-hash'
+
+# fields of templates identifying objects rather than describing them
+IDENTITY_PATHS = [('apiVersion',), ('kind',), ('metadata', 'name'), ('metadata', 'namespace')]
+
+
+def content_hash(body):
+    """
+    Returns the hash of the normalized body of a template without the hash annotation itself.
+    """
+    body = dict(body)
+    metadata = dict(body.get('metadata') or {})
+    annotations = dict(metadata.get('annotations') or {})
+    annotations.pop(CONTENT_HASH_ANNOTATION, None)
+    metadata['annotations'] = annotations
+    body['metadata'] = metadata
+
+    normalized = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def stamp(body):
+    """
+    Annotates the body of a template with its content hash and returns the hash.
+    """
+    value = content_hash(body)
+    metadata = body.setdefault('metadata', {})
+
+    if metadata.get('annotations') is None:
+        metadata['annotations'] = {}
+
+    metadata['annotations'][CONTENT_HASH_ANNOTATION] = value
+    return value
+
+
+def is_unchanged(resource, body, value, field_manager):
+    """
+    Returns True if the live resource was applied from the same template by the field manager and fields of the
+    template weren't changed since then by other field managers (kubectl edit, other tools etc.). Changes made by
+    controllers to fields missing in the template, like the revision annotation of Deployments, and writes to
+    the status subresource are not drift, writes to other subresources like scale are.
+    """
+    metadata = _get(resource, 'metadata')
+
+    if (_get(metadata, 'annotations') or {}).get(CONTENT_HASH_ANNOTATION) != value:
+        return False
+
+    entries = [entry for entry in _get(metadata, 'managed_fields', 'managedFields') or []
+               if _get(entry, 'subresource') != 'status' and _get(entry, 'time') is not None]
+    own_times = [_get(entry, 'time') for entry in entries if _get(entry, 'manager') == field_manager]
+
+    # the resource isn't managed by k8s-handle yet, e.g. it was created by an older version
+    if not own_times:
+        return False
+
+    template_paths = [path for path in _paths(body) if path not in IDENTITY_PATHS]
+
+    for entry in entries:
+        if _get(entry, 'manager') == field_manager or _get(entry, 'time') < max(own_times):
+            continue
+
+        for path in _managed_paths(_get(entry, 'fields_v1', 'fieldsV1') or {}):
+            if any(_overlaps(path, template_path) for template_path in template_paths):
+                return False
+
+    return True
+
+
+def _get(obj, attribute, key=None):
+    # live resources are models of the client or dictionaries for custom resources
+    if isinstance(obj, dict):
+        return obj.get(key or attribute)
+
+    return getattr(obj, attribute, None)
+
+
+def _paths(body, prefix=()):
+    for key, value in body.items():
+        if isinstance(value, dict) and value:
+            yield from _paths(value, prefix + (key,))
+        else:
+            yield prefix + (key,)
+
+
+def _managed_paths(fields, prefix=()):
+    """
+    Yields paths of fields in the FieldsV1 format, a path ends at the list containing an owned item.
+    """
+    for key, value in fields.items():
+        if key == '.':
+            continue
+
+        if not key.startswith('f:'):
+            yield prefix
+            continue
+
+        if value:
+            yield from _managed_paths(value, prefix + (key[2:],))
+        else:
+            yield prefix + (key[2:],)
+
+
+def _overlaps(path, other):
+    length = min(len(path), len(other))
+    return path[:length] == other[:length]
@@ -0,0 +1,224 @@
+from k8s_handle import settings
+
+# Documents of a tier are provisioned only after all documents of the lower tiers.
+# Kinds which are not listed here (custom resources, for example) are placed into the workloads tier.
+KIND_TIERS = {
+    'Namespace': 0,
+    'CustomResourceDefinition': 1,
+    'PriorityClass': 1,
+    'StorageClass': 1,
+    'PodSecurityPolicy': 1,
+    'ServiceAccount': 2,
+    'ClusterRole': 2,
+    'ClusterRoleBinding': 2,
+    'Role': 2,
+    'RoleBinding': 2,
+    'ResourceQuota': 2,
+    'LimitRange': 2,
+    'ConfigMap': 3,
+    'Secret': 3,
+    'PersistentVolume': 3,
+    'PersistentVolumeClaim': 3,
+    'Service': 3,
+    'Endpoints': 3,
+    'NetworkPolicy': 3,
+    'Deployment': 4,
+    'StatefulSet': 4,
+    'DaemonSet': 4,
+    'Job': 4,
+    'CronJob': 4,
+    'HorizontalPodAutoscaler': 5,
+    'PodDisruptionBudget': 5,
+    'Ingress': 5,
+}
+TIER_WORKLOADS = 4
+
+KINDS_CLUSTER_SCOPED = [
+    'Namespace', 'CustomResourceDefinition', 'PriorityClass', 'StorageClass', 'PodSecurityPolicy',
+    'ClusterRole', 'ClusterRoleBinding', 'PersistentVolume',
+]
+
+
+class Node:
+    def __init__(self, index, body, file_path):
+        self.index = index
+        self.body = body
+        self.file_path = file_path
+        self.kind = body.get('kind')
+        self.name = body.get('metadata', {}).get('name')
+        self.namespace = None if self.kind in KINDS_CLUSTER_SCOPED else \
+            body.get('metadata', {}).get('namespace') or settings.K8S_NAMESPACE
+        self.tier = KIND_TIERS.get(self.kind, TIER_WORKLOADS)
+        self.dependencies = set()
+        self.dependents = set()
+
+    def __repr__(self):
+        return '{} "{}"'.format(self.kind, self.name)
+
+    def depends_on(self, node):
+        if node is None or node is self:
+            return
+
+        self.dependencies.add(node)
+        node.dependents.add(self)
+
+
+class DependencyGraph:
+    """
+    Dependency graph of the documents of a run. Dependencies are taken from the kind of a document (see KIND_TIERS),
+    from the references to other documents of the run (serviceAccountName, configMapRef, roleRef, etc.)
+    and from the CRDs of custom resources. Jobs keep their order relatively to the other workloads, so a migration
+    Job still runs before the Deployments which follow it in the config.
+    """
+
+    def __init__(self, documents):
+        self.nodes = [Node(index, body, file_path) for index, (body, file_path) in enumerate(documents)]
+        self._index = {(node.kind, node.namespace, node.name): node for node in self.nodes}
+
+        for node in self.nodes:
+            self._add_references(node)
+            self._add_custom_resource_definition(node)
+
+        self._add_jobs_order()
+
+    def levels(self):
+        """
+        Splits the documents into the levels: every document depends on the documents of the previous levels only,
+        so documents of one level can be provisioned concurrently.
+        """
+        levels = {}
+        tiers = sorted(set(node.tier for node in self.nodes))
+        tier_levels = {}
+
+        def tier_floor(tier, path):
+            lower = [t for t in tiers if t < tier]
+            if not lower:
+                return 0
+
+            if lower[-1] not in tier_levels:
+                tier_levels[lower[-1]] = max(level(n, path) for n in self.nodes if n.tier == lower[-1])
+
+            return tier_levels[lower[-1]] + 1
+
+        def level(node, path):
+            if node in levels:
+                return levels[node]
+
+            if node in path:
+                raise RuntimeError('Dependency cycle detected: {}'.format(
+                    ' -> '.join(str(n) for n in path[path.index(node):] + [node])))
+
+            path = path + [node]
+            result = tier_floor(node.tier, path)
+
+            for dependency in node.dependencies:
+                result = max(result, level(dependency, path) + 1)
+
+            levels[node] = result
+            return result
+
+        output = []
+        for node in self.nodes:
+            node_level = level(node, [])
+
+            while len(output) <= node_level:
+                output.append([])
+
+            output[node_level].append(node)
+
+        return [nodes for nodes in output if nodes]
+
+    def _find(self, kind, namespace, name):
+        if kind in KINDS_CLUSTER_SCOPED:
+            namespace = None
+
+        return self._index.get((kind, namespace, name))
+
+    def _add_references(self, node):
+        spec = node.body.get('spec') or {}
+
+        if node.kind in ['Deployment', 'StatefulSet', 'DaemonSet', 'Job', 'ReplicaSet']:
+            self._add_pod_references(node, (spec.get('template') or {}).get('spec') or {})
+
+        if node.kind == 'CronJob':
+            job_spec = (spec.get('jobTemplate') or {}).get('spec') or {}
+            self._add_pod_references(node, (job_spec.get('template') or {}).get('spec') or {})
+
+        if node.kind == 'Pod':
+            self._add_pod_references(node, spec)
+
+        if node.kind == 'StatefulSet' and spec.get('serviceName'):
+            node.depends_on(self._find('Service', node.namespace, spec['serviceName']))
+
+        if node.kind in ['RoleBinding', 'ClusterRoleBinding']:
+            role_ref = node.body.get('roleRef') or {}
+            node.depends_on(self._find(role_ref.get('kind'), node.namespace, role_ref.get('name')))
+
+            for subject in node.body.get('subjects') or []:
+                if subject.get('kind') == 'ServiceAccount':
+                    node.depends_on(self._find(
+                        'ServiceAccount', subject.get('namespace') or node.namespace, subject.get('name')))
+
+        if node.kind == 'HorizontalPodAutoscaler':
+            target = spec.get('scaleTargetRef') or {}
+            node.depends_on(self._find(target.get('kind'), node.namespace, target.get('name')))
+
+        if node.kind == 'PersistentVolumeClaim':
+            node.depends_on(self._find('PersistentVolume', None, spec.get('volumeName')))
+            node.depends_on(self._find('StorageClass', None, spec.get('storageClassName')))
+
+    def _add_pod_references(self, node, pod_spec):
+        def depends_on(kind, name):
+            if name:
+                node.depends_on(self._find(kind, node.namespace, name))
+
+        depends_on('ServiceAccount', pod_spec.get('serviceAccountName'))
+
+        for secret in pod_spec.get('imagePullSecrets') or []:
+            depends_on('Secret', secret.get('name'))
+
+        for container in (pod_spec.get('containers') or []) + (pod_spec.get('initContainers') or []):
+            for env_from in container.get('envFrom') or []:
+                depends_on('ConfigMap', (env_from.get('configMapRef') or {}).get('name'))
+                depends_on('Secret', (env_from.get('secretRef') or {}).get('name'))
+
+            for env in container.get('env') or []:
+                value_from = env.get('valueFrom') or {}
+                depends_on('ConfigMap', (value_from.get('configMapKeyRef') or {}).get('name'))
+                depends_on('Secret', (value_from.get('secretKeyRef') or {}).get('name'))
+
+        for volume in pod_spec.get('volumes') or []:
+            depends_on('ConfigMap', (volume.get('configMap') or {}).get('name'))
+            depends_on('Secret', (volume.get('secret') or {}).get('secretName'))
+            depends_on('PersistentVolumeClaim', (volume.get('persistentVolumeClaim') or {}).get('claimName'))
+
+            for source in (volume.get('projected') or {}).get('sources') or []:
+                depends_on('ConfigMap', (source.get('configMap') or {}).get('name'))
+                depends_on('Secret', (source.get('secret') or {}).get('name'))
+
+    def _add_custom_resource_definition(self, node):
+        if node.kind in KIND_TIERS or '/' not in (node.body.get('apiVersion') or ''):
+            return
+
+        group = node.body['apiVersion'].split('/', 1)[0]
+
+        for crd in self.nodes:
+            if crd.kind != 'CustomResourceDefinition':
+                continue
+
+            crd_spec = crd.body.get('spec') or {}
+            if crd_spec.get('group') == group and (crd_spec.get('names') or {}).get('kind') == node.kind:
+                node.depends_on(crd)
+
+    def _add_jobs_order(self):
+        workloads = [node for node in self.nodes if node.tier == TIER_WORKLOADS]
+
+        for position, node in enumerate(workloads):
+            if node.kind != 'Job':
+                continue
+
+            for preceding in workloads[:position]:
+                node.depends_on(preceding)
+
+            for following in workloads[position + 1:]:
+                following.depends_on(node)
@@ -7,12 +7,17 @@ from functools import reduce
 import operator
 import yaml
 from .adapters import Adapter
+from .api_clients import ApiClientRegistry
+from .prefetch import LiveState
+from .view import ResourceView
+from k8s_handle import settings
 from k8s_handle.templating import get_template_contexts
 log = logging.getLogger(__name__)
 
 IGNORE_FIELDS = [
     'metadata.annotations:kubectl.kubernetes.io/last-applied-configuration',
     'metadata.annotations:deployment.kubernetes.io/revision',
+    'metadata.annotations:k8s-handle/content-hash',
     'metadata:creationTimestamp',
     'metadata.labels:kubernetes.io/metadata.name',
     'metadata:resourceVersion',
@@ -31,7 +36,10 @@ def remove_from_dict(d, path, key):
 
 
 def to_dict(obj):
-    if hasattr(obj, 'attribute_map'):
+    if isinstance(obj, ResourceView):
+        # JSON of the server has nulls which models of the client drop
+        return without_nulls(obj.raw)
+    elif hasattr(obj, 'attribute_map'):
         result = {}
         for k, v in getattr(obj, 'attribute_map').items():
             val = getattr(obj, k)
@@ -51,6 +59,15 @@ def to_dict(obj):
         return obj
 
 
+def without_nulls(obj):
+    if isinstance(obj, dict):
+        return {k: without_nulls(v) for k, v in obj.items() if v is not None}
+    elif isinstance(obj, list):
+        return [without_nulls(x) for x in obj]
+    else:
+        return obj
+
+
 def apply_filter(d, field_path):
     try:
         path, field = field_path.split(':')
@@ -62,14 +79,34 @@ def apply_filter(d, field_path):
 
 
 class Diff:
-    @staticmethod
-    def run(file_path):
+    def __init__(self, api_registry=None):
+        self._api_registry = api_registry or ApiClientRegistry()
+        self._live_state = LiveState(settings.K8S_POOL_MAXSIZE or 1, raw=True)
+
+    def run_all(self, file_paths):
+        try:
+            self._live_state.prefetch(
+                kube_client for kube_client in (
+                    Adapter.get_instance(template_body, api_registry=self._api_registry)
+                    for file_path in file_paths for template_body in get_template_contexts(file_path)
+                    if template_body.get('kind') != 'Secret')
+                if kube_client is not None)
+
+            for file_path in file_paths:
+                self.run(file_path)
+        finally:
+            self._api_registry.report()
+
+    def run(self, file_path):
         for template_body in get_template_contexts(file_path):
             if template_body.get('kind') == 'Secret':
                 log.info(f'Skipping secret {template_body.get("metadata", {}).get("name")}')
                 continue
-            kube_client = Adapter.get_instance(template_body)
-            k8s_object = kube_client.get()
+            kube_client = Adapter.get_instance(template_body, api_registry=self._api_registry)
+            if kube_client is None:
+                raise RuntimeError(f'Unknown apiVersion "{template_body.get("apiVersion")}" '
+                                   f'of kind "{template_body.get("kind")}" in template "{file_path}"')
+            k8s_object = self._live_state.get(kube_client)
             if k8s_object is None:
                 current_dict = {}
             else:
@@ -0,0 +1,279 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kubernetes.client import V1APIResource, V1APIResourceList
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import HTTPError
+
+from k8s_handle.exceptions import ProvisioningError
+from k8s_handle.transforms import add_indent
+
+log = logging.getLogger(__name__)
+
+# aggregated discovery returns all groups with their resources in one response (Kubernetes 1.26+),
+# older servers ignore it and return the plain list of groups
+AGGREGATED_DISCOVERY_ACCEPT = ', '.join([
+    'application/json;g=apidiscovery.k8s.io;v=v2;as=APIGroupDiscoveryList',
+    'application/json;g=apidiscovery.k8s.io;v=v2beta1;as=APIGroupDiscoveryList',
+    'application/json',
+])
+
+# the core group is served at /api/<version>, all named groups at /apis/<group>/<version>
+CORE_VERSION = re.compile(r'^v[0-9]+((alpha|beta)[0-9]+)?$')
+
+
+class _Response:
+    # ApiClient.deserialize() expects an object with the raw response in the data attribute
+    def __init__(self, data):
+        self.data = data
+
+
+class CachedResourcesAPI:
+    """
+    Discovery of API resources cached by group/version in memory for the whole run and, when cache_dir is set,
+    on disk for ttl seconds. The disk cache is keyed by the server URL, like the discovery cache of kubectl.
+    """
+
+    def __init__(self, resources_api, server=None, cache_dir=None, ttl=600, workers=8):
+        self._api = resources_api
+        self._workers = workers
+        self._cache_dir = os.path.join(cache_dir, self._server_key(server)) if cache_dir and server else None
+        self._ttl = ttl
+        self._memo = {}
+        # kinds which were not found after their group/version was requested once again
+        self._refreshed = set()
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def find(self, api_version, kind):
+        """
+        Returns the resource of the kind known so far (see warm_up) without requests to the server.
+        """
+        if api_version in self._memo:
+            resources_list = self._memo[api_version]
+        else:
+            resources_list = self._memo[api_version] = self._load(api_version)
+
+        return self._find_kind(resources_list, kind)
+
+    def resource(self, api_version, kind):
+        """
+        Returns the resource of the kind or None if the server doesn't serve it. If the kind is unknown so far,
+        e.g. its CRD was created after the discovery, resources of its group/version are requested once again,
+        only once per kind in a run.
+        """
+        resource = self.find(api_version, kind)
+
+        if resource is not None:
+            return resource
+
+        path = self._resources_path(api_version)
+
+        if path is None:
+            return None
+
+        with self._lock:
+            key_lock = self._locks.setdefault(api_version, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                refresh = (api_version, kind) not in self._refreshed
+                self._refreshed.add((api_version, kind))
+
+            if refresh:
+                self._refresh(api_version, path)
+
+            return self._find_kind(self._memo.get(api_version), kind)
+
+    def expire_refreshes(self, group):
+        """
+        Lets kinds of the group which were not found be requested once again, e.g. when a CRD of the group is created
+        or established.
+        """
+        with self._lock:
+            self._refreshed = {(api_version, kind) for api_version, kind in self._refreshed
+                               if api_version.rpartition('/')[0] != group}
+
+    @staticmethod
+    def _find_kind(resources_list, kind):
+        for resource in getattr(resources_list, 'resources', None) or []:
+            # subresources like deployments/scale have kinds of their own
+            if resource.kind == kind and '/' not in resource.name:
+                return resource
+
+        return None
+
+    @staticmethod
+    def _resources_path(api_version):
+        if not api_version:
+            return None
+
+        if '/' not in api_version:
+            return '/api/{}'.format(api_version) if CORE_VERSION.match(api_version) else None
+
+        group, version = api_version.split('/', 1)
+        if not group or not version or '/' in version:
+            return None
+
+        return '/apis/{}'.format(api_version)
+
+    def _refresh(self, group_version, path):
+        try:
+            resources_list = self._get_resources_list(path)
+        except ApiException as e:
+            if e.status != 404:
+                log.error('{}'.format(add_indent(e.body)))
+                raise ProvisioningError(e)
+
+            resources_list = None
+
+        self._memo[group_version] = resources_list
+        self._store(group_version, resources_list)
+
+    def warm_up(self):
+        """
+        Discovers all resources of the server at once: with two aggregated discovery requests if the server supports
+        them, otherwise with concurrent requests for every group/version. Does nothing if the disk cache is fresh.
+        """
+        if self._is_fresh(self._groups_path()):
+            return
+
+        try:
+            resources_lists = self._discover()
+        except (ApiException, HTTPError, ValueError) as e:
+            log.warning('Unable to discover API resources, they will be discovered on demand: {}'.format(e))
+            return
+
+        with self._lock:
+            self._memo.update(resources_lists)
+
+        for group_version, resources_list in resources_lists.items():
+            self._store(group_version, resources_list)
+
+        self._store_group_versions(sorted(resources_lists))
+        log.debug('Discovered {} API group versions'.format(len(resources_lists)))
+
+    def _get(self, path):
+        return self._api.api_client.call_api(
+            path, 'GET',
+            header_params={'Accept': AGGREGATED_DISCOVERY_ACCEPT},
+            auth_settings=['BearerToken'],
+            _return_http_data_only=True,
+            _preload_content=False)
+
+    def _discover(self):
+        core, groups = json.loads(self._get('/api').data), json.loads(self._get('/apis').data)
+
+        if core.get('kind') == 'APIGroupDiscoveryList' and groups.get('kind') == 'APIGroupDiscoveryList':
+            return dict(self._from_aggregated(core) + self._from_aggregated(groups))
+
+        paths = ['/api/{}'.format(version) for version in core.get('versions') or []]
+        paths += ['/apis/{}'.format(version['groupVersion'])
+                  for group in groups.get('groups') or [] for version in group.get('versions') or []]
+
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            resources_lists = pool.map(self._discover_resources_list, paths)
+
+        return {resources_list.group_version: resources_list
+                for resources_list in resources_lists if resources_list is not None}
+
+    def _discover_resources_list(self, path):
+        # a broken group, e.g. of an unavailable aggregated APIService, doesn't stop discovery of the others
+        try:
+            return self._get_resources_list(path)
+        except (ApiException, HTTPError, ValueError) as e:
+            log.warning('Unable to discover API resources of "{}", they will be discovered on demand: {}'.format(
+                path, e))
+            return None
+
+    def _get_resources_list(self, path):
+        return self._api.api_client.deserialize(self._get(path), 'V1APIResourceList')
+
+    @staticmethod
+    def _from_aggregated(discovery):
+        result = []
+
+        for group in discovery.get('items') or []:
+            group_name = (group.get('metadata') or {}).get('name') or ''
+
+            for version in group.get('versions') or []:
+                group_version = '{}/{}'.format(group_name, version['version']) if group_name else version['version']
+                resources = [
+                    V1APIResource(
+                        kind=(resource.get('responseKind') or {}).get('kind'),
+                        name=resource['resource'],
+                        namespaced=resource.get('scope') == 'Namespaced',
+                        singular_name=resource.get('singularResource') or '',
+                        short_names=resource.get('shortNames'),
+                        verbs=resource.get('verbs') or [])
+                    for resource in version.get('resources') or []
+                ]
+                result.append((group_version, V1APIResourceList(group_version=group_version, resources=resources)))
+
+        return result
+
+    @staticmethod
+    def _server_key(server):
+        # the same way as kubectl: https://1.2.3.4:6443 -> 1.2.3.4_6443
+        return re.sub(r'[^a-zA-Z0-9.\-]', '_', re.sub(r'^https?://', '', server))
+
+    def _path(self, group_version):
+        if not self._cache_dir:
+            return None
+
+        return os.path.join(self._cache_dir, group_version, 'serverresources.json')
+
+    def _groups_path(self):
+        return os.path.join(self._cache_dir, 'groupversions.json') if self._cache_dir else None
+
+    def _is_fresh(self, path):
+        return bool(path) and os.path.exists(path) and time.time() - os.path.getmtime(path) <= self._ttl
+
+    def _store_group_versions(self, group_versions):
+        path = self._groups_path()
+
+        if not path:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(path, 'w') as f:
+                json.dump(group_versions, f)
+        except OSError as e:
+            log.debug('Unable to write discovery cache "{}": {}'.format(path, e))
+
+    def _load(self, group_version):
+        path = self._path(group_version)
+
+        if not self._is_fresh(path):
+            return None
+
+        try:
+            with open(path) as f:
+                return self._api.api_client.deserialize(_Response(f.read()), 'V1APIResourceList')
+        except (OSError, ValueError) as e:
+            log.debug('Unable to read discovery cache "{}": {}'.format(path, e))
+            return None
+
+    def _store(self, group_version, resources_list):
+        path = self._path(group_version)
+
+        if not path or resources_list is None:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+            with open(temp_path, 'w') as f:
+                json.dump(self._api.api_client.sanitize_for_serialization(resources_list), f)
+
+            os.replace(temp_path, path)
+        except OSError as e:
+            log.debug('Unable to write discovery cache "{}": {}'.format(path, e))
@@ -0,0 +1,178 @@
+from kubernetes.client import models
+
+from .encoding import encode
+from .view import decode
+
+# content type of patches of kinds served by Kubernetes itself, custom resources support only merge patches
+STRATEGIC_MERGE_PATCH = 'application/strategic-merge-patch+json'
+MERGE_PATCH = 'application/merge-patch+json'
+APPLY_PATCH = 'application/apply-patch+yaml'
+
+# metadata of objects without the rest of them, servers which don't support it return whole objects
+METADATA_ACCEPT = ', '.join([
+    'application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1',
+    'application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1beta1',
+    'application/json',
+])
+METADATA_LIST_ACCEPT = ', '.join([
+    'application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1',
+    'application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1beta1',
+    'application/json',
+])
+
+
+def model_name(api_version, kind):
+    """
+    Returns the name of the client model of the kind, e.g. V1Deployment or CoreV1Event, or None if the client
+    doesn't have it. Groups of custom resources have dots in their names and aren't served by Kubernetes itself
+    (*.k8s.io), so their kinds are never matched with the models of builtin kinds.
+    """
+    group, _, version = api_version.rpartition('/')
+
+    if '.' in group and not group.endswith('.k8s.io'):
+        return None
+
+    version = version.capitalize()
+    # the client prefixes models with the group when a kind is served by several groups
+    for name in ('{}{}{}'.format((group.split('.')[0] or 'core').capitalize(), version, kind),
+                 '{}{}'.format(version, kind)):
+        if hasattr(models, name):
+            return name
+
+    return None
+
+
+class ResourceEndpoint:
+    """
+    REST endpoint of a kind built once from its discovered API resource: the path, the scope, the verbs and
+    the models of responses are known up front, so requests don't look up methods of typed API classes.
+    Kinds without client models (custom resources) are returned as dictionaries.
+    """
+
+    def __init__(self, api_client, api_version, resource, field_manager=None):
+        self.api_client = api_client
+        self.api_version = api_version
+        self.field_manager = field_manager
+        self.kind = resource.kind
+        self.plural = resource.name
+        self.namespaced = bool(resource.namespaced)
+        self.verbs = frozenset(resource.verbs or [])
+
+        prefix = '/apis/{}'.format(api_version) if '/' in api_version else '/api/{}'.format(api_version)
+        self._collection_path = '{}{}{}'.format(prefix, '/namespaces/{}/' if self.namespaced else '/', self.plural)
+
+        model = model_name(api_version, self.kind)
+        self.typed = model is not None
+        self._model = model or 'object'
+        self._list_model = model + 'List' if model and hasattr(models, model + 'List') else 'object'
+        self._status_model = 'V1Status' if model else 'object'
+        self._patch_content_type = STRATEGIC_MERGE_PATCH if model else MERGE_PATCH
+
+    def supports(self, verb):
+        return verb in self.verbs
+
+    def read(self, name, namespace=None, raw=False):
+        """
+        Returns the object as the model of the client or, with raw=True, as the view of its JSON decoded without
+        deserialization into models.
+        """
+        if raw:
+            return decode(self._call('GET', self._path(namespace, name), None, _preload_content=False), self._model)
+
+        return self._call('GET', self._path(namespace, name), self._model)
+
+    def read_metadata(self, name, namespace=None):
+        """
+        Returns the PartialObjectMetadata of the object as a dictionary, the client has no model of it.
+        """
+        return self._call('GET', self._path(namespace, name), 'object', accept=METADATA_ACCEPT)
+
+    def create(self, body, namespace=None):
+        return self._call('POST', self._path(namespace), self._model, body=encode(body), query=self._manager_query())
+
+    def replace(self, name, body, namespace=None):
+        return self._call('PUT', self._path(namespace, name), self._model, body=encode(body),
+                          query=self._manager_query())
+
+    def patch(self, name, body, namespace=None):
+        return self._call('PATCH', self._path(namespace, name), self._model, body=encode(body),
+                          query=self._manager_query(), content_type=self._patch_content_type)
+
+    def apply(self, name, body, force=False, namespace=None):
+        """
+        Server-side apply of the body: the server creates the object or updates the fields owned by the field manager.
+        """
+        query = self._manager_query()
+
+        if force:
+            query.append(('force', True))
+
+        # JSON is valid YAML
+        return self._call('PATCH', self._path(namespace, name), self._model, query=query, body=encode(body),
+                          content_type=APPLY_PATCH)
+
+    def delete(self, name, body=None, namespace=None):
+        return self._call('DELETE', self._path(namespace, name), self._status_model, body=body)
+
+    def list(self, namespace=None, label_selector=None, field_selector=None, resource_version=None,
+             timeout_seconds=None, watch=None, limit=None, _continue=None, metadata_only=False, raw=False,
+             _preload_content=True, _request_timeout=None):
+        """
+        Lists or, with watch=True, watches the resources of the kind. With metadata_only the list is returned as
+        PartialObjectMetadataList dictionary, with raw=True as the view of its JSON like read() does.
+        """
+        if raw:
+            response = self.list(namespace, label_selector, field_selector, resource_version, timeout_seconds,
+                                 limit=limit, _continue=_continue, metadata_only=metadata_only, _preload_content=False,
+                                 _request_timeout=_request_timeout)
+            return decode(response, 'object' if metadata_only else self._list_model)
+
+        query = [(name, value) for name, value in (
+            ('labelSelector', label_selector),
+            ('fieldSelector', field_selector),
+            ('resourceVersion', resource_version),
+            ('timeoutSeconds', timeout_seconds),
+            ('watch', watch),
+            ('limit', limit),
+            ('continue', _continue),
+        ) if value is not None]
+        response_type, accept = ('object', METADATA_LIST_ACCEPT) if metadata_only else (self._list_model, None)
+
+        return self._call('GET', self._path(namespace), response_type, query=query, accept=accept,
+                          _preload_content=_preload_content, _request_timeout=_request_timeout)
+
+    @property
+    def model(self):
+        return self._model
+
+    def _manager_query(self):
+        # changes are recorded in managedFields of objects under the name of the field manager
+        return [('fieldManager', self.field_manager)] if self.field_manager else []
+
+    def _path(self, namespace, name=None):
+        if not self.namespaced:
+            path = self._collection_path
+        elif namespace:
+            path = self._collection_path.format(namespace)
+        else:
+            raise ValueError('Namespace is required for {} "{}"'.format(self.kind, name or ''))
+
+        return '{}/{}'.format(path, name) if name else path
+
+    def _call(self, method, path, response_type, body=None, query=None, content_type='application/json',
+              accept=None, _preload_content=True, _request_timeout=None):
+        header_params = {'Accept': accept or 'application/json'}
+
+        if body is not None:
+            header_params['Content-Type'] = content_type
+
+        return self.api_client.call_api(
+            path, method,
+            query_params=query or [],
+            header_params=header_params,
+            body=body,
+            response_type=response_type,
+            auth_settings=['BearerToken'],
+            _return_http_data_only=True,
+            _preload_content=_preload_content,
+            _request_timeout=_request_timeout)
@@ -0,0 +1,77 @@
+import json
+from datetime import date, datetime
+from urllib.parse import urlencode
+
+import urllib3
+from kubernetes.client import rest
+from kubernetes.client.exceptions import ApiException
+
+
+class EncodedBody(bytes):
+    """
+    JSON of a request body encoded in advance, it's sent as it is instead of being serialized on every request.
+    """
+
+
+def encode(body):
+    """
+    Encodes the body of a template like sanitize_for_serialization() and json.dumps() of the client do.
+    """
+    if isinstance(body, EncodedBody):
+        return body
+
+    return EncodedBody(json.dumps(body, separators=(',', ':'), default=_serialize).encode('utf-8'))
+
+
+def _serialize(value):
+    # timestamps and dates are parsed by YAML loader
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+class RESTClientWithEncodedBodies(rest.RESTClientObject):
+    """
+    REST client sending encoded bodies as they are, the original one serializes bodies of JSON content types
+    with json.dumps() itself.
+    """
+
+    def request(self, method, url, query_params=None, headers=None, body=None, post_params=None,
+                _preload_content=True, _request_timeout=None):
+        if not isinstance(body, EncodedBody):
+            return super().request(method, url, query_params=query_params, headers=headers, body=body,
+                                   post_params=post_params, _preload_content=_preload_content,
+                                   _request_timeout=_request_timeout)
+
+        headers = headers or {}
+        headers.setdefault('Content-Type', 'application/json')
+
+        if query_params:
+            url += '?' + urlencode(query_params)
+
+        try:
+            response = self.pool_manager.request(method.upper(), url, body=bytes(body), headers=headers,
+                                                 preload_content=_preload_content,
+                                                 timeout=self._timeout(_request_timeout))
+        except urllib3.exceptions.SSLError as e:
+            raise ApiException(status=0, reason='{0}\n{1}'.format(type(e).__name__, str(e)))
+
+        if _preload_content:
+            response = rest.RESTResponse(response)
+            response.data = response.data.decode('utf8')
+
+        if not 200 <= response.status <= 299:
+            raise ApiException(http_resp=response)
+
+        return response
+
+    @staticmethod
+    def _timeout(request_timeout):
+        if isinstance(request_timeout, tuple) and len(request_timeout) == 2:
+            return urllib3.Timeout(connect=request_timeout[0], read=request_timeout[1])
+
+        if request_timeout:
+            return urllib3.Timeout(total=request_timeout)
+
+        return None
@@ -0,0 +1,199 @@
+import json
+import logging
+import math
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from kubernetes.client.rest import RESTResponse
+
+log = logging.getLogger(__name__)
+
+# count of the slowest requests to objects shown in the report
+SLOWEST_REQUESTS = 5
+
+VERBS = {'POST': 'create', 'PUT': 'update', 'PATCH': 'patch', 'DELETE': 'delete'}
+
+Request = namedtuple('Request', ['verb', 'resource', 'namespace', 'name', 'status', 'latency', 'request_bytes',
+                                 'response_bytes', 'attempt'])
+
+
+def parse_request(method, url, query_params=None):
+    """
+    Returns the verb of the API server, the resource, the namespace and the name of the object of a request.
+    The resource includes the subresource, e.g. deployments/status. Requests not to resources, e.g. discovery of
+    API groups, have the verb of the method and no resource.
+    """
+    path = urlsplit(url).path
+    parts = path.strip('/').split('/')
+    # the server may be behind a proxy with its own prefix of paths
+    start = next((i for i, part in enumerate(parts) if part in ['api', 'apis']), None)
+
+    if start is None:
+        return method.lower(), path, None, None
+
+    parts = parts[start + (2 if parts[start] == 'api' else 3):]
+    namespace = None
+
+    if len(parts) > 2 and parts[0] == 'namespaces':
+        namespace, parts = parts[1], parts[2:]
+
+    if not parts:
+        return method.lower(), path, None, None
+
+    resource, name = parts[0], parts[1] if len(parts) > 1 else None
+
+    if len(parts) > 2:
+        resource = '{}/{}'.format(resource, parts[2])
+
+    if method != 'GET':
+        verb = VERBS.get(method, method.lower())
+        if verb == 'delete' and name is None:
+            verb = 'deletecollection'
+    elif any(key == 'watch' and value for key, value in query_params or []):
+        verb = 'watch'
+    else:
+        verb = 'list' if name is None else 'get'
+
+    return verb, resource, namespace, name
+
+
+def body_size(body):
+    if body is None:
+        return 0
+
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+
+    if isinstance(body, str):
+        return len(body.encode())
+
+    # bodies of the typed API classes are encoded by the REST client as is
+    return len(json.dumps(body))
+
+
+def response_size(response):
+    """
+    Returns the size of the response body. A response which is not preloaded is not read yet, e.g. of a watch,
+    so it's measured by Content-Length if the server sets it.
+    """
+    if isinstance(response, RESTResponse):
+        return len(response.data) if isinstance(response.data, (bytes, bytearray)) else len(response.data.encode())
+
+    try:
+        return int(response.getheader('Content-Length'))
+    except (AttributeError, TypeError, ValueError):
+        return 0
+
+
+def percentile(values, percent):
+    """
+    Returns the percentile of sorted values by the nearest-rank method.
+    """
+    return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+
+class RequestMetrics:
+    """
+    Latency and volume of requests to the API server made by all threads of a run. Every HTTP request is recorded,
+    including requests sent again after 429 responses and requests which failed, their attempt is counted from 1.
+    Responses which are not preloaded, e.g. of watches, are timed until their headers are received.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def record(self, method, url, query_params=None, status=None, latency=0.0, request_bytes=0, response_bytes=0,
+               attempt=1):
+        verb, resource, namespace, name = parse_request(method, url, query_params)
+
+        with self._lock:
+            self.requests.append(Request(verb, resource, namespace, name, status, latency, request_bytes,
+                                         response_bytes, attempt))
+
+    def summary(self):
+        """
+        Returns totals and p50, p95 and max latency per verb and resource, and the slowest requests to objects.
+        Watches last until the object is ready, so they're shown per resource but not among the slowest requests.
+        """
+        with self._lock:
+            requests = list(self.requests)
+
+        groups = {}
+        for request in requests:
+            groups.setdefault((request.verb, request.resource), []).append(request)
+
+        slowest = sorted((r for r in requests if r.name is not None and r.verb != 'watch'),
+                         key=lambda r: r.latency, reverse=True)[:SLOWEST_REQUESTS]
+
+        return {
+            'requests': len(requests),
+            'retries': sum(1 for r in requests if r.attempt > 1),
+            'errors': sum(1 for r in requests if r.status is None or r.status >= 400),
+            'latency': sum(r.latency for r in requests),
+            'request_bytes': sum(r.request_bytes for r in requests),
+            'response_bytes': sum(r.response_bytes for r in requests),
+            'resources': [self._group_summary(verb, resource, group)
+                          for (verb, resource), group in sorted(groups.items(), key=lambda item: item[0])],
+            'slowest': [r._asdict() for r in slowest],
+        }
+
+    @staticmethod
+    def _group_summary(verb, resource, requests):
+        latencies = sorted(r.latency for r in requests)
+
+        return {
+            'verb': verb,
+            'resource': resource,
+            'requests': len(requests),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'max': latencies[-1],
+            'request_bytes': sum(r.request_bytes for r in requests),
+            'response_bytes': sum(r.response_bytes for r in requests),
+            'statuses': {str(status): sum(1 for r in requests if r.status == status)
+                         for status in sorted({r.status for r in requests}, key=str)},
+        }
+
+    def report(self, path=None, extra=None):
+        """
+        Logs the summary and writes it with all recorded requests to the JSON file at path if it's set.
+        """
+        summary = self.summary()
+
+        if summary['requests']:
+            log.info('Requests to the API server: {}, {:.1f} sec. in total, {} retried, {} failed, {} sent, '
+                     '{} received'.format(summary['requests'], summary['latency'], summary['retries'],
+                                          summary['errors'], _format_bytes(summary['request_bytes']),
+                                          _format_bytes(summary['response_bytes'])))
+
+            for group in summary['resources']:
+                log.info('  {} {}: {} requests, p50 {:.3f} sec., p95 {:.3f} sec., max {:.3f} sec., {} sent, '
+                         '{} received'.format(group['verb'], group['resource'], group['requests'], group['p50'],
+                                              group['p95'], group['max'], _format_bytes(group['request_bytes']),
+                                              _format_bytes(group['response_bytes'])))
+
+            if summary['slowest']:
+                log.info('Slowest requests to the API server: {}'.format(', '.join(
+                    '{} {}/{} {:.3f} sec.'.format(r['verb'], r['resource'], r['name'], r['latency'])
+                    for r in summary['slowest'])))
+
+        if path:
+            with self._lock:
+                requests = [r._asdict() for r in self.requests]
+
+            with open(path, 'w') as f:
+                json.dump(dict(summary, **(extra or {}), log=requests), f, indent=2)
+
+            log.info('Report of requests to the API server is written to {}'.format(path))
+
+
+def _format_bytes(size):
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return '{:.0f} {}'.format(size, unit) if unit == 'B' else '{:.1f} {}'.format(size, unit)
+
+        size /= 1024
+
+    return '{:.1f} GB'.format(size)
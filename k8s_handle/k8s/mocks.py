@@ -1,8 +1,31 @@
 from collections import namedtuple
+from unittest.mock import Mock
 
-from kubernetes.client import V1APIResourceList
+from kubernetes.client import V1APIResource
 from kubernetes.client.rest import ApiException
 
+from .dynamic import ResourceEndpoint
+
+
+def resource_endpoint(kind='Deployment', plural='deployments', api_version='apps/v1', namespaced=True, verbs=None,
+                      api_client=None, field_manager=None):
+    """
+    Returns the endpoint of the kind as if it was discovered, requests are sent with a mocked API client
+    unless api_client is given.
+    """
+    resource = V1APIResource(kind=kind, name=plural, namespaced=namespaced, singular_name='',
+                             verbs=list(verbs or ['get', 'list', 'watch', 'create', 'update', 'patch', 'delete']))
+    return ResourceEndpoint(api_client or Mock(), api_version, resource, field_manager)
+
+
+def kube_client_mock(name='test', **attributes):
+    """
+    Returns a mocked adapter of the named resource, the name can't be passed to Mock() as it names the mock itself.
+    """
+    kube_client = Mock(**attributes)
+    kube_client.name = name
+    return kube_client
+
 
 class K8sClientMock:
     def __init__(self, name=None):
@@ -265,27 +288,3 @@ class K8sClientMock:
     def replace_namespaced_persistent_volume_claim(self, name, body, namespace):
         if self.name == 'test2' or name == 'test2':
             raise ApiException('Replace persistent volume claim fail')
-
-
-class CustomObjectsAPIMock:
-    pass
-
-
-class ResourcesAPIMock:
-    def __init__(self, api_version=None, group_version=None, resources=None):
-        self._resources = resources
-        self._api_version = api_version
-        self._group_version = group_version
-        self._kind = 'APIResourceList'
-
-    def list_api_resource_arbitrary(self, group, version):
-        if not self._resources or self._group_version != '{}/{}'.format(group, version):
-            return None
-
-        return V1APIResourceList(self._api_version, self._group_version, self._kind, self._resources)
-
-    def list_api_resources(self, version):
-        if not self._resources or self._group_version != version:
-            return None
-
-        return V1APIResourceList(self._api_version, self._group_version, self._kind, self._resources)
@@ -0,0 +1,108 @@
+import logging
+import threading
+from concurrent.futures import CancelledError, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+log = logging.getLogger(__name__)
+
+
+class _GroupingHandler(logging.Handler):
+    """
+    Replaces the root handlers while tasks are running: records emitted by a worker thread are collected
+    into the buffer of its current task, records of other threads are passed through immediately.
+    """
+
+    def __init__(self, handlers):
+        super().__init__()
+        self.handlers = handlers
+        self._local = threading.local()
+
+    def start_capture(self, records):
+        self._local.records = records
+
+    def stop_capture(self):
+        self._local.records = None
+
+    def emit(self, record):
+        records = getattr(self._local, 'records', None)
+
+        if records is None:
+            self.forward(record)
+        else:
+            records.append(record)
+
+    def forward(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class ParallelRunner:
+    def __init__(self, workers, cancelled=None):
+        self.workers = workers
+        self.cancelled = cancelled or threading.Event()
+
+    def run(self, tasks):
+        """
+        Runs (name, callable) tasks on a pool of worker threads. Logs of every task are printed as one block,
+        in the order of the tasks. The first failure cancels the tasks which are not started yet, signals the
+        running ones via the `cancelled` event and is re-raised once they are finished.
+        """
+        root = logging.getLogger()
+        grouping = _GroupingHandler(root.handlers)
+        root.handlers = [grouping]
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                return self._run(pool, grouping, tasks)
+        finally:
+            root.handlers = grouping.handlers
+
+    def _run(self, pool, grouping, tasks):
+        buffers = [[] for _ in tasks]
+        futures = [pool.submit(self._run_task, grouping, records, task)
+                   for records, (_, task) in zip(buffers, tasks)]
+        pending = set(futures)
+        flushed = 0
+        error = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.cancelled() or future.exception() is None or error is not None:
+                    continue
+
+                error = future.exception()
+                self.cancelled.set()
+
+                for pending_future in pending:
+                    pending_future.cancel()
+
+            while flushed < len(futures) and futures[flushed].done():
+                for record in buffers[flushed]:
+                    grouping.forward(record)
+
+                if self._is_cancelled(futures[flushed]):
+                    log.warning('{} has been cancelled'.format(tasks[flushed][0]))
+
+                flushed += 1
+
+        if error is not None:
+            raise error
+
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _is_cancelled(future):
+        return future.cancelled() or isinstance(future.exception(), CancelledError)
+
+    def _run_task(self, grouping, records, task):
+        if self.cancelled.is_set():
+            raise CancelledError()
+
+        grouping.start_capture(records)
+
+        try:
+            return task()
+        finally:
+            grouping.stop_capture()
@@ -0,0 +1,73 @@
+import random
+from time import monotonic
+
+from k8s_handle import settings
+
+
+class PollingPolicy:
+    """
+    Policy of a wait loop limited by a wall-clock timeout in seconds. The first check is made immediately, then
+    the delay between checks grows exponentially (with jitter) from min_delay up to max_delay and drops back to
+    min_delay every time progress is observed.
+    """
+
+    def __init__(self, timeout, min_delay=None, max_delay=None, factor=None, jitter=None):
+        self.timeout = timeout
+        self.max_delay = settings.CHECK_STATUS_TIMEOUT if max_delay is None else max_delay
+        self.min_delay = min(settings.POLL_MIN_DELAY if min_delay is None else min_delay, self.max_delay)
+        self.factor = settings.POLL_BACKOFF_FACTOR if factor is None else factor
+        self.jitter = settings.POLL_JITTER if jitter is None else jitter
+
+    @classmethod
+    def from_tries(cls, tries, timeout):
+        return cls(tries * timeout, max_delay=timeout)
+
+    @classmethod
+    def from_settings(cls):
+        """
+        Policy of waiting for a resource: settings.WAIT_TIMEOUT or tries * retry delay if it's not set.
+        """
+        timeout = settings.WAIT_TIMEOUT
+        if timeout is None:
+            timeout = settings.CHECK_STATUS_TRIES * settings.CHECK_STATUS_TIMEOUT
+
+        return cls(timeout, max_delay=settings.CHECK_STATUS_TIMEOUT)
+
+    def start(self, deadline=None):
+        return Poller(self, deadline)
+
+
+class Poller:
+    def __init__(self, policy, deadline=None):
+        self.policy = policy
+        self.attempts = 0
+        self.started = monotonic()
+        self.deadline = self.started + policy.timeout
+        self._delay = policy.min_delay
+
+        if deadline is not None:
+            self.deadline = min(self.deadline, deadline)
+
+    def remaining(self):
+        return max(self.deadline - monotonic(), 0)
+
+    def elapsed(self):
+        return monotonic() - self.started
+
+    def progress(self):
+        self._delay = self.policy.min_delay
+
+    def next_delay(self):
+        """
+        Registers a failed check and returns the delay before the next one or None if the deadline is exceeded.
+        """
+        self.attempts += 1
+        remaining = self.remaining()
+
+        if remaining <= 0:
+            return None
+
+        delay = self._delay * (1 + random.uniform(-self.policy.jitter, self.policy.jitter))
+        self._delay = min(self._delay * self.policy.factor, self.policy.max_delay)
+
+        return min(delay, remaining)
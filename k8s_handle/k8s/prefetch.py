@@ -0,0 +1,145 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import HTTPError
+
+from k8s_handle.transforms import add_indent
+
+log = logging.getLogger(__name__)
+
+# objects per page of a LIST request
+PREFETCH_PAGE_LIMIT = 500
+
+# secrets of other tools in the same namespaces, e.g. releases of Helm, are often large and must not be read needlessly
+PREFETCH_EXCLUDED_KINDS = ['Secret']
+
+
+class LiveState:
+    """
+    Live state of the resources of a run fetched in advance: one paginated LIST per (endpoint, namespace) of
+    the resources instead of one GET per resource. Every prefetched object is served once, the next lookups of
+    the same resource as well as lookups of resources which can't be listed fall back to GET.
+
+    If metadata_only returns True for the adapter of a resource, only metadata of the resources of its kind
+    is requested. With raw=True
+    resources are views of their JSON like kube_client.get(raw=True) returns.
+    """
+
+    def __init__(self, workers=1, metadata_only=None, raw=False):
+        self._workers = workers
+        self._metadata_only = metadata_only
+        self._raw = raw
+        self._objects = {}
+        self._listed = set()
+        self._served = set()
+        self._lock = threading.Lock()
+
+    def prefetch(self, kube_clients):
+        groups = {}
+
+        for kube_client in kube_clients:
+            key = self._group_key(kube_client)
+
+            if key is not None:
+                groups.setdefault(key, (kube_client, set()))[1].add(kube_client.name)
+
+        if not groups:
+            return
+
+        with ThreadPoolExecutor(max_workers=max(min(self._workers, len(groups)), 1)) as pool:
+            results = list(pool.map(lambda item: self._list(item[0], *item[1]), groups.items()))
+
+        with self._lock:
+            for key, objects in results:
+                if objects is None:
+                    continue
+
+                self._listed.add(key)
+                for name, resource in objects.items():
+                    self._objects[key + (name,)] = resource
+
+        log.info('Prefetched {} resources with {} requests'.format(len(self._objects), len(groups)))
+
+    def get(self, kube_client):
+        """
+        Returns the resource like kube_client.get(), from the prefetched state if it's known there.
+        """
+        known, resource = self._lookup(kube_client)
+
+        if known:
+            return resource
+
+        if self._is_metadata_only(kube_client):
+            return kube_client.get_metadata()
+
+        return kube_client.get(raw=True) if self._raw else kube_client.get()
+
+    def exists(self, kube_client):
+        """
+        Returns True or False if the existence of the resource is known from the prefetched state, otherwise None.
+        """
+        known, resource = self._lookup(kube_client)
+        return resource is not None if known else None
+
+    def _lookup(self, kube_client):
+        key = self._group_key(kube_client)
+
+        if key is None:
+            return False, None
+
+        with self._lock:
+            if key + (kube_client.name,) in self._served or key not in self._listed:
+                return False, None
+
+            # the resource may be changed by the run, so it's read from the server next time
+            self._served.add(key + (kube_client.name,))
+            return True, self._objects.pop(key + (kube_client.name,), None)
+
+    def _is_metadata_only(self, kube_client):
+        return self._metadata_only is not None and self._metadata_only(kube_client)
+
+    @staticmethod
+    def _group_key(kube_client):
+        endpoint = getattr(kube_client, 'endpoint', None)
+
+        if endpoint is None or not kube_client.name or not endpoint.supports('list'):
+            return None
+
+        if endpoint.kind in PREFETCH_EXCLUDED_KINDS or (endpoint.namespaced and not kube_client.namespace):
+            return None
+
+        return endpoint.api_version, endpoint.kind, kube_client.namespace if endpoint.namespaced else None
+
+    def _list(self, key, kube_client, names):
+        api_version, kind, namespace = key
+
+        try:
+            # a single resource is selected by its name, LIST of all resources is complete for any name
+            field_selector = 'metadata.name={}'.format(next(iter(names))) if len(names) == 1 else None
+            return key, self._list_pages(kube_client.endpoint, namespace, field_selector,
+                                         self._is_metadata_only(kube_client), self._raw)
+        except (ApiException, HTTPError) as e:
+            log.info('Unable to list {} "{}", they are read one by one: {}'.format(
+                kind, api_version, add_indent(getattr(e, 'body', None) or str(e))))
+            return key, None
+
+    @staticmethod
+    def _list_pages(endpoint, namespace, field_selector, metadata_only, raw):
+        objects = {}
+        token = None
+
+        while True:
+            response = endpoint.list(namespace=namespace, field_selector=field_selector, limit=PREFETCH_PAGE_LIMIT,
+                                     _continue=token, metadata_only=metadata_only, raw=raw)
+
+            if isinstance(response, dict):
+                items, token = response.get('items') or [], (response.get('metadata') or {}).get('continue')
+                objects.update((item['metadata']['name'], item) for item in items)
+            else:
+                items, token = response.items or [], response.metadata._continue
+                objects.update((item.metadata.name, item) for item in items)
+
+            if not token:
+                return objects
@@ -1,31 +1,105 @@
 import logging
-from time import sleep
+import threading
+from collections import Counter
+from concurrent.futures import CancelledError
+from contextlib import contextmanager
+from functools import partial
+from time import monotonic
+
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import HTTPError
 
 from kubernetes.client.models.v1_label_selector import V1LabelSelector
 from kubernetes.client.models.v1_label_selector_requirement import V1LabelSelectorRequirement
 from kubernetes.client.models.v1_resource_requirements import V1ResourceRequirements
 
 from k8s_handle import settings
+from k8s_handle.exceptions import DeadlineExceededError, ResourceExistsError
 from k8s_handle.templating import get_template_contexts
 from k8s_handle.transforms import split_str_by_capital_letters
+from . import content_hash
 from .adapters import Adapter
+from .api_clients import ApiClientRegistry
+from .dependencies import DependencyGraph
+from .parallel import ParallelRunner
+from .polling import PollingPolicy
+from .prefetch import LiveState
+from .rollout import RolloutFailureDetector
+from .tracker import RolloutTracker
 from .warning_handler import WarningHandler
 
 log = logging.getLogger(__name__)
 
+CRD_ESTABLISHED_TRIES = 60
+CRD_ESTABLISHED_TIMEOUT = 1
+
+# results of deploying resources in order of the summary of a run
+DEPLOY_RESULTS = ['created', 'replaced', 'applied', 'unchanged', 'skipped']
+
+# a watch is re-established periodically to notice cancellation and to survive idle connection drops
+WATCH_TIMEOUT = 60
+
+# kinds of adapters whose live objects are compared with templates before they are replaced, others need only
+# their metadata; custom kinds keep their names in adapters, so e.g. Service of Knative isn't one of them
+FULL_OBJECT_KINDS = ['service', 'persistent_volume_claim', 'persistent_volume']
+
 
 class Provisioner:
-    def __init__(self, command, sync_mode, show_logs):
+    def __init__(self, command, sync_mode, show_logs, api_registry=None, parallel=1, deferred_wait=False,
+                 timeout=None, server_side_apply=False, force=False):
         self.command = command
         self.sync_mode = False if show_logs else sync_mode
         self.show_logs = show_logs
+        self.parallel = parallel
+        self.deferred_wait = deferred_wait
+        self.timeout = timeout
+        self.server_side_apply = server_side_apply
+        self.force = force
         self._warning_handler = WarningHandler()
+        self._api_registry = api_registry or ApiClientRegistry(warning_handler=self._warning_handler)
+        self._cancelled = threading.Event()
+        self._deadline = None
+        self._in_progress = set()
+        self._in_progress_lock = threading.Lock()
+        self._summary = Counter()
+        self._live_state = LiveState(settings.K8S_POOL_MAXSIZE or 1,
+                                     metadata_only=lambda kube_client: kube_client.kind not in FULL_OBJECT_KINDS)
+        self._tracker = RolloutTracker({
+            'Deployment': self._is_deployment_complete,
+            'StatefulSet': self._is_statefulset_complete,
+            'DaemonSet': self._is_daemonset_complete,
+            'Job': lambda job: self._is_job_complete(job.status),
+        }, self._sleep)
 
     @staticmethod
     def _replicas_count_are_equal(replicas):
         replicas = [0 if r is None else r for r in replicas]  # replace all None to 0
         return all(r == replicas[0] for r in replicas)
 
+    @staticmethod
+    def _resource_version(resource):
+        metadata = resource.get('metadata') if isinstance(resource, dict) else getattr(resource, 'metadata', None)
+
+        if isinstance(metadata, dict):
+            return metadata.get('resourceVersion')
+
+        return getattr(metadata, 'resource_version', None)
+
+    @staticmethod
+    def _is_generation_observed(resource):
+        # status of a just replaced resource describes the previous generation until the controller catches up
+        generation = getattr(resource.metadata, 'generation', None)
+        observed_generation = getattr(resource.status, 'observed_generation', None)
+        return generation is None or (observed_generation is not None and observed_generation >= generation)
+
+    @staticmethod
+    def _is_crd_established(status):
+        for condition in getattr(status, 'conditions', None) or []:
+            if condition.type == 'Established' and condition.status == 'True':
+                return True
+
+        return False
+
     @staticmethod
     def _is_job_complete(status):
         if status.failed is not None:
@@ -38,12 +112,140 @@ class Provisioner:
         else:
             return False
 
+    @staticmethod
+    def _replace_parameters(resource, kind):
+        parameters = {}
+
+        if hasattr(resource, 'metadata'):
+            if hasattr(resource.metadata, 'resource_version'):
+                parameters['resourceVersion'] = resource.metadata.resource_version
+        elif 'metadata' in resource:
+            if 'resourceVersion' in resource['metadata']:
+                parameters['resourceVersion'] = resource['metadata']['resourceVersion']
+
+        if kind == 'service':
+            if hasattr(resource.spec, 'cluster_ip'):
+                parameters['clusterIP'] = resource.spec.cluster_ip
+
+        return parameters
+
+    @staticmethod
+    def _is_rollout_tracked(template_body):
+        if template_body['kind'] == 'DaemonSet':
+            return template_body.get('spec').get('updateStrategy', {}).get('type') != 'OnDelete'
+
+        return template_body['kind'] in ['Deployment', 'StatefulSet', 'Job']
+
     def run(self, file_path):
         if self.command == 'deploy':
             self._deploy_all(file_path)
         if self.command == 'destroy':
             self._destroy_all(file_path)
 
+    def run_all(self, file_paths):
+        if not self.timeout:
+            return self._run_all(file_paths)
+
+        # the deadline limits every wait and API request, the rest of work is cancelled when it's exceeded
+        self._deadline = monotonic() + self.timeout
+        self._api_registry.deadline = self._deadline
+        timer = threading.Timer(self.timeout, self._cancelled.set)
+        timer.daemon = True
+        timer.start()
+
+        try:
+            self._run_all(file_paths)
+        except Exception as e:
+            if monotonic() < self._deadline:
+                raise
+
+            raise DeadlineExceededError('{} not completed in {} sec., pending: {}'.format(
+                self.command.capitalize(), self.timeout, ', '.join(self._pending()) or 'none')) from e
+        finally:
+            timer.cancel()
+            self._api_registry.deadline = None
+
+    def _kube_clients(self, file_paths):
+        for file_path in file_paths:
+            for template_body in get_template_contexts(file_path):
+                # kinds of CRDs deployed by the run aren't served yet, they're discovered once the CRDs are created
+                kube_client = Adapter.get_instance(template_body, api_registry=self._api_registry, refresh=False)
+
+                if kube_client is not None:
+                    yield kube_client
+
+    def _count(self, result):
+        with self._in_progress_lock:
+            self._summary[result] += 1
+
+    def _pending(self):
+        with self._in_progress_lock:
+            return sorted(self._in_progress) + self._tracker.pending
+
+    def _run_all(self, file_paths):
+        try:
+            # server-side apply doesn't read resources before applying them
+            if self.command == 'destroy' or not self.server_side_apply:
+                self._live_state.prefetch(self._kube_clients(file_paths))
+
+            if self.parallel <= 1:
+                for file_path in file_paths:
+                    self.run(file_path)
+            else:
+                self._run_levels(file_paths)
+
+            if self.command == 'deploy':
+                self._tracker.wait(PollingPolicy.from_settings(), self._deadline)
+                log.info('Deploy summary: {}'.format(', '.join(
+                    '{} {}'.format(self._summary[result], result) for result in DEPLOY_RESULTS if self._summary[result])
+                    or 'nothing deployed'))
+        finally:
+            self._api_registry.report()
+
+    def _run_levels(self, file_paths):
+        documents = [(template_body, file_path)
+                     for file_path in file_paths for template_body in get_template_contexts(file_path)]
+        levels = DependencyGraph(documents).levels()
+
+        if self.command == 'destroy':
+            levels.reverse()
+
+        runner = ParallelRunner(self.parallel, self._cancelled)
+        for i, nodes in enumerate(levels):
+            log.info('Provisioning level {} of {}: {}'.format(i + 1, len(levels), ', '.join(str(n) for n in nodes)))
+            runner.run([(str(node), partial(self._run_node, node)) for node in nodes])
+
+    def _run_node(self, node):
+        with self._in_progress_of(node.body):
+            if self.command == 'destroy':
+                return self._destroy(node.body, node.file_path)
+
+            self._deploy(node.body, node.file_path)
+
+            # custom resources can be created only when their definition is accepted by the API server
+            if node.kind == 'CustomResourceDefinition' and node.dependents:
+                self._wait_crd_established(
+                    Adapter.get_instance(node.body, api_registry=self._api_registry),
+                    tries=CRD_ESTABLISHED_TRIES,
+                    timeout=CRD_ESTABLISHED_TIMEOUT)
+
+    @contextmanager
+    def _in_progress_of(self, template_body):
+        resource = '{} "{}"'.format(template_body.get('kind'), template_body.get('metadata', {}).get('name'))
+
+        with self._in_progress_lock:
+            self._in_progress.add(resource)
+
+        yield
+
+        # the resource is left pending if its provisioning is failed or interrupted
+        with self._in_progress_lock:
+            self._in_progress.discard(resource)
+
+    def _sleep(self, timeout):
+        if self._cancelled.wait(timeout):
+            raise CancelledError()
+
     def _is_pvc_specs_equals(self, old_obj, new_dict):
         for new_key in new_dict.keys():
             old_key = split_str_by_capital_letters(new_key)
@@ -71,85 +273,111 @@ class Provisioner:
 
         return True
 
+    def _create(self, kube_client):
+        """
+        Creates the resource and returns (response, None), or (None, the resource) if it turns out to exist already:
+        controllers create objects after they are prefetched or read, e.g. the default ServiceAccount and
+        the kube-root-ca.crt ConfigMap of a just created Namespace.
+        """
+        try:
+            return kube_client.create(), None
+        except ResourceExistsError:
+            resource = self._live_state.get(kube_client)
+
+            if resource is None:
+                raise
+
+            log.info('{} "{}" has been created meanwhile, replace it'.format(
+                kube_client.body.get('kind'), kube_client.name))
+            return None, resource
+
     def _deploy_all(self, file_path):
         for template_body in get_template_contexts(file_path):
-            self._deploy(template_body, file_path)
+            with self._in_progress_of(template_body):
+                self._deploy(template_body, file_path)
 
     def _deploy(self, template_body, file_path):
-        kube_client = Adapter.get_instance(template_body, warning_handler=self._warning_handler)
+        kube_client = Adapter.get_instance(template_body, api_registry=self._api_registry)
 
         if not kube_client:
             raise RuntimeError(
-                'Unknown apiVersion "{}" in template "{}"'.format(
-                    template_body['apiVersion'],
+                'Unknown apiVersion "{}" of kind "{}" in template "{}"'.format(
+                    template_body.get('apiVersion'),
+                    template_body.get('kind'),
                     file_path
                 )
             )
 
         log.info('Using namespace "{}"'.format(kube_client.namespace))
-        resource = kube_client.get()
 
-        if resource is None:
-            log.info('{} "{}" does not exist, create it'.format(template_body['kind'], kube_client.name))
-            kube_client.create()
+        if self.server_side_apply:
+            log.info('Apply {} "{}" on the server side'.format(template_body['kind'], kube_client.name))
+            response = kube_client.apply()
+            self._count('applied')
         else:
-            log.info('{} "{}" already exists, replace it'.format(template_body['kind'], kube_client.name))
-            parameters = {}
-
-            if hasattr(resource, 'metadata'):
-                if hasattr(resource.metadata, 'resource_version'):
-                    parameters['resourceVersion'] = resource.metadata.resource_version
-            elif 'metadata' in resource:
-                if 'resourceVersion' in resource['metadata']:
-                    parameters['resourceVersion'] = resource['metadata']['resourceVersion']
-
-            if template_body['kind'] == 'Service':
-                if hasattr(resource.spec, 'cluster_ip'):
-                    parameters['clusterIP'] = resource.spec.cluster_ip
-
-            if template_body['kind'] == 'PersistentVolumeClaim':
-                if self._is_pvc_specs_equals(resource.spec, template_body['spec']):
-                    log.info('PersistentVolumeClaim is not changed')
-                    return
-
-            if template_body['kind'] == 'PersistentVolume':
-                if resource.status.phase in ['Bound', 'Released']:
-                    log.warning('PersistentVolume has "{}" status, skip replacing'.format(resource.status.phase))
-                    return
-
-            kube_client.replace(parameters)
+            value = content_hash.stamp(template_body)
+            resource = self._live_state.get(kube_client)
+
+            if resource is None:
+                log.info('{} "{}" does not exist, create it'.format(template_body['kind'], kube_client.name))
+                response, resource = self._create(kube_client)
+
+            if resource is None:
+                self._count('created')
+            elif not self.force and content_hash.is_unchanged(
+                    resource, template_body, value, settings.K8S_FIELD_MANAGER):
+                log.info('{} "{}" is not changed, skip replacing'.format(template_body['kind'], kube_client.name))
+                response = resource
+                self._count('unchanged')
+            else:
+                log.info('{} "{}" already exists, replace it'.format(template_body['kind'], kube_client.name))
+
+                if kube_client.kind == 'persistent_volume_claim':
+                    if self._is_pvc_specs_equals(resource.spec, template_body['spec']):
+                        log.info('PersistentVolumeClaim is not changed')
+                        self._count('unchanged')
+                        return
+
+                if kube_client.kind == 'persistent_volume':
+                    if resource.status.phase in ['Bound', 'Released']:
+                        log.warning('PersistentVolume has "{}" status, skip replacing'.format(resource.status.phase))
+                        self._count('skipped')
+                        return
+
+                # conflicts with changes made after the resource was read are retried by the adapter
+                response = kube_client.replace(self._replace_parameters(resource, kube_client.kind))
+                self._count('replaced')
+
+        self._expire_discovery(kube_client)
+
+        if self.sync_mode and self.deferred_wait:
+            if self._is_rollout_tracked(template_body):
+                log.info('{} "{}" will be waited for after all resources are applied'.format(
+                    template_body['kind'], kube_client.name))
+                self._tracker.add(kube_client, template_body['kind'],
+                                  RolloutFailureDetector(kube_client, template_body['kind']))
+        elif self.sync_mode:
+            resource_version = self._resource_version(response)
 
-        if self.sync_mode:
             if template_body['kind'] == 'Deployment':
-                self._wait_deployment_complete(kube_client,
-                                               tries=settings.CHECK_STATUS_TRIES,
-                                               timeout=settings.CHECK_STATUS_TIMEOUT)
+                self._wait_deployment_complete(kube_client, resource_version=resource_version)
 
             if template_body['kind'] == 'StatefulSet':
-                self._wait_statefulset_complete(kube_client,
-                                                tries=settings.CHECK_STATUS_TRIES,
-                                                timeout=settings.CHECK_STATUS_TIMEOUT)
+                self._wait_statefulset_complete(kube_client, resource_version=resource_version)
 
             # INFO: vadim.reyder Since Kubernetes version 1.6 all DaemonSets by default have
             # `updateStrategy.type`=`RollingUpdate`, so we wait for deploy only if `updateStrategy.type` != 'OnDelete'.
             # WARNING: We consciously skip case with kubernetes version < 1.6, due to it's very old.
             if template_body['kind'] == 'DaemonSet' and \
                     template_body.get('spec').get('updateStrategy', {}).get('type') != 'OnDelete':
-                self._wait_daemonset_complete(kube_client,
-                                              tries=settings.CHECK_STATUS_TRIES,
-                                              timeout=settings.CHECK_STATUS_TIMEOUT)
+                self._wait_daemonset_complete(kube_client, resource_version=resource_version)
 
             if template_body['kind'] == 'Job':
-                return self._wait_job_complete(kube_client,
-                                               tries=settings.CHECK_STATUS_TRIES,
-                                               timeout=settings.CHECK_STATUS_TIMEOUT)
+                return self._wait_job_complete(kube_client, resource_version=resource_version)
 
         if template_body['kind'] == 'Job' and self.show_logs:
             pod_name, pod_containers = self._get_pod_name_and_containers_by_selector(
-                kube_client,
-                template_body['metadata']['name'],
-                tries=settings.CHECK_STATUS_TRIES,
-                timeout=settings.CHECK_STATUS_TIMEOUT)
+                kube_client, template_body['metadata']['name'], PollingPolicy.from_settings())
 
             log.info("Got pod name and pod containers {} {}".format(pod_name, pod_containers))
 
@@ -157,11 +385,7 @@ class Provisioner:
                 log.warning('Pod not found for showing logs')
                 return
 
-            is_successful = self._wait_pod_running(
-                kube_client,
-                pod_name,
-                tries=settings.CHECK_STATUS_TRIES,
-                timeout=settings.CHECK_STATUS_TIMEOUT)
+            is_successful = self._wait_pod_running(kube_client, pod_name, PollingPolicy.from_settings())
 
             for pod_container in pod_containers:
                 log.info('\n{}'.format(kube_client.read_pod_logs(pod_name, pod_container)))
@@ -171,22 +395,24 @@ class Provisioner:
 
     def _destroy_all(self, file_path):
         for template_body in get_template_contexts(file_path):
-            self._destroy(template_body, file_path)
+            with self._in_progress_of(template_body):
+                self._destroy(template_body, file_path)
 
     def _destroy(self, template_body, file_path):
-        kube_client = Adapter.get_instance(template_body, warning_handler=self._warning_handler)
+        kube_client = Adapter.get_instance(template_body, api_registry=self._api_registry)
 
         if not kube_client:
             raise RuntimeError(
-                'Unknown apiVersion "{}" in template "{}"'.format(
-                    template_body['apiVersion'],
+                'Unknown apiVersion "{}" of kind "{}" in template "{}"'.format(
+                    template_body.get('apiVersion'),
+                    template_body.get('kind'),
                     file_path
                 )
             )
 
         log.info('Using namespace "{}"'.format(kube_client.namespace))
         log.info('Trying to delete {} "{}"'.format(template_body['kind'], kube_client.name))
-        response = kube_client.delete()
+        response = kube_client.delete() if self._live_state.exists(kube_client) is not False else None
 
         if response is None:
             log.info("{} {} is not found".format(template_body['kind'], kube_client.name))
@@ -201,106 +427,258 @@ class Provisioner:
             raise RuntimeError('{} "{}" deletion failed: {}'.format(template_body['kind'], kube_client.name, response))
 
         if self.sync_mode:
-            self._wait_destruction_complete(kube_client, template_body['kind'],
-                                            tries=settings.CHECK_STATUS_TRIES,
-                                            timeout=settings.CHECK_STATUS_TIMEOUT)
+            self._wait_destruction_complete(kube_client, template_body['kind'])
 
         log.info('{} "{}" has been deleted'.format(template_body['kind'], kube_client.name))
 
-    @staticmethod
-    def _get_pod_name_and_containers_by_selector(kube_client, selector, tries, timeout):
-        for i in range(0, tries):
+    def _get_pod_name_and_containers_by_selector(self, kube_client, selector, policy):
+        poller = policy.start(self._deadline)
+
+        while True:
             pod = kube_client.get_pods_by_selector(selector)
 
             if len(pod.items) == 1:
                 log.info('Found pod "{}"'.format(pod.items[0].metadata.name))
                 containers = [container.name for container in pod.items[0].spec.containers]
                 return pod.items[0].metadata.name, containers
+
+            delay = poller.next_delay()
+            if delay is None:
+                break
+
+            if len(pod.items) == 0:
+                log.warning('No pods found by job-name={}, next attempt in {:.1f} sec.'.format(selector, delay))
             else:
-                if len(pod.items) == 0:
-                    log.warning('No pods found by job-name={}, next attempt in {} sec.'.format(selector, timeout))
-                else:
-                    names = [pod.metadata.name for pod in pod.items]
-                    log.warning('More than one pod found by job-name={}: {}, '
-                                'next attempt in {} sec.'.format(selector, names, timeout))
-            sleep(timeout)
-
-        log.error('Problems with getting pod by selector job-name={} for {} tries'.format(selector, tries))
+                names = [pod.metadata.name for pod in pod.items]
+                log.warning('More than one pod found by job-name={}: {}, '
+                            'next attempt in {:.1f} sec.'.format(selector, names, delay))
+            self._sleep(delay)
+
+        log.error('Problems with getting pod by selector job-name={} for {} tries'.format(selector, poller.attempts))
         return '', []
 
-    def _wait_deployment_complete(self, kube_client, tries, timeout):
-        for i in range(0, tries):
-            sleep(timeout)
-            deployment = kube_client.get()
-            status = deployment.status
+    @staticmethod
+    def _polling_policy(tries, timeout):
+        if tries is None or timeout is None:
+            return PollingPolicy.from_settings()
 
-            replicas = [deployment.spec.replicas, status.replicas, status.available_replicas,
-                        status.ready_replicas, status.updated_replicas]
+        return PollingPolicy.from_tries(tries, timeout)
 
-            log.info('desiredReplicas = {}, updatedReplicas = {}, availableReplicas = {}'.
-                     format(replicas[0], replicas[4], replicas[2]))
-            if self._replicas_count_are_equal(replicas) and status.unavailable_replicas is None:
-                log.info('Deployment completed on {} attempt'.format(i + 1))
-                return
-            else:
-                log.info('Deployment not completed on {} attempt, next attempt in {} sec.'.format(i + 1, timeout))
-
-        raise RuntimeError('Deployment not completed for {} tries'.format(tries))
-
-    def _wait_statefulset_complete(self, kube_client, tries, timeout):
-        for i in range(0, tries):
-            sleep(timeout)
-            statefulset = kube_client.get()
-            status = statefulset.status
-
-            current_revision = status.current_revision
-            update_revision = status.update_revision
-            replicas = [statefulset.spec.replicas, status.current_replicas, status.ready_replicas]
-
-            log.info('Current revision {}, should be {}'.format(current_revision, update_revision))
-            if current_revision == update_revision:
-                log.info('desiredReplicas = {}, updatedReplicas = {}, availableReplicas = {}'.
-                         format(replicas[0], replicas[1], replicas[2]))
-                if self._replicas_count_are_equal(replicas):
-                    log.info('StatefulSet completed on {} attempt'.format(i))
-                    return
-            else:
-                log.info('StatefulSet not completed on {} attempt, next attempt in {} sec.'.format(i, timeout))
+    @staticmethod
+    def _status(resource):
+        if isinstance(resource, dict):
+            return resource.get('status')
+
+        return getattr(resource, 'status', None)
+
+    def _wait_for(self, kube_client, description, is_complete, policy, resource_version=None, missing_ok=False,
+                  detector=None, metadata_only=False):
+        """
+        Waits until is_complete(resource) is True within the policy timeout. The current state of the resource is
+        checked first, then it's watched starting from its version (or from the resource_version if the state has
+        none), polling is used only if the watch is not available. The detector fails the wait as soon as
+        the resource can't complete. The resource is read as the view of its JSON, with metadata_only without
+        its spec and status when it's not watched.
+        """
+        poller = policy.start(self._deadline)
+        read = kube_client.get_metadata if metadata_only else partial(kube_client.get, raw=True)
+
+        def check(resource):
+            if resource is None and not missing_ok:
+                raise RuntimeError('{} "{}" not found'.format(description, kube_client.name))
+
+            if is_complete(resource):
+                return True
 
-        raise RuntimeError('StatefulSet not completed for {} tries'.format(tries))
+            if detector is not None:
+                detector.check(resource)
 
-    def _wait_daemonset_complete(self, kube_client, tries, timeout):
-        for i in range(0, tries):
-            sleep(timeout)
-            status = kube_client.get().status
+            return False
 
-            replicas = [status.desired_number_scheduled, status.number_available,
-                        status.number_ready, status.updated_number_scheduled]
-            log.info('desiredNodes = {}, availableNodes = {}, readyNodes = {}, updatedNodes = {}'.
-                     format(replicas[0], replicas[1], replicas[2], replicas[3]))
-            if self._replicas_count_are_equal(replicas) and status.number_unavailable is None:
-                log.info('DaemonSet completed on {} attempt'.format(i))
-                return
-            else:
-                log.info('DaemonSet not completed on {} attempt, next attempt in {} sec.'.format(i, timeout))
+        # a replace not changing the resource produces no events, so the watch would wait for nothing
+        resource = read()
 
-        raise RuntimeError('DaemonSet not completed for {} tries'.format(tries))
+        if check(resource):
+            log.info('{} completed'.format(description))
+            return
 
-    def _wait_job_complete(self, kube_client, tries, timeout):
-        for i in range(0, tries):
-            sleep(timeout)
-            status = kube_client.get().status
-            if self._is_job_complete(status):
-                log.info('Job completed on {} attempt'.format(i))
-                return
-            else:
-                log.info('Job not completed on {} attempt, next attempt in {} sec.'.format(i, timeout))
+        resource_version = self._resource_version(resource) or resource_version
 
-        raise RuntimeError('Job not completed for {} tries'.format(tries))
+        # pods of a workload don't produce events of the watched resource, so they are checked between watches
+        window = detector.interval if detector is not None else WATCH_TIMEOUT
+        completed = self._watch_until(kube_client, check, resource_version, poller, window, read)
 
-    @staticmethod
-    def _wait_pod_running(kube_client, pod_name, tries, timeout):
-        for i in range(0, tries):
+        if completed is None:
+            completed = self._poll_until(kube_client, check, description, poller, read)
+
+        if not completed:
+            raise RuntimeError('{} not completed for {} tries in {:.0f} sec.'.format(
+                description, max(poller.attempts, 1), poller.elapsed()))
+
+        log.info('{} completed'.format(description))
+
+    def _watch_until(self, kube_client, check, resource_version, poller, window=WATCH_TIMEOUT, read=None):
+        """
+        Returns True when the check is passed, False when the deadline is exceeded
+        and None when the watch isn't available. The watch is re-established every window seconds
+        and the last state of the resource is checked again then.
+        """
+        read = read or partial(kube_client.get, raw=True)
+        first = True
+        resource = None
+        known = False
+
+        while True:
+            if self._cancelled.is_set():
+                raise CancelledError()
+
+            remaining = int(poller.remaining())
+
+            if remaining <= 0 and not first:
+                return False
+
+            if not first:
+                if not known:
+                    resource, known = read(), True
+
+                if check(resource):
+                    return True
+
+            first = False
+
+            try:
+                events = kube_client.watch(resource_version, max(min(remaining, window), 1), raw=True)
+
+                if events is None:
+                    return None
+
+                for event_type, resource in events:
+                    known = True
+
+                    if event_type == 'DELETED':
+                        resource = None
+                    else:
+                        resource_version = self._resource_version(resource) or resource_version
+
+                    if check(resource):
+                        return True
+
+            except ApiException as e:
+                if e.status != 410:
+                    log.warning('Unable to watch {} "{}", fall back to polling: {}'.format(
+                        kube_client.kind, kube_client.name, e.reason))
+                    return None
+
+                # the resource version is too old, start from the current state
+                resource, known = read(), True
+
+                if check(resource):
+                    return True
+
+                resource_version = self._resource_version(resource)
+
+            except HTTPError as e:
+                log.warning('Unable to watch {} "{}", fall back to polling: {}'.format(
+                    kube_client.kind, kube_client.name, e))
+                return None
+
+    def _poll_until(self, kube_client, check, description, poller, read=None):
+        read = read or partial(kube_client.get, raw=True)
+        status = None
+
+        while True:
+            resource = read()
+
+            if check(resource):
+                return True
+
+            # any change of the status (updated replicas, conditions, etc.) means the rollout is progressing
+            if status is not None and self._status(resource) != status:
+                poller.progress()
+
+            status = self._status(resource)
+            delay = poller.next_delay()
+
+            if delay is None:
+                return False
+
+            log.info('{} not completed on {} attempt, next attempt in {:.1f} sec.'.format(
+                description, poller.attempts, delay))
+            self._sleep(delay)
+
+    def _wait_deployment_complete(self, kube_client, tries=None, timeout=None, resource_version=None):
+        self._wait_for(kube_client, 'Deployment', self._is_deployment_complete,
+                       self._polling_policy(tries, timeout), resource_version,
+                       detector=RolloutFailureDetector(kube_client, 'Deployment'))
+
+    def _wait_statefulset_complete(self, kube_client, tries=None, timeout=None, resource_version=None):
+        self._wait_for(kube_client, 'StatefulSet', self._is_statefulset_complete,
+                       self._polling_policy(tries, timeout), resource_version,
+                       detector=RolloutFailureDetector(kube_client, 'StatefulSet'))
+
+    def _wait_daemonset_complete(self, kube_client, tries=None, timeout=None, resource_version=None):
+        self._wait_for(kube_client, 'DaemonSet', self._is_daemonset_complete,
+                       self._polling_policy(tries, timeout), resource_version,
+                       detector=RolloutFailureDetector(kube_client, 'DaemonSet'))
+
+    def _wait_job_complete(self, kube_client, tries=None, timeout=None, resource_version=None):
+        self._wait_for(kube_client, 'Job', lambda job: self._is_job_complete(job.status),
+                       self._polling_policy(tries, timeout), resource_version,
+                       detector=RolloutFailureDetector(kube_client, 'Job'))
+
+    def _is_deployment_complete(self, deployment):
+        status = deployment.status
+        replicas = [deployment.spec.replicas, status.replicas, status.available_replicas,
+                    status.ready_replicas, status.updated_replicas]
+
+        log.info('desiredReplicas = {}, updatedReplicas = {}, availableReplicas = {}'.
+                 format(replicas[0], replicas[4], replicas[2]))
+
+        return self._is_generation_observed(deployment) and \
+            self._replicas_count_are_equal(replicas) and status.unavailable_replicas is None
+
+    def _is_statefulset_complete(self, statefulset):
+        status = statefulset.status
+        replicas = [statefulset.spec.replicas, status.current_replicas, status.ready_replicas]
+
+        log.info('Current revision {}, should be {}'.format(status.current_revision, status.update_revision))
+
+        if not self._is_generation_observed(statefulset) or status.current_revision != status.update_revision:
+            return False
+
+        log.info('desiredReplicas = {}, updatedReplicas = {}, availableReplicas = {}'.
+                 format(replicas[0], replicas[1], replicas[2]))
+
+        return self._replicas_count_are_equal(replicas)
+
+    def _is_daemonset_complete(self, daemonset):
+        status = daemonset.status
+        replicas = [status.desired_number_scheduled, status.number_available,
+                    status.number_ready, status.updated_number_scheduled]
+
+        log.info('desiredNodes = {}, availableNodes = {}, readyNodes = {}, updatedNodes = {}'.
+                 format(replicas[0], replicas[1], replicas[2], replicas[3]))
+
+        return self._is_generation_observed(daemonset) and \
+            self._replicas_count_are_equal(replicas) and status.number_unavailable is None
+
+    def _wait_crd_established(self, kube_client, tries, timeout):
+        self._wait_for(kube_client, 'CustomResourceDefinition "{}" establishment'.format(kube_client.name),
+                       lambda crd: self._is_crd_established(crd.status), PollingPolicy.from_tries(tries, timeout))
+        self._expire_discovery(kube_client)
+
+    def _expire_discovery(self, kube_client):
+        # kinds of a CRD may have been looked up in vain before it was created or established
+        group = (kube_client.body.get('spec') or {}).get('group')
+
+        if kube_client.kind == 'custom_resource_definition' and group:
+            self._api_registry.discovery.expire_refreshes(group)
+
+    def _wait_pod_running(self, kube_client, pod_name, policy):
+        poller = policy.start(self._deadline)
+        phase = None
+
+        while True:
             status = kube_client.read_pod_status(pod_name)
 
             log.info('Pod "{}" status: {}'.format(pod_name, status.status.phase))
@@ -308,19 +686,20 @@ class Provisioner:
                 return True
             if status.status.phase in ['Failed', 'Unknown']:
                 return False
-            sleep(timeout)
 
-        raise RuntimeError('Pod "{}" not completed for {} tries'.format(pod_name, tries))
+            if phase is not None and status.status.phase != phase:
+                poller.progress()
 
-    @staticmethod
-    def _wait_destruction_complete(kube_client, kind, tries, timeout):
-        for i in range(0, tries):
-            sleep(timeout)
-            if kube_client.get() is None:
-                log.info('{} destruction completed on {} attempt'.format(kind, i + 1))
-                return
-            else:
-                log.info('{} destruction not completed on {} attempt, '
-                         'next attempt in {} sec.'.format(kind, i + 1, timeout))
+            phase = status.status.phase
+            delay = poller.next_delay()
+
+            if delay is None:
+                break
+
+            self._sleep(delay)
+
+        raise RuntimeError('Pod "{}" not completed for {} tries'.format(pod_name, poller.attempts))
 
-        raise RuntimeError('{} destruction not completed for {} tries'.format(kind, tries))
+    def _wait_destruction_complete(self, kube_client, kind, tries=None, timeout=None):
+        self._wait_for(kube_client, '{} destruction'.format(kind), lambda resource: resource is None,
+                       self._polling_policy(tries, timeout), missing_ok=True, metadata_only=True)
@@ -0,0 +1,108 @@
+import logging
+import threading
+from collections import Counter
+from time import sleep
+
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import HTTPError
+
+from k8s_handle import settings
+from .polling import PollingPolicy
+
+log = logging.getLogger(__name__)
+
+# backoff of retries in seconds, a retry is not made later than RETRY_TIMEOUT after the first attempt
+RETRY_MIN_DELAY = 0.5
+RETRY_MAX_DELAY = 8
+RETRY_TIMEOUT = 60
+
+CONFLICT = 'conflict'
+SERVER_ERROR = 'server error'
+CONNECTION_ERROR = 'connection error'
+
+# the server may have handled the request before the failure, so a creation may be already made
+AMBIGUOUS_REASONS = [SERVER_ERROR, CONNECTION_ERROR]
+
+
+def classify(error):
+    """
+    Returns the reason of a failed request if it may be retried, otherwise None. Requests rejected with 429 are
+    already retried by the API client after the delay asked by the server, so they're not retried again.
+    """
+    if isinstance(error, ApiException):
+        if error.status == 409:
+            return CONFLICT
+
+        if error.status in [500, 502, 503, 504]:
+            return SERVER_ERROR
+
+        return None
+
+    if isinstance(error, (HTTPError, ConnectionError)):
+        return CONNECTION_ERROR
+
+    return None
+
+
+class RetryPolicy:
+    """
+    Retries of requests to the API server classified by the reason of failures, shared by the adapters of a run
+    and counting retries per reason. Server errors and broken connections are retried with exponential backoff,
+    conflicts are retried at once after the request is refreshed.
+    """
+
+    def __init__(self, retries=None, min_delay=RETRY_MIN_DELAY, max_delay=RETRY_MAX_DELAY, timeout=RETRY_TIMEOUT,
+                 sleep=sleep):
+        self.retries = settings.K8S_RETRIES if retries is None else retries
+        self.policy = PollingPolicy(timeout, min_delay=min_delay, max_delay=max_delay)
+        self.counts = Counter()
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def call(self, request, description, on_conflict=None, on_exists=None):
+        """
+        Returns the result of request() retrying it on transient failures. A conflict is retried only if
+        on_conflict is given, it's called before the retry, e.g. to read the current resource version. Requests
+        creating objects pass on_exists instead: if the object already exists after a failure which the server
+        may have handled, it was created by the failed attempt and the result of on_exists() is returned.
+        """
+        poller = self.policy.start()
+        ambiguous = False
+
+        while True:
+            try:
+                return request()
+            except (ApiException, HTTPError, ConnectionError) as e:
+                reason = classify(e)
+
+                if reason == CONFLICT and ambiguous and on_exists is not None:
+                    log.info('{} was made by the failed attempt'.format(description.capitalize()))
+                    return on_exists()
+
+                if reason is None or (reason == CONFLICT and on_conflict is None) or poller.attempts >= self.retries:
+                    raise
+
+                delay = 0 if reason == CONFLICT else poller.next_delay()
+
+                if delay is None:
+                    raise
+
+                if reason == CONFLICT:
+                    poller.attempts += 1
+
+                ambiguous = ambiguous or reason in AMBIGUOUS_REASONS
+
+                with self._lock:
+                    self.counts[reason] += 1
+
+                log.warning('Unable to {}, {}, retry {} of {} in {:.1f} sec.'.format(
+                    description, reason, poller.attempts, self.retries, delay))
+                self._sleep(delay)
+
+                if reason == CONFLICT:
+                    on_conflict()
+
+    def report(self):
+        if self.counts:
+            log.info('Requests to the API server were retried: {}'.format(
+                ', '.join('{} {}'.format(count, reason) for reason, count in sorted(self.counts.items()))))
@@ -0,0 +1,151 @@
+from time import monotonic
+
+# waiting reasons of a container which don't go away without changes of the resource
+FATAL_WAITING_REASONS = [
+    'InvalidImageName',
+    'CrashLoopBackOff',
+    'CreateContainerConfigError',
+    'CreateContainerError',
+    'RunContainerError',
+]
+
+# waiting reasons of a container caused by failed image pulls, which may be transient, e.g. timeouts or 5xx
+# responses of the registry, so they're fatal only if they persist for IMAGE_PULL_FAILURE_TIMEOUT seconds
+IMAGE_PULL_WAITING_REASONS = [
+    'ErrImagePull',
+    'ImagePullBackOff',
+]
+
+IMAGE_PULL_FAILURE_TIMEOUT = 60
+
+# pods are listed at most once per interval in seconds
+ROLLOUT_CHECK_INTERVAL = 5
+
+DEPLOYMENT_REVISION_ANNOTATION = 'deployment.kubernetes.io/revision'
+
+
+class RolloutFailureDetector:
+    """
+    Detects rollouts which can't complete: a Deployment exceeded its progress deadline
+    or a container of the new pods of a workload is stuck in one of FATAL_WAITING_REASONS,
+    or in one of IMAGE_PULL_WAITING_REASONS for image_pull_timeout seconds.
+    """
+
+    def __init__(self, kube_client, kind, interval=ROLLOUT_CHECK_INTERVAL,
+                 image_pull_timeout=IMAGE_PULL_FAILURE_TIMEOUT):
+        self.kube_client = kube_client
+        self.kind = kind
+        self.interval = interval
+        self.image_pull_timeout = image_pull_timeout
+        self._checked = None
+        # when containers were first seen failing to pull their images, by pod and container names
+        self._pull_failures = {}
+
+    def check(self, resource):
+        """
+        Raises RuntimeError with the reason of the failure if the rollout of the resource can't complete.
+        """
+        if resource is None or getattr(resource, 'metadata', None) is None:
+            return
+
+        if self.kind == 'Deployment':
+            self._check_progress_deadline(resource)
+
+        now = monotonic()
+        if self._checked is not None and now - self._checked < self.interval:
+            return
+
+        self._checked = now
+        pull_failures, self._pull_failures = self._pull_failures, {}
+
+        for pod in self._pods(resource) or []:
+            self._check_pod(pod, now, pull_failures)
+
+    def _fail(self, reason):
+        raise RuntimeError('{} "{}" rollout failed: {}'.format(self.kind, self.kube_client.name, reason))
+
+    def _check_progress_deadline(self, deployment):
+        generation = getattr(deployment.metadata, 'generation', None)
+        observed_generation = getattr(deployment.status, 'observed_generation', None)
+
+        # the condition may describe the previous generation until the controller catches up
+        if generation is not None and (observed_generation is None or observed_generation < generation):
+            return
+
+        for condition in getattr(deployment.status, 'conditions', None) or []:
+            if condition.type == 'Progressing' and condition.reason == 'ProgressDeadlineExceeded':
+                self._fail('{}: {}'.format(condition.reason, condition.message))
+
+    def _pods(self, resource):
+        selector = self._selector(resource)
+
+        if not selector:
+            return None
+
+        if self.kind == 'Deployment':
+            return self._deployment_pods(resource, selector)
+
+        if self.kind == 'StatefulSet' and getattr(resource.status, 'update_revision', None):
+            selector = '{},controller-revision-hash={}'.format(selector, resource.status.update_revision)
+
+        return self._owned(self.kube_client.list_pods(selector), resource)
+
+    def _deployment_pods(self, deployment, selector):
+        revision = (deployment.metadata.annotations or {}).get(DEPLOYMENT_REVISION_ANNOTATION)
+        replica_sets = self._owned(self.kube_client.list_replica_sets(selector), deployment) or []
+
+        for replica_set in replica_sets:
+            if (replica_set.metadata.annotations or {}).get(DEPLOYMENT_REVISION_ANNOTATION) != revision:
+                continue
+
+            pod_template_hash = (replica_set.metadata.labels or {}).get('pod-template-hash')
+            if pod_template_hash:
+                return self._owned(
+                    self.kube_client.list_pods('{},pod-template-hash={}'.format(selector, pod_template_hash)),
+                    replica_set)
+
+        return None
+
+    @staticmethod
+    def _selector(resource):
+        selector = getattr(getattr(resource, 'spec', None), 'selector', None)
+        match_labels = getattr(selector, 'match_labels', None)
+
+        if not isinstance(match_labels, dict):
+            return None
+
+        return ','.join('{}={}'.format(key, value) for key, value in sorted(match_labels.items()))
+
+    @staticmethod
+    def _owned(items, owner):
+        if items is None:
+            return None
+
+        uid = getattr(owner.metadata, 'uid', None)
+        if uid is None:
+            return items
+
+        return [item for item in items
+                if any(reference.uid == uid for reference in item.metadata.owner_references or [])]
+
+    def _check_pod(self, pod, now, pull_failures):
+        statuses = (pod.status.init_container_statuses or []) + (pod.status.container_statuses or [])
+
+        for status in statuses:
+            waiting = status.state.waiting if status.state else None
+
+            if waiting is None:
+                continue
+
+            if waiting.reason in IMAGE_PULL_WAITING_REASONS:
+                key = (pod.metadata.name, status.name)
+                since = self._pull_failures[key] = pull_failures.get(key, now)
+
+                if now - since < self.image_pull_timeout:
+                    continue
+            elif waiting.reason not in FATAL_WAITING_REASONS:
+                continue
+
+            self._fail('pod "{}" container "{}": {}{}'.format(
+                pod.metadata.name, status.name, waiting.reason,
+                ' ({})'.format(waiting.message) if waiting.message else ''))
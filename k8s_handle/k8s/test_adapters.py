@@ -1,11 +1,14 @@
+import json
 import unittest
+from unittest.mock import Mock, patch
 
-from kubernetes.client import V1APIResource
+from kubernetes.client.rest import ApiException
 
 from k8s_handle.exceptions import ProvisioningError
 from k8s_handle.transforms import split_str_by_capital_letters
-from .adapters import Adapter, AdapterBuiltinKind, AdapterCustomKind
-from .mocks import K8sClientMock, CustomObjectsAPIMock, ResourcesAPIMock
+from .adapters import Adapter, AdapterBuiltinKind, AdapterDynamicKind
+from .api_clients import ApiClientRegistry
+from .mocks import K8sClientMock
 
 
 class TestAdapterBuiltInKind(unittest.TestCase):
@@ -163,95 +166,94 @@ class TestAdapterBuiltInKind(unittest.TestCase):
 
         self.assertEqual(res, {'key1': 'value1'})
 
+    @patch('kubernetes.watch.Watch.stream')
+    def test_watch(self, mocked_stream):
+        mocked_stream.return_value = iter([{'type': 'MODIFIED', 'object': 'deployment'}])
+        api = Mock(spec=['list_namespaced_deployment'])
+        deployment = AdapterBuiltinKind(
+            api=api, spec={'kind': 'Deployment', 'metadata': {'name': 'test', 'namespace': 'ns'}})
+
+        self.assertEqual(list(deployment.watch('10', 30)), [('MODIFIED', 'deployment')])
+        mocked_stream.assert_called_once_with(
+            api.list_namespaced_deployment, namespace='ns', field_selector='metadata.name=test', timeout_seconds=30,
+            _request_timeout=40, resource_version='10')
+
+    def test_watch_not_supported(self):
+        deployment = AdapterBuiltinKind(
+            api=K8sClientMock(''), spec={'kind': 'Deployment', 'metadata': {'name': 'test'}})
+        self.assertIsNone(deployment.watch('10', 30))
+
 
 class TestAdapter(unittest.TestCase):
+    RESOURCES = {
+        '/api/v1': {'groupVersion': 'v1', 'resources': [
+            {'name': 'services', 'kind': 'Service', 'namespaced': True, 'singularName': '', 'verbs': ['get']},
+        ]},
+        '/apis/apps/v1': {'groupVersion': 'apps/v1', 'resources': [
+            {'name': 'deployments', 'kind': 'Deployment', 'namespaced': True, 'singularName': '', 'verbs': ['get']},
+            {'name': 'deployments/scale', 'kind': 'Scale', 'namespaced': True, 'singularName': '', 'verbs': ['get']},
+        ]},
+        '/apis/example.com/v1': {'groupVersion': 'example.com/v1', 'resources': [
+            {'name': 'widgets', 'kind': 'Widget', 'namespaced': True, 'singularName': '', 'verbs': ['get']},
+        ]},
+    }
+
+    def _registry(self):
+        registry = ApiClientRegistry()
+        registry.api_client.call_api = Mock(side_effect=self._call_api)
+        return registry
+
+    def _call_api(self, path, *args, **kwargs):
+        if path not in self.RESOURCES:
+            raise ApiException(status=404, reason='Not Found')
+
+        return Mock(data=json.dumps(self.RESOURCES[path]))
+
     def test_get_instance_custom(self):
-        self.assertIsInstance(
-            Adapter.get_instance({'kind': "CustomKind"}, CustomObjectsAPIMock(), ResourcesAPIMock()),
-            AdapterCustomKind
-        )
-        self.assertIsInstance(
-            Adapter.get_instance({'kind': "CustomKind"}, CustomObjectsAPIMock(), ResourcesAPIMock()),
-            AdapterCustomKind
-        )
+        adapter = Adapter.get_instance(
+            {'kind': 'Widget', 'apiVersion': 'example.com/v1', 'metadata': {'namespace': 'test_namespace'}},
+            api_registry=self._registry())
+        self.assertIsInstance(adapter, AdapterDynamicKind)
+        self.assertFalse(adapter.endpoint.typed)
+        self.assertEqual(adapter.kind, 'Widget')
+        self.assertEqual(adapter.namespace, 'test_namespace')
+        self.assertEqual(adapter.endpoint.plural, 'widgets')
 
     def test_get_instance_test(self):
         self.assertIsInstance(
             Adapter.get_instance(
                 {
-                    'kind': Adapter.kinds_builtin[0],
+                    'kind': 'ConfigMap',
                     'apiVersion': 'test/test'
                 }
             ).api, K8sClientMock)
 
     def test_get_instance_builtin(self):
-        self.assertIsInstance(
-            Adapter.get_instance(
-                {
-                    'kind': Adapter.kinds_builtin[0],
-                    'apiVersion': 'apps/v1'
-                }
-            ), AdapterBuiltinKind)
+        adapter = Adapter.get_instance({'kind': 'Deployment', 'apiVersion': 'apps/v1'}, api_registry=self._registry())
+        self.assertIsInstance(adapter, AdapterDynamicKind)
+        self.assertEqual(adapter.kind, 'deployment')
+        self.assertEqual(adapter.endpoint.plural, 'deployments')
+
+    def test_get_instance_shares_api_client(self):
+        registry = self._registry()
+        deployment = Adapter.get_instance({'kind': 'Deployment', 'apiVersion': 'apps/v1'}, api_registry=registry)
+        service = Adapter.get_instance({'kind': 'Service', 'apiVersion': 'v1'}, api_registry=registry)
+        self.assertIs(deployment.api.api_client, registry.api_client)
+        self.assertIs(deployment.core_api, service.core_api)
+
+    def test_get_instance_reuses_endpoint(self):
+        registry = self._registry()
+        first = Adapter.get_instance({'kind': 'Deployment', 'apiVersion': 'apps/v1'}, api_registry=registry)
+        second = Adapter.get_instance({'kind': 'Deployment', 'apiVersion': 'apps/v1'}, api_registry=registry)
+        self.assertIs(first.endpoint, second.endpoint)
+        self.assertEqual(registry.api_client.call_api.call_count, 1)
 
     def test_get_instance_negative(self):
-        self.assertIsNone(
-            Adapter.get_instance(
-                {
-                    'kind': Adapter.kinds_builtin[0],
-                    'apiVersion': 'unknown'
-                }
-            )
-        )
-
-
-class TestAdapterCustomKind(unittest.TestCase):
-    @staticmethod
-    def _resources_api_mock():
-        return ResourcesAPIMock(
-            'version',
-            'group/version',
-            [V1APIResource(None, 'group', 'kind', 'kinds', True, [], 'kind', [], verbs=[])]
-        )
-
-    def test_initialization_positive(self):
-        adapter = Adapter.get_instance(
-            {
-                'kind': 'kind',
-                'apiVersion': 'group/version',
-                'metadata': {
-                    "namespace": 'test_namespace'
-                }
-            }, CustomObjectsAPIMock(), TestAdapterCustomKind._resources_api_mock()
-        )
-        self.assertEqual(adapter.kind, 'kind')
-        self.assertEqual(adapter.namespace, 'test_namespace')
-        self.assertEqual(adapter.group, 'group')
-        self.assertEqual(adapter.version, 'version')
-        self.assertEqual(adapter.plural, 'kinds')
-        self.assertIsInstance(adapter.api, CustomObjectsAPIMock)
-
-    def test_initialization_kind_missing(self):
-        adapter = Adapter.get_instance({}, CustomObjectsAPIMock(), TestAdapterCustomKind._resources_api_mock())
-        self.assertFalse(adapter.kind)
-        self.assertFalse(adapter.plural)
-
-    def test_initialization_api_version_invalid(self):
-        adapter = Adapter.get_instance({}, CustomObjectsAPIMock(), TestAdapterCustomKind._resources_api_mock())
-        self.assertFalse(adapter.group)
-        self.assertFalse(adapter.version)
-
-        adapter = Adapter.get_instance(
-            {'apiVersion': 'noslash'},
-            CustomObjectsAPIMock(),
-            TestAdapterCustomKind._resources_api_mock()
-        )
-        self.assertFalse(adapter.group)
-        self.assertFalse(adapter.version)
-
-        adapter = Adapter.get_instance(
-            {'apiVersion': 'domain/version/something'},
-            CustomObjectsAPIMock(),
-            ResourcesAPIMock()
-        )
-        self.assertEqual(adapter.group, 'domain')
-        self.assertEqual(adapter.version, 'version/something')
+        registry = self._registry()
+        self.assertIsNone(Adapter.get_instance({'kind': 'ConfigMap', 'apiVersion': 'unknown'}, api_registry=registry))
+        self.assertIsNone(Adapter.get_instance({'kind': 'Scale', 'apiVersion': 'apps/v1'}, api_registry=registry))
+        self.assertIsNone(Adapter.get_instance({'kind': 'Deployment', 'apiVersion': 'apps/v2'}, api_registry=registry))
+        self.assertIsNone(Adapter.get_instance({}, api_registry=registry))
+        self.assertIsNone(Adapter.get_instance({'kind': 'Widget', 'apiVersion': 'noslash'}, api_registry=registry))
+        self.assertIsNone(Adapter.get_instance({'kind': 'Widget', 'apiVersion': 'example.com/v1/extra'},
+                                               api_registry=registry))
@@ -1,14 +1,18 @@
 import types
 import unittest
+from time import monotonic
 from unittest.mock import Mock
 from unittest.mock import call
 from unittest.mock import patch
 
 from urllib3 import HTTPResponse
-from kubernetes.client.rest import RESTResponse
+from kubernetes import client
+from kubernetes.client.rest import ApiException, RESTResponse
 
-from k8s_handle.exceptions import InvalidWarningHeader
-from .api_clients import ApiClientWithWarningHandler
+from k8s_handle import settings
+from k8s_handle.exceptions import DeadlineExceededError, InvalidWarningHeader
+from .api_clients import RATE_LIMIT_RETRIES, ApiClientRegistry, ApiClientWithWarningHandler
+from .throttling import RateLimiter
 
 
 class TestApiClientWithWarningHandler(unittest.TestCase):
@@ -44,6 +48,56 @@ class TestApiClientWithWarningHandler(unittest.TestCase):
         headers = []
         self._test_request(headers).assert_not_called()
 
+    @patch('kubernetes.client.api_client.ApiClient.request')
+    def test_request_default_timeout(self, mocked_request):
+        mocked_request.return_value = RESTResponse(HTTPResponse())
+        api_client = ApiClientWithWarningHandler(request_timeout=(1, 2))
+
+        api_client.request('GET', 'url')
+        self.assertEqual(mocked_request.call_args.kwargs['_request_timeout'], (1, 2))
+
+        api_client.request('GET', 'url', _request_timeout=5)
+        self.assertEqual(mocked_request.call_args.kwargs['_request_timeout'], 5)
+
+    @patch('kubernetes.client.api_client.ApiClient.request')
+    def test_request_deadline(self, mocked_request):
+        mocked_request.return_value = RESTResponse(HTTPResponse())
+        api_client = ApiClientWithWarningHandler(request_timeout=(1, 60), deadline=monotonic() + 30)
+
+        api_client.request('GET', 'url')
+        connect, read = mocked_request.call_args.kwargs['_request_timeout']
+        self.assertEqual(connect, 1)
+        self.assertTrue(29 < read <= 30, read)
+
+        api_client.deadline = monotonic()
+        with self.assertRaises(DeadlineExceededError):
+            api_client.request('GET', 'url')
+
+    @patch('kubernetes.client.api_client.ApiClient.request')
+    def test_request_too_many_requests(self, mocked_request):
+        rejected = RESTResponse(HTTPResponse(status=429, headers={'Retry-After': '2'}))
+        mocked_request.side_effect = [ApiException(http_resp=rejected), RESTResponse(HTTPResponse())]
+        rate_limiter = RateLimiter(sleep=Mock())
+        api_client = ApiClientWithWarningHandler(rate_limiter=rate_limiter)
+
+        api_client.request('GET', 'url')
+
+        self.assertEqual(mocked_request.call_count, 2)
+        self.assertEqual(rate_limiter.rejected_requests, 1)
+        delay, = rate_limiter._sleep.call_args.args
+        self.assertTrue(1 < delay <= 2, delay)
+
+    @patch('kubernetes.client.api_client.ApiClient.request')
+    def test_request_too_many_requests_exhausted(self, mocked_request):
+        rejected = RESTResponse(HTTPResponse(status=429))
+        mocked_request.side_effect = ApiException(http_resp=rejected)
+        api_client = ApiClientWithWarningHandler(rate_limiter=RateLimiter(sleep=Mock()))
+
+        with self.assertRaises(ApiException):
+            api_client.request('GET', 'url')
+
+        self.assertEqual(mocked_request.call_count, RATE_LIMIT_RETRIES + 1)
+
     def test_request_with_invalid_headers(self):
         with self.assertLogs("k8s_handle.k8s.api_clients", level="ERROR"):
             self._test_request([
@@ -72,3 +126,49 @@ class TestApiClientWithWarningHandler(unittest.TestCase):
             "Invalid warning header: invalid quoted string: missing closing quote"
         ):
             self.api_client._parse_warning_headers(['299 - "warning unquoted'])
+
+
+class TestApiClientRegistry(unittest.TestCase):
+    def setUp(self):
+        self.pool_maxsize = settings.K8S_POOL_MAXSIZE
+        self.connect_timeout = settings.K8S_CONNECT_TIMEOUT
+        self.read_timeout = settings.K8S_READ_TIMEOUT
+
+    def tearDown(self):
+        settings.K8S_POOL_MAXSIZE = self.pool_maxsize
+        settings.K8S_CONNECT_TIMEOUT = self.connect_timeout
+        settings.K8S_READ_TIMEOUT = self.read_timeout
+
+    def test_api_client_is_shared(self):
+        registry = ApiClientRegistry(warning_handler='handler')
+        self.assertIs(registry.api_client, registry.api_client)
+        self.assertEqual(registry.api_client.warning_handler, 'handler')
+
+    def test_api_is_cached(self):
+        registry = ApiClientRegistry()
+        apps = registry.api(client.AppsV1Api)
+        self.assertIs(apps, registry.api(client.AppsV1Api))
+        self.assertIs(apps.api_client, registry.api(client.CoreV1Api).api_client)
+
+    def test_configuration(self):
+        settings.K8S_POOL_MAXSIZE = 32
+        settings.K8S_CONNECT_TIMEOUT = 3
+        settings.K8S_READ_TIMEOUT = 0
+        api_client = ApiClientRegistry().api_client
+        self.assertEqual(api_client.configuration.connection_pool_maxsize, 32)
+        self.assertEqual(api_client.request_timeout, (3, None))
+
+    def test_configuration_without_timeouts(self):
+        settings.K8S_CONNECT_TIMEOUT = 0
+        settings.K8S_READ_TIMEOUT = 0
+        self.assertIsNone(ApiClientRegistry().api_client.request_timeout)
+
+    @patch('k8s_handle.settings.K8S_API_REPORT', '/nonexistent/report.json')
+    def test_report_failure(self):
+        registry = ApiClientRegistry()
+        registry.metrics.record('GET', 'https://localhost/api/v1/namespaces/test/pods/app', status=200, latency=0.1)
+
+        with self.assertLogs('k8s_handle.k8s.api_clients', level='ERROR') as logs:
+            registry.report()
+
+        self.assertIn('Unable to report requests to the API server', logs.output[0])
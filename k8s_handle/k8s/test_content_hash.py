@@ -0,0 +1,108 @@
+import unittest
+from datetime import datetime, timezone
+
+from kubernetes.client import V1Deployment, V1ManagedFieldsEntry, V1ObjectMeta
+
+from .content_hash import CONTENT_HASH_ANNOTATION, content_hash, is_unchanged, stamp
+
+OWN_TIME = datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc)
+LATER = datetime(2024, 1, 1, 11, 0, tzinfo=timezone.utc)
+EARLIER = datetime(2024, 1, 1, 9, 0, tzinfo=timezone.utc)
+
+
+def _template():
+    return {
+        'apiVersion': 'apps/v1',
+        'kind': 'Deployment',
+        'metadata': {'name': 'test', 'labels': {'app': 'test'}},
+        'spec': {'replicas': 1, 'template': {'spec': {'containers': [{'name': 'app', 'image': 'app:1'}]}}},
+    }
+
+
+def _entry(manager, time, fields, subresource=None):
+    return V1ManagedFieldsEntry(manager=manager, operation='Update', time=time, fields_type='FieldsV1',
+                                fields_v1=fields, subresource=subresource)
+
+
+def _deployment(value, *entries):
+    return V1Deployment(metadata=V1ObjectMeta(name='test', annotations={CONTENT_HASH_ANNOTATION: value},
+                                              managed_fields=list(entries)))
+
+
+class TestContentHash(unittest.TestCase):
+    def test_hash_ignores_own_annotation(self):
+        template = _template()
+        value = stamp(template)
+
+        self.assertEqual(template['metadata']['annotations'], {CONTENT_HASH_ANNOTATION: value})
+        self.assertEqual(content_hash(template), value)
+        self.assertEqual(content_hash(_template()), value)
+
+    def test_hash_changes(self):
+        template = _template()
+        template['spec']['replicas'] = 2
+        self.assertNotEqual(content_hash(template), content_hash(_template()))
+
+    def test_unchanged(self):
+        template = _template()
+        value = stamp(template)
+        deployment = _deployment(
+            value,
+            _entry('k8s-handle', OWN_TIME, {'f:spec': {'f:replicas': {}}}),
+            _entry('kube-controller-manager', LATER,
+                   {'f:metadata': {'f:annotations': {'.': {}, 'f:deployment.kubernetes.io/revision': {}}}}),
+            _entry('kube-controller-manager', LATER, {'f:status': {'f:replicas': {}}}, subresource='status'),
+            _entry('kubectl-edit', EARLIER, {'f:spec': {'f:replicas': {}}}))
+
+        self.assertTrue(is_unchanged(deployment, template, value, 'k8s-handle'))
+
+    def test_scaled(self):
+        template = _template()
+        value = stamp(template)
+        deployment = _deployment(
+            value,
+            _entry('k8s-handle', OWN_TIME, {'f:spec': {'f:replicas': {}}}),
+            _entry('kubectl', LATER, {'f:spec': {'f:replicas': {}}}, subresource='scale'))
+
+        self.assertFalse(is_unchanged(deployment, template, value, 'k8s-handle'))
+
+    def test_changed(self):
+        template = _template()
+        stamp(template)
+        deployment = _deployment('other', _entry('k8s-handle', OWN_TIME, {}))
+
+        self.assertFalse(is_unchanged(deployment, template, content_hash(template), 'k8s-handle'))
+
+    def test_not_managed(self):
+        template = _template()
+        value = stamp(template)
+
+        self.assertFalse(is_unchanged(_deployment(value, _entry('OpenAPI-Generator', OWN_TIME, {})), template, value,
+                                      'k8s-handle'))
+
+    def test_drifted(self):
+        template = _template()
+        value = stamp(template)
+        image = {'f:spec': {'f:template': {'f:spec': {'f:containers': {'k:{"name":"app"}': {'f:image': {}}}}}}}
+
+        self.assertFalse(is_unchanged(
+            _deployment(value, _entry('k8s-handle', OWN_TIME, {}), _entry('kubectl-edit', LATER, image)),
+            template, value, 'k8s-handle'))
+        self.assertFalse(is_unchanged(
+            _deployment(value, _entry('k8s-handle', OWN_TIME, {}),
+                        _entry('kubectl-label', LATER, {'f:metadata': {'f:labels': {'f:app': {}}}})),
+            template, value, 'k8s-handle'))
+
+    def test_custom_resource(self):
+        template = {'apiVersion': 'example.com/v1', 'kind': 'Widget', 'metadata': {'name': 'test'}, 'spec': {'a': 1}}
+        value = stamp(template)
+        resource = {'metadata': {'annotations': {CONTENT_HASH_ANNOTATION: value}, 'managedFields': [
+            {'manager': 'k8s-handle', 'operation': 'Update', 'time': '2024-01-01T10:00:00Z', 'fieldsV1': {}},
+            {'manager': 'other', 'operation': 'Update', 'time': '2024-01-01T11:00:00Z',
+             'fieldsV1': {'f:spec': {'f:a': {}}}},
+        ]}}
+
+        self.assertFalse(is_unchanged(resource, template, value, 'k8s-handle'))
+
+        resource['metadata']['managedFields'][1]['time'] = '2024-01-01T09:00:00Z'
+        self.assertTrue(is_unchanged(resource, template, value, 'k8s-handle'))
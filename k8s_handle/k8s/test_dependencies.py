@@ -0,0 +1,128 @@
+import unittest
+
+from k8s_handle import settings
+from .dependencies import DependencyGraph
+
+
+def _doc(kind, name, namespace=None, api_version='v1', **fields):
+    metadata = {'name': name}
+    if namespace:
+        metadata['namespace'] = namespace
+
+    return dict({'apiVersion': api_version, 'kind': kind, 'metadata': metadata}, **fields)
+
+
+def _pod_template(**pod_spec):
+    return {'template': {'spec': dict({'containers': [{'name': 'app'}]}, **pod_spec)}}
+
+
+def _levels(*documents):
+    graph = DependencyGraph([(document, 'file.yaml') for document in documents])
+    return [[str(node) for node in level] for level in graph.levels()]
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def setUp(self):
+        self.namespace = settings.K8S_NAMESPACE
+        settings.K8S_NAMESPACE = 'default'
+
+    def tearDown(self):
+        settings.K8S_NAMESPACE = self.namespace
+
+    def test_kind_tiers(self):
+        self.assertEqual(
+            _levels(
+                _doc('PodDisruptionBudget', 'app'),
+                _doc('Deployment', 'app', spec=_pod_template()),
+                _doc('ConfigMap', 'config'),
+                _doc('Namespace', 'default'),
+                _doc('ServiceAccount', 'app'),
+                _doc('CustomResourceDefinition', 'crd'),
+                _doc('Secret', 'secret'),
+            ),
+            [
+                ['Namespace "default"'],
+                ['CustomResourceDefinition "crd"'],
+                ['ServiceAccount "app"'],
+                ['ConfigMap "config"', 'Secret "secret"'],
+                ['Deployment "app"'],
+                ['PodDisruptionBudget "app"'],
+            ])
+
+    def test_independent_documents_share_level(self):
+        self.assertEqual(
+            _levels(_doc('Deployment', 'first', spec=_pod_template()), _doc('StatefulSet', 'second')),
+            [['Deployment "first"', 'StatefulSet "second"']])
+
+    def test_references(self):
+        self.assertEqual(
+            _levels(
+                _doc('RoleBinding', 'binding', roleRef={'kind': 'Role', 'name': 'role'},
+                     subjects=[{'kind': 'ServiceAccount', 'name': 'app'}]),
+                _doc('Role', 'role'),
+                _doc('ServiceAccount', 'app'),
+            ),
+            [['Role "role"', 'ServiceAccount "app"'], ['RoleBinding "binding"']])
+
+    def test_references_other_namespace(self):
+        self.assertEqual(
+            _levels(
+                _doc('RoleBinding', 'binding', namespace='other', roleRef={'kind': 'Role', 'name': 'role'}),
+                _doc('Role', 'role'),
+            ),
+            [['RoleBinding "binding"', 'Role "role"']])
+
+    def test_pod_references(self):
+        graph = DependencyGraph([(document, 'file.yaml') for document in [
+            _doc('ConfigMap', 'env'),
+            _doc('ConfigMap', 'volume'),
+            _doc('Secret', 'key'),
+            _doc('Secret', 'unused'),
+            _doc('PersistentVolumeClaim', 'data'),
+            _doc('ServiceAccount', 'app'),
+            _doc('Deployment', 'app', spec=_pod_template(
+                serviceAccountName='app',
+                containers=[{'name': 'app', 'envFrom': [{'configMapRef': {'name': 'env'}}],
+                             'env': [{'name': 'KEY', 'valueFrom': {'secretKeyRef': {'name': 'key'}}}]}],
+                volumes=[{'name': 'config', 'configMap': {'name': 'volume'}},
+                         {'name': 'data', 'persistentVolumeClaim': {'claimName': 'data'}}])),
+        ]])
+        self.assertEqual(
+            sorted(str(node) for node in graph.nodes[-1].dependencies),
+            ['ConfigMap "env"', 'ConfigMap "volume"', 'PersistentVolumeClaim "data"', 'Secret "key"',
+             'ServiceAccount "app"'])
+
+    def test_custom_resource_depends_on_crd(self):
+        graph = DependencyGraph([(document, 'file.yaml') for document in [
+            _doc('Kind', 'resource', api_version='group.io/v1'),
+            _doc('CustomResourceDefinition', 'kinds.group.io', api_version='apiextensions.k8s.io/v1',
+                 spec={'group': 'group.io', 'names': {'kind': 'Kind', 'plural': 'kinds'}}),
+        ]])
+        self.assertEqual([str(node) for node in graph.nodes[0].dependencies],
+                         ['CustomResourceDefinition "kinds.group.io"'])
+        self.assertTrue(graph.nodes[1].dependents)
+
+    def test_jobs_keep_order(self):
+        self.assertEqual(
+            _levels(
+                _doc('Deployment', 'before', spec=_pod_template()),
+                _doc('Job', 'migration', spec=_pod_template()),
+                _doc('Deployment', 'first', spec=_pod_template()),
+                _doc('Deployment', 'second', spec=_pod_template()),
+                _doc('HorizontalPodAutoscaler', 'first', spec={'scaleTargetRef': {'kind': 'Deployment',
+                                                                                  'name': 'first'}}),
+            ),
+            [
+                ['Deployment "before"'],
+                ['Job "migration"'],
+                ['Deployment "first"', 'Deployment "second"'],
+                ['HorizontalPodAutoscaler "first"'],
+            ])
+
+    def test_cycle(self):
+        with self.assertRaises(RuntimeError) as context:
+            _levels(
+                _doc('ClusterRoleBinding', 'binding', roleRef={'kind': 'ClusterRoleBinding', 'name': 'role'}),
+                _doc('ClusterRoleBinding', 'role', roleRef={'kind': 'ClusterRoleBinding', 'name': 'binding'}),
+            )
+        self.assertTrue('Dependency cycle detected' in str(context.exception), context.exception)
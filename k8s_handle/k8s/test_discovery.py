@@ -0,0 +1,189 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock
+
+from kubernetes.client import ApiClient
+from kubernetes.client.rest import ApiException
+
+from .discovery import CachedResourcesAPI, _Response
+
+AGGREGATED = {
+    '/api': {'kind': 'APIGroupDiscoveryList', 'items': [{'metadata': {}, 'versions': [{'version': 'v1', 'resources': [
+        {'resource': 'pods', 'responseKind': {'kind': 'Pod'}, 'scope': 'Namespaced', 'verbs': ['get']},
+    ]}]}]},
+    '/apis': {'kind': 'APIGroupDiscoveryList', 'items': [{'metadata': {'name': 'group'}, 'versions': [
+        {'version': 'version', 'resources': [
+            {'resource': 'kinds', 'responseKind': {'kind': 'Kind'}, 'scope': 'Cluster', 'verbs': ['get']},
+        ]},
+    ]}]},
+}
+
+NOT_AGGREGATED = {
+    '/api': {'kind': 'APIVersions', 'versions': ['v1']},
+    '/apis': {'kind': 'APIGroupList', 'groups': [{'name': 'group', 'versions': [{'groupVersion': 'group/version'}]}]},
+    '/api/v1': {'kind': 'APIResourceList', 'groupVersion': 'v1', 'resources': [
+        {'kind': 'Pod', 'name': 'pods', 'namespaced': True, 'singularName': 'pod', 'verbs': ['get']},
+        {'kind': 'Pod', 'name': 'pods/status', 'namespaced': True, 'singularName': '', 'verbs': ['get']},
+    ]},
+    '/apis/group/version': {'kind': 'APIResourceList', 'groupVersion': 'group/version', 'resources': [
+        {'kind': 'Kind', 'name': 'kinds', 'namespaced': False, 'singularName': 'kind', 'verbs': ['get']},
+    ]},
+}
+
+
+def _server_api(responses):
+    api = Mock()
+    api.api_client = ApiClient()
+    api.api_client.call_api = Mock(side_effect=lambda path, *args, **kwargs: _Response(json.dumps(responses[path])))
+    return api
+
+
+class TestCachedResourcesAPI(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_memo(self):
+        api = _server_api(NOT_AGGREGATED)
+        discovery = CachedResourcesAPI(api)
+        self.assertIs(discovery.resource('group/version', 'Kind'), discovery.resource('group/version', 'Kind'))
+        api.api_client.call_api.assert_called_once()
+
+    def test_not_found_is_not_cached(self):
+        api = _server_api(NOT_AGGREGATED)
+        api.api_client.call_api.side_effect = ApiException(status=404, reason='Not Found')
+        discovery = CachedResourcesAPI(api, 'https://server:6443', self.cache_dir)
+        self.assertIsNone(discovery.resource('group/version', 'Kind'))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_disk_cache(self):
+        CachedResourcesAPI(_server_api(NOT_AGGREGATED), 'https://server:6443', self.cache_dir) \
+            .resource('group/version', 'Kind')
+        self.assertTrue(os.path.exists(
+            os.path.join(self.cache_dir, 'server_6443', 'group', 'version', 'serverresources.json')))
+
+        api = _server_api(NOT_AGGREGATED)
+        resource = CachedResourcesAPI(api, 'https://server:6443', self.cache_dir).find('group/version', 'Kind')
+        api.api_client.call_api.assert_not_called()
+        self.assertEqual(resource.name, 'kinds')
+
+        api = _server_api(NOT_AGGREGATED)
+        self.assertIsNone(CachedResourcesAPI(api, 'https://other:6443', self.cache_dir).find('group/version', 'Kind'))
+
+    def test_disk_cache_expired(self):
+        CachedResourcesAPI(_server_api(NOT_AGGREGATED), 'https://server:6443', self.cache_dir) \
+            .resource('group/version', 'Kind')
+        path = os.path.join(self.cache_dir, 'server_6443', 'group', 'version', 'serverresources.json')
+        os.utime(path, (time.time() - 700, time.time() - 700))
+
+        api = _server_api(NOT_AGGREGATED)
+        CachedResourcesAPI(api, 'https://server:6443', self.cache_dir, ttl=600).resource('group/version', 'Kind')
+        api.api_client.call_api.assert_called_once()
+
+    def _assert_discovered(self, discovery, api):
+        self.assertTrue(discovery.find('v1', 'Pod').namespaced)
+        self.assertEqual(discovery.find('v1', 'Pod').name, 'pods')
+        self.assertFalse(discovery.find('group/version', 'Kind').namespaced)
+        self.assertIsNone(discovery.find('group/version', 'Other'))
+
+    def test_warm_up_aggregated(self):
+        api = _server_api(AGGREGATED)
+        discovery = CachedResourcesAPI(api)
+        discovery.warm_up()
+        self._assert_discovered(discovery, api)
+        self.assertEqual(api.api_client.call_api.call_count, 2)
+
+    def test_warm_up_not_aggregated(self):
+        api = _server_api(NOT_AGGREGATED)
+        discovery = CachedResourcesAPI(api)
+        discovery.warm_up()
+        self._assert_discovered(discovery, api)
+        self.assertEqual(api.api_client.call_api.call_count, 4)
+
+    def test_warm_up_disk_cache(self):
+        CachedResourcesAPI(_server_api(AGGREGATED), 'https://server:6443', self.cache_dir).warm_up()
+
+        api = _server_api(AGGREGATED)
+        discovery = CachedResourcesAPI(api, 'https://server:6443', self.cache_dir)
+        discovery.warm_up()
+        self._assert_discovered(discovery, api)
+        api.api_client.call_api.assert_not_called()
+
+    def test_warm_up_failure(self):
+        api = _server_api(NOT_AGGREGATED)
+        api.api_client.call_api.side_effect = ApiException(status=403)
+        discovery = CachedResourcesAPI(api)
+        discovery.warm_up()
+
+        api.api_client.call_api.side_effect = lambda path, *args, **kwargs: _Response(
+            json.dumps(NOT_AGGREGATED[path]))
+        self.assertEqual(discovery.resource('group/version', 'Kind').name, 'kinds')
+        self.assertEqual(api.api_client.call_api.call_args[0][0], '/apis/group/version')
+
+    def test_warm_up_group_failure(self):
+        responses = dict(NOT_AGGREGATED)
+        responses['/apis'] = {'kind': 'APIGroupList', 'groups': [
+            {'name': 'group', 'versions': [{'groupVersion': 'group/version'}]},
+            {'name': 'broken', 'versions': [{'groupVersion': 'broken/v1'}]},
+        ]}
+        api = _server_api(responses)
+        call_api = api.api_client.call_api.side_effect
+
+        def broken(path, *args, **kwargs):
+            if path == '/apis/broken/v1':
+                raise ApiException(status=503)
+            return call_api(path, *args, **kwargs)
+
+        api.api_client.call_api.side_effect = broken
+        discovery = CachedResourcesAPI(api)
+        discovery.warm_up()
+        self._assert_discovered(discovery, api)
+
+    def test_resource_discovered_on_demand(self):
+        api = _server_api(NOT_AGGREGATED)
+        discovery = CachedResourcesAPI(api)
+
+        self.assertEqual(discovery.resource('v1', 'Pod').name, 'pods')
+        self.assertEqual(discovery.resource('v1', 'Pod').name, 'pods')
+        self.assertEqual(discovery.resource('group/version', 'Kind').name, 'kinds')
+        self.assertEqual(api.api_client.call_api.call_count, 2)
+
+    def test_resource_refreshed_once_if_unknown(self):
+        api = _server_api(NOT_AGGREGATED)
+        discovery = CachedResourcesAPI(api)
+
+        self.assertIsNone(discovery.resource('v1', 'Unknown'))
+        self.assertIsNone(discovery.resource('v1', 'Unknown'))
+        self.assertEqual(api.api_client.call_api.call_count, 1)
+
+        self.assertEqual(discovery.resource('v1', 'Pod').name, 'pods')
+        self.assertEqual(api.api_client.call_api.call_count, 1)
+
+    def test_expire_refreshes(self):
+        api = _server_api(NOT_AGGREGATED)
+        discovery = CachedResourcesAPI(api)
+
+        self.assertIsNone(discovery.resource('group/version', 'Unknown'))
+        self.assertIsNone(discovery.resource('v1', 'Unknown'))
+        discovery.expire_refreshes('group')
+        self.assertIsNone(discovery.resource('group/version', 'Unknown'))
+        self.assertIsNone(discovery.resource('v1', 'Unknown'))
+        self.assertEqual([call[0][0] for call in api.api_client.call_api.call_args_list],
+                         ['/apis/group/version', '/api/v1', '/apis/group/version'])
+
+    def test_resource_unknown_api_version(self):
+        api = _server_api(NOT_AGGREGATED)
+        api.api_client.call_api.side_effect = ApiException(status=404, reason='Not Found')
+        discovery = CachedResourcesAPI(api)
+
+        self.assertIsNone(discovery.resource('group/unknown', 'Kind'))
+        self.assertIsNone(discovery.resource('test', 'Kind'))
+        self.assertIsNone(discovery.resource('group/version/extra', 'Kind'))
+        self.assertIsNone(discovery.resource(None, 'Kind'))
+        self.assertEqual(api.api_client.call_api.call_count, 1)
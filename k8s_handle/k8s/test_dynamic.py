@@ -0,0 +1,247 @@
+import json
+import unittest
+from unittest.mock import Mock, patch
+
+from kubernetes.client import ApiClient, V1DeleteOptions
+from kubernetes.client.rest import ApiException
+from urllib3 import HTTPResponse
+
+from k8s_handle.exceptions import ProvisioningError
+from .adapters import AdapterDynamicKind
+from .dynamic import (APPLY_PATCH, MERGE_PATCH, METADATA_ACCEPT, METADATA_LIST_ACCEPT, STRATEGIC_MERGE_PATCH,
+                      model_name)
+from .encoding import RESTClientWithEncodedBodies, encode
+from .mocks import resource_endpoint
+from .view import ResourceView
+
+
+class TestModelName(unittest.TestCase):
+    def test_builtin(self):
+        self.assertEqual(model_name('apps/v1', 'Deployment'), 'V1Deployment')
+        self.assertEqual(model_name('v1', 'Service'), 'V1Service')
+        self.assertEqual(model_name('autoscaling/v2', 'HorizontalPodAutoscaler'), 'V2HorizontalPodAutoscaler')
+        self.assertEqual(model_name('apiextensions.k8s.io/v1', 'CustomResourceDefinition'),
+                         'V1CustomResourceDefinition')
+
+    def test_prefixed_by_group(self):
+        self.assertEqual(model_name('v1', 'Event'), 'CoreV1Event')
+        self.assertEqual(model_name('events.k8s.io/v1', 'Event'), 'EventsV1Event')
+
+    def test_custom(self):
+        self.assertIsNone(model_name('example.com/v1', 'Deployment'))
+        self.assertIsNone(model_name('apps/v1', 'Unknown'))
+
+
+class TestResourceEndpoint(unittest.TestCase):
+    def test_namespaced(self):
+        endpoint = resource_endpoint()
+        endpoint.read('test', namespace='ns')
+
+        args, kwargs = endpoint.api_client.call_api.call_args
+        self.assertEqual(args, ('/apis/apps/v1/namespaces/ns/deployments/test', 'GET'))
+        self.assertEqual(kwargs['response_type'], 'V1Deployment')
+        self.assertNotIn('Content-Type', kwargs['header_params'])
+
+    def test_namespace_required(self):
+        with self.assertRaises(ValueError):
+            resource_endpoint().read('test')
+
+    def test_cluster_scoped(self):
+        endpoint = resource_endpoint('Namespace', 'namespaces', 'v1', namespaced=False, field_manager='manager')
+        endpoint.replace('test', {'kind': 'Namespace'}, namespace='ns')
+
+        args, kwargs = endpoint.api_client.call_api.call_args
+        self.assertEqual(args, ('/api/v1/namespaces/test', 'PUT'))
+        self.assertEqual(kwargs['query_params'], [('fieldManager', 'manager')])
+        self.assertEqual(json.loads(kwargs['body']), {'kind': 'Namespace'})
+        self.assertEqual(kwargs['header_params']['Content-Type'], 'application/json')
+
+    def test_custom(self):
+        endpoint = resource_endpoint('Widget', 'widgets', 'example.com/v1')
+        self.assertFalse(endpoint.typed)
+
+        endpoint.patch('test', {}, namespace='ns')
+        args, kwargs = endpoint.api_client.call_api.call_args
+        self.assertEqual(args, ('/apis/example.com/v1/namespaces/ns/widgets/test', 'PATCH'))
+        self.assertEqual(kwargs['response_type'], 'object')
+        self.assertEqual(kwargs['header_params']['Content-Type'], MERGE_PATCH)
+
+        endpoint.delete('test', namespace='ns')
+        self.assertEqual(endpoint.api_client.call_api.call_args[1]['response_type'], 'object')
+
+    def test_typed_patch_and_delete(self):
+        endpoint = resource_endpoint('ServiceAccount', 'serviceaccounts', 'v1')
+        endpoint.patch('test', {}, namespace='ns')
+        self.assertEqual(endpoint.api_client.call_api.call_args[1]['header_params']['Content-Type'],
+                         STRATEGIC_MERGE_PATCH)
+
+        endpoint.delete('test', body=V1DeleteOptions(propagation_policy='Foreground'), namespace='ns')
+        self.assertEqual(endpoint.api_client.call_api.call_args[1]['response_type'], 'V1Status')
+
+    def test_list(self):
+        endpoint = resource_endpoint()
+        endpoint.list(namespace='ns', label_selector='app=test', timeout_seconds=10)
+
+        args, kwargs = endpoint.api_client.call_api.call_args
+        self.assertEqual(args, ('/apis/apps/v1/namespaces/ns/deployments', 'GET'))
+        self.assertEqual(kwargs['query_params'], [('labelSelector', 'app=test'), ('timeoutSeconds', 10)])
+        self.assertEqual(kwargs['response_type'], 'V1DeploymentList')
+
+    def test_metadata_only(self):
+        endpoint = resource_endpoint('CustomResourceDefinition', 'customresourcedefinitions',
+                                     'apiextensions.k8s.io/v1', namespaced=False)
+        endpoint.read_metadata('widgets.example.com')
+
+        args, kwargs = endpoint.api_client.call_api.call_args
+        self.assertEqual(args, ('/apis/apiextensions.k8s.io/v1/customresourcedefinitions/widgets.example.com', 'GET'))
+        self.assertEqual(kwargs['response_type'], 'object')
+        self.assertEqual(kwargs['header_params']['Accept'], METADATA_ACCEPT)
+        self.assertTrue(METADATA_ACCEPT.startswith('application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1'))
+
+        endpoint.list(limit=10, metadata_only=True)
+        kwargs = endpoint.api_client.call_api.call_args[1]
+        self.assertEqual(kwargs['response_type'], 'object')
+        self.assertEqual(kwargs['header_params']['Accept'], METADATA_LIST_ACCEPT)
+
+    def test_apply(self):
+        api_client = ApiClient()
+        api_client.call_api = Mock()
+        endpoint = resource_endpoint(api_client=api_client, field_manager='manager')
+        endpoint.apply('test', {'kind': 'Deployment', 'spec': {'replicas': 1}}, force=True, namespace='ns')
+
+        args, kwargs = api_client.call_api.call_args
+        self.assertEqual(args, ('/apis/apps/v1/namespaces/ns/deployments/test', 'PATCH'))
+        self.assertEqual(kwargs['query_params'], [('fieldManager', 'manager'), ('force', True)])
+        self.assertEqual(kwargs['header_params']['Content-Type'], APPLY_PATCH)
+        self.assertEqual(json.loads(kwargs['body']), {'kind': 'Deployment', 'spec': {'replicas': 1}})
+
+    def test_apply_request_body(self):
+        api_client = ApiClient()
+        api_client.rest_client = RESTClientWithEncodedBodies(api_client.configuration)
+        api_client.rest_client.pool_manager = Mock()
+        api_client.rest_client.pool_manager.request.return_value = HTTPResponse(
+            body=b'{"kind": "Deployment"}', status=200, preload_content=False)
+        endpoint = resource_endpoint(api_client=api_client, field_manager='manager')
+        endpoint.apply('test', {'kind': 'Deployment', 'spec': {'replicas': 1}}, namespace='ns')
+
+        _, kwargs = api_client.rest_client.pool_manager.request.call_args
+        self.assertEqual(json.loads(kwargs['body']), {'kind': 'Deployment', 'spec': {'replicas': 1}})
+
+    def test_supports(self):
+        endpoint = resource_endpoint('Binding', 'bindings', 'v1', verbs=['create'])
+        self.assertTrue(endpoint.supports('create'))
+        self.assertFalse(endpoint.supports('watch'))
+
+
+class TestAdapterDynamicKind(unittest.TestCase):
+    def test_custom_kind_replace_keeps_resource_version(self):
+        endpoint = resource_endpoint('Service', 'services', 'example.com/v1')
+        adapter = AdapterDynamicKind(
+            {'kind': 'Service', 'apiVersion': 'example.com/v1', 'metadata': {'name': 'test', 'namespace': 'ns'},
+             'spec': {}}, endpoint)
+
+        adapter.replace({'resourceVersion': '10', 'clusterIP': '10.0.0.1'})
+
+        body = json.loads(endpoint.api_client.call_api.call_args[1]['body'])
+        self.assertEqual(body['metadata']['resourceVersion'], '10')
+        self.assertNotIn('clusterIP', body['spec'])
+        self.assertEqual(endpoint.api_client.call_api.call_args[0][1], 'PUT')
+
+    def test_custom_kind_cluster_scoped(self):
+        endpoint = resource_endpoint('Widget', 'widgets', 'example.com/v1', namespaced=False)
+        endpoint.api_client.call_api.return_value = {'metadata': {'name': 'test'}}
+        adapter = AdapterDynamicKind({'kind': 'Widget', 'metadata': {'name': 'test', 'namespace': 'ns'}}, endpoint)
+
+        self.assertEqual(adapter.get(), {'metadata': {'name': 'test'}})
+        self.assertEqual(endpoint.api_client.call_api.call_args[0], ('/apis/example.com/v1/widgets/test', 'GET'))
+
+        endpoint.api_client.call_api.side_effect = ApiException(status=404, reason='Not Found')
+        self.assertIsNone(adapter.get())
+
+    def test_builtin_kind_replace(self):
+        endpoint = resource_endpoint()
+        adapter = AdapterDynamicKind(
+            {'kind': 'Deployment', 'apiVersion': 'apps/v1', 'metadata': {'name': 'test', 'namespace': 'ns'}},
+            endpoint)
+
+        adapter.replace({'resourceVersion': '10'})
+        self.assertNotIn('resourceVersion', json.loads(endpoint.api_client.call_api.call_args[1]['body'])['metadata'])
+
+    def test_list(self):
+        endpoint = resource_endpoint('Widget', 'widgets', 'example.com/v1')
+        endpoint.api_client.call_api.return_value = {'items': [{'metadata': {'name': 'test'}}]}
+        adapter = AdapterDynamicKind({'kind': 'Widget', 'metadata': {'name': 'test', 'namespace': 'ns'}}, endpoint)
+        self.assertEqual(adapter.list(), [{'metadata': {'name': 'test'}}])
+
+    def test_not_supported(self):
+        endpoint = resource_endpoint('Binding', 'bindings', 'v1', verbs=['create'])
+        adapter = AdapterDynamicKind({'kind': 'Binding', 'metadata': {'name': 'test', 'namespace': 'ns'}}, endpoint)
+        self.assertIsNone(adapter.list())
+        self.assertIsNone(adapter.watch('10', 30))
+        endpoint.api_client.call_api.assert_not_called()
+
+    @patch('kubernetes.watch.watch.iter_resp_lines')
+    def test_watch(self, mocked_lines):
+        mocked_lines.return_value = iter([json.dumps({
+            'type': 'MODIFIED',
+            'object': {'kind': 'Deployment', 'metadata': {'name': 'test', 'resourceVersion': '11'}},
+        })])
+        endpoint = resource_endpoint()
+        adapter = AdapterDynamicKind(
+            {'kind': 'Deployment', 'metadata': {'name': 'test', 'namespace': 'ns'}}, endpoint)
+
+        (event_type, deployment), = list(adapter.watch('10', 30))
+
+        self.assertEqual(event_type, 'MODIFIED')
+        self.assertEqual(deployment.metadata.resource_version, '11')
+
+        args, kwargs = endpoint.api_client.call_api.call_args
+        self.assertEqual(args, ('/apis/apps/v1/namespaces/ns/deployments', 'GET'))
+        self.assertEqual(kwargs['query_params'], [
+            ('fieldSelector', 'metadata.name=test'), ('resourceVersion', '10'), ('timeoutSeconds', 30),
+            ('watch', True)])
+        self.assertFalse(kwargs['_preload_content'])
+
+    def test_get_metadata(self):
+        endpoint = resource_endpoint('ConfigMap', 'configmaps', 'v1')
+        endpoint.api_client.call_api.side_effect = [{'metadata': {'name': 'test', 'resourceVersion': '10'}},
+                                                    ApiException(status=404, reason='Not Found')]
+        adapter = AdapterDynamicKind({'kind': 'ConfigMap', 'metadata': {'name': 'test', 'namespace': 'ns'}}, endpoint)
+
+        self.assertEqual(adapter.get_metadata(), {'metadata': {'name': 'test', 'resourceVersion': '10'}})
+        self.assertIsNone(adapter.get_metadata())
+        self.assertEqual(endpoint.api_client.call_api.call_args[1]['header_params']['Accept'], METADATA_ACCEPT)
+
+    @patch('kubernetes.watch.watch.iter_resp_lines')
+    def test_watch_raw(self, mocked_lines):
+        mocked_lines.return_value = iter([json.dumps({
+            'type': 'MODIFIED',
+            'object': {'kind': 'Deployment', 'metadata': {'name': 'test', 'resourceVersion': '11'}},
+        })])
+        endpoint = resource_endpoint(api_client=ApiClient())
+        endpoint.api_client.call_api = Mock()
+        adapter = AdapterDynamicKind(
+            {'kind': 'Deployment', 'metadata': {'name': 'test', 'namespace': 'ns'}}, endpoint)
+
+        (event_type, deployment), = list(adapter.watch('10', 30, raw=True))
+
+        self.assertIsInstance(deployment, ResourceView)
+        self.assertEqual(deployment.metadata.resource_version, '11')
+
+    def test_apply(self):
+        endpoint = resource_endpoint()
+        adapter = AdapterDynamicKind({'kind': 'Deployment', 'metadata': {'name': 'test', 'namespace': 'ns'}}, endpoint)
+
+        with patch.object(endpoint, 'apply') as mocked_apply:
+            adapter.apply()
+
+        mocked_apply.assert_called_once_with('test', encode(adapter.body), force=False, namespace='ns')
+
+    def test_apply_conflict(self):
+        endpoint = resource_endpoint()
+        endpoint.api_client.sanitize_for_serialization.return_value = {}
+        endpoint.api_client.call_api.side_effect = ApiException(status=409, reason='Conflict')
+        adapter = AdapterDynamicKind({'kind': 'Deployment', 'metadata': {'name': 'test', 'namespace': 'ns'}}, endpoint)
+
+        with self.assertRaises(ProvisioningError):
+            adapter.apply()
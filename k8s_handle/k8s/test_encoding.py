@@ -0,0 +1,71 @@
+import json
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import Mock
+
+import urllib3
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from .api_clients import ApiClientWithWarningHandler
+from .encoding import EncodedBody, RESTClientWithEncodedBodies, encode
+
+
+def _response(status=200, data=b'{}'):
+    return urllib3.HTTPResponse(body=data, status=status, preload_content=True)
+
+
+class TestEncode(unittest.TestCase):
+    def test_encode(self):
+        body = {'kind': 'ConfigMap', 'data': {'date': date(2024, 1, 1),
+                                              'time': datetime(2024, 1, 1, 10, tzinfo=timezone.utc)}}
+        encoded = encode(body)
+
+        self.assertIsInstance(encoded, EncodedBody)
+        self.assertEqual(json.loads(encoded), client.ApiClient().sanitize_for_serialization(body))
+        self.assertIs(encode(encoded), encoded)
+
+    def test_not_serializable(self):
+        with self.assertRaises(TypeError):
+            encode({'data': object()})
+
+
+class TestRESTClientWithEncodedBodies(unittest.TestCase):
+    def setUp(self):
+        self.rest_client = RESTClientWithEncodedBodies(client.Configuration())
+        self.rest_client.pool_manager = Mock()
+        self.rest_client.pool_manager.request.return_value = _response()
+
+    def test_encoded_body(self):
+        body = encode({'kind': 'ConfigMap'})
+        self.rest_client.request('PUT', 'https://localhost/api/v1/configmaps', query_params=[('fieldManager', 'm')],
+                                 headers={'Content-Type': 'application/json'}, body=body, _request_timeout=(1, 2))
+
+        args, kwargs = self.rest_client.pool_manager.request.call_args
+        self.assertEqual(args, ('PUT', 'https://localhost/api/v1/configmaps?fieldManager=m'))
+        self.assertEqual(kwargs['body'], b'{"kind":"ConfigMap"}')
+        self.assertEqual(kwargs['timeout'].connect_timeout, 1)
+
+    def test_not_encoded_body(self):
+        self.rest_client.request('PUT', 'https://localhost/api/v1/configmaps', body={'kind': 'ConfigMap'})
+        self.assertEqual(self.rest_client.pool_manager.request.call_args[1]['body'], '{"kind": "ConfigMap"}')
+
+    def test_error(self):
+        self.rest_client.pool_manager.request.return_value = _response(409, b'{"reason": "Conflict"}')
+
+        with self.assertRaises(ApiException) as context:
+            self.rest_client.request('POST', 'https://localhost/api/v1/configmaps', body=encode({}))
+
+        self.assertEqual(context.exception.status, 409)
+
+    def test_api_client(self):
+        api_client = ApiClientWithWarningHandler()
+        api_client.rest_client.pool_manager = Mock()
+        api_client.rest_client.pool_manager.request.return_value = _response()
+        body = encode({'kind': 'ConfigMap'})
+
+        api_client.call_api('/api/v1/namespaces/test/configmaps', 'POST', body=body,
+                            header_params={'Content-Type': 'application/json'}, response_type='object',
+                            _return_http_data_only=True)
+
+        self.assertEqual(api_client.rest_client.pool_manager.request.call_args[1]['body'], bytes(body))
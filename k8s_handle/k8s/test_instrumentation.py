@@ -0,0 +1,130 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from kubernetes.client.rest import ApiException, RESTResponse
+from urllib3 import HTTPResponse
+
+from .api_clients import ApiClientWithWarningHandler
+from .instrumentation import RequestMetrics, body_size, parse_request, percentile
+from .throttling import RateLimiter
+
+
+class TestParseRequest(unittest.TestCase):
+    def test_parse_request(self):
+        self.assertEqual(parse_request('GET', 'https://localhost/api/v1/namespaces/test/pods/app'),
+                         ('get', 'pods', 'test', 'app'))
+        self.assertEqual(parse_request('GET', 'https://localhost/apis/apps/v1/namespaces/test/deployments'),
+                         ('list', 'deployments', 'test', None))
+        self.assertEqual(parse_request('GET', 'https://localhost/apis/apps/v1/namespaces/test/deployments',
+                                       [('watch', True)]),
+                         ('watch', 'deployments', 'test', None))
+        self.assertEqual(parse_request('PATCH', 'https://localhost/apis/apps/v1/namespaces/test/deployments/app/scale'),
+                         ('patch', 'deployments/scale', 'test', 'app'))
+        self.assertEqual(parse_request('PUT', 'https://localhost/proxy/apis/example.com/v1/widgets/test'),
+                         ('update', 'widgets', None, 'test'))
+        self.assertEqual(parse_request('DELETE', 'https://localhost/api/v1/namespaces/test'),
+                         ('delete', 'namespaces', None, 'test'))
+        self.assertEqual(parse_request('GET', 'https://localhost/apis/apps/v1'), ('get', '/apis/apps/v1', None, None))
+
+    def test_body_size(self):
+        self.assertEqual(body_size(None), 0)
+        self.assertEqual(body_size(b'{}'), 2)
+        self.assertEqual(body_size({'a': 1}), len('{"a": 1}'))
+
+
+class TestRequestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = RequestMetrics()
+
+        for i in range(1, 21):
+            self.metrics.record('GET', 'https://localhost/api/v1/namespaces/test/configmaps/cm-{}'.format(i),
+                                status=200, latency=i / 100, response_bytes=100)
+
+        self.metrics.record('PUT', 'https://localhost/api/v1/namespaces/test/configmaps/cm-1', status=429,
+                            latency=0.5, request_bytes=50)
+        self.metrics.record('PUT', 'https://localhost/api/v1/namespaces/test/configmaps/cm-1', status=200,
+                            latency=1.5, request_bytes=50, attempt=2)
+        self.metrics.record('GET', 'https://localhost/api/v1/namespaces/test/pods', [('watch', True)], status=200,
+                            latency=30)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([1], 95), 1)
+        self.assertEqual(percentile(list(range(1, 101)), 50), 50)
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+
+    def test_summary(self):
+        summary = self.metrics.summary()
+
+        self.assertEqual(summary['requests'], 23)
+        self.assertEqual(summary['retries'], 1)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['request_bytes'], 100)
+
+        get, update, watch = summary['resources']
+        self.assertEqual((get['verb'], get['resource'], get['requests']), ('get', 'configmaps', 20))
+        self.assertEqual((get['p50'], get['p95'], get['max']), (0.1, 0.19, 0.2))
+        self.assertEqual(update['statuses'], {'200': 1, '429': 1})
+        self.assertEqual(watch['max'], 30)
+
+        # watches are not among the slowest requests
+        self.assertEqual([(r['verb'], r['name']) for r in summary['slowest']],
+                         [('update', 'cm-1'), ('update', 'cm-1'), ('get', 'cm-20'), ('get', 'cm-19'), ('get', 'cm-18')])
+
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+
+            with self.assertLogs('k8s_handle.k8s.instrumentation', level='INFO') as logs:
+                self.metrics.report(path, extra={'retried': {'conflict': 1}})
+
+            with open(path) as f:
+                report = json.load(f)
+
+        self.assertIn('Requests to the API server: 23', logs.output[0])
+        self.assertEqual(report['retried'], {'conflict': 1})
+        self.assertEqual(len(report['log']), 23)
+        self.assertEqual(report['log'][0]['name'], 'cm-1')
+
+    def test_report_nothing(self):
+        with patch('k8s_handle.k8s.instrumentation.log') as log:
+            RequestMetrics().report()
+
+        log.info.assert_not_called()
+
+
+class TestApiClientMetrics(unittest.TestCase):
+    @patch('kubernetes.client.api_client.ApiClient.request')
+    def test_requests_recorded(self, mocked_request):
+        rejected = RESTResponse(HTTPResponse(status=429))
+        mocked_request.side_effect = [ApiException(http_resp=rejected),
+                                      RESTResponse(HTTPResponse(body=b'{"kind": "ConfigMap"}', status=200,
+                                                                preload_content=True)),
+                                      ApiException(status=404)]
+        metrics = RequestMetrics()
+        api_client = ApiClientWithWarningHandler(rate_limiter=RateLimiter(sleep=Mock()), metrics=metrics)
+        url = 'https://localhost/api/v1/namespaces/test/configmaps/test'
+
+        api_client.request('PUT', url, body=b'{}')
+        with self.assertRaises(ApiException):
+            api_client.request('GET', url)
+
+        self.assertEqual([(r.verb, r.status, r.attempt, r.request_bytes, r.response_bytes) for r in metrics.requests],
+                         [('update', 429, 1, 2, 0), ('update', 200, 2, 2, 21), ('get', 404, 1, 0, 0)])
+
+    @patch('kubernetes.client.api_client.ApiClient.request')
+    def test_streamed_response_not_read(self, mocked_request):
+        response = HTTPResponse(body=io.BytesIO(b'{}'), status=200, headers={'Content-Length': '2'},
+                                preload_content=False)
+        mocked_request.return_value = response
+        metrics = RequestMetrics()
+        api_client = ApiClientWithWarningHandler(metrics=metrics)
+
+        api_client.request('GET', 'https://localhost/api/v1/namespaces/test/pods', query_params=[('watch', True)],
+                           _preload_content=False)
+
+        self.assertEqual(metrics.requests[0].response_bytes, 2)
+        self.assertEqual(response.read(), b'{}')
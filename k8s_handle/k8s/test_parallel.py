@@ -0,0 +1,72 @@
+import logging
+import threading
+import unittest
+
+from .parallel import ParallelRunner
+
+log = logging.getLogger(__name__)
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestParallelRunner(unittest.TestCase):
+    def setUp(self):
+        self.root = logging.getLogger()
+        self.handlers = self.root.handlers
+        self.handler = _ListHandler()
+        self.root.handlers = [self.handler]
+
+    def tearDown(self):
+        self.root.handlers = self.handlers
+
+    def test_results_order(self):
+        tasks = [('task {}'.format(i), lambda i=i: i * 2) for i in range(10)]
+        self.assertEqual(ParallelRunner(4).run(tasks), [i * 2 for i in range(10)])
+        self.assertIs(self.root.handlers[0], self.handler)
+
+    def test_logs_grouped_by_task(self):
+        first_started = threading.Event()
+        second_finished = threading.Event()
+
+        def first():
+            log.warning('first: start')
+            first_started.set()
+            second_finished.wait(5)
+            log.warning('first: end')
+
+        def second():
+            first_started.wait(5)
+            log.warning('second: start')
+            log.warning('second: end')
+            second_finished.set()
+
+        ParallelRunner(2).run([('first', first), ('second', second)])
+        self.assertEqual(self.handler.messages, ['first: start', 'first: end', 'second: start', 'second: end'])
+
+    def test_fail_fast(self):
+        executed = []
+
+        def fail():
+            raise RuntimeError('failed')
+
+        def wait_cancellation():
+            self.assertTrue(runner.cancelled.wait(5))
+            executed.append('running')
+
+        runner = ParallelRunner(2)
+        tasks = [('running', wait_cancellation), ('failed', fail)] + \
+                [('task {}'.format(i), lambda i=i: executed.append(i)) for i in range(10)]
+
+        with self.assertRaises(RuntimeError) as context:
+            runner.run(tasks)
+
+        self.assertEqual(str(context.exception), 'failed')
+        self.assertEqual(executed, ['running'])
+        self.assertIn('task 9 has been cancelled', self.handler.messages)
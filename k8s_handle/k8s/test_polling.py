@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import patch
+
+from .polling import PollingPolicy
+
+
+class TestPollingPolicy(unittest.TestCase):
+    def test_backoff(self):
+        poller = PollingPolicy(100, min_delay=1, max_delay=5, factor=2, jitter=0).start()
+        self.assertEqual([poller.next_delay() for _ in range(5)], [1, 2, 4, 5, 5])
+        self.assertEqual(poller.attempts, 5)
+
+    def test_progress(self):
+        poller = PollingPolicy(100, min_delay=1, max_delay=5, factor=2, jitter=0).start()
+        poller.next_delay()
+        poller.next_delay()
+        poller.progress()
+        self.assertEqual(poller.next_delay(), 1)
+
+    def test_jitter(self):
+        poller = PollingPolicy(100, min_delay=4, max_delay=4, jitter=0.5).start()
+        for _ in range(100):
+            self.assertTrue(2 <= poller.next_delay() <= 6)
+
+    def test_min_delay_above_max(self):
+        self.assertEqual(PollingPolicy(100, min_delay=10, max_delay=5).min_delay, 5)
+
+    def test_deadline(self):
+        with patch('k8s_handle.k8s.polling.monotonic', side_effect=[0, 99, 100]):
+            poller = PollingPolicy(100, min_delay=5, max_delay=5, jitter=0).start()
+            self.assertEqual(poller.next_delay(), 1)
+            self.assertIsNone(poller.next_delay())
+
+    def test_from_tries(self):
+        policy = PollingPolicy.from_tries(10, 3)
+        self.assertEqual((policy.timeout, policy.max_delay), (30, 3))
+
+    def test_run_deadline(self):
+        with patch('k8s_handle.k8s.polling.monotonic', side_effect=[0, 9, 10]):
+            poller = PollingPolicy(100, min_delay=5, max_delay=5, jitter=0).start(deadline=10)
+            self.assertEqual(poller.next_delay(), 1)
+            self.assertIsNone(poller.next_delay())
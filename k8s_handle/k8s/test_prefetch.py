@@ -0,0 +1,109 @@
+import unittest
+from unittest.mock import Mock
+
+from kubernetes.client import V1Deployment, V1DeploymentList, V1ListMeta, V1ObjectMeta
+from kubernetes.client.rest import ApiException
+
+from .adapters import AdapterDynamicKind
+from .mocks import resource_endpoint
+from .prefetch import LiveState
+
+
+def _client(endpoint, name, namespace='ns'):
+    kube_client = AdapterDynamicKind({'kind': endpoint.kind, 'metadata': {'name': name, 'namespace': namespace}},
+                                     endpoint)
+    kube_client.get = Mock(return_value='from GET')
+    kube_client.get_metadata = Mock(return_value='from metadata GET')
+    return kube_client
+
+
+def _deployments(*names, token=None):
+    return V1DeploymentList(items=[V1Deployment(metadata=V1ObjectMeta(name=name)) for name in names],
+                            metadata=V1ListMeta(_continue=token))
+
+
+class TestLiveState(unittest.TestCase):
+    def test_prefetch(self):
+        endpoint = resource_endpoint()
+        endpoint.api_client.call_api.return_value = _deployments('first', 'other')
+        first, second = _client(endpoint, 'first'), _client(endpoint, 'second')
+        live_state = LiveState()
+        live_state.prefetch([first, second])
+
+        self.assertEqual(live_state.get(first).metadata.name, 'first')
+        self.assertIsNone(live_state.get(second))
+        first.get.assert_not_called()
+        second.get.assert_not_called()
+
+        args, kwargs = endpoint.api_client.call_api.call_args
+        self.assertEqual(args, ('/apis/apps/v1/namespaces/ns/deployments', 'GET'))
+        self.assertEqual(kwargs['query_params'], [('limit', 500)])
+
+        # resources are read from the server once they are served
+        self.assertEqual(live_state.get(first), 'from GET')
+        self.assertIsNone(live_state.exists(second))
+
+    def test_prefetch_pages(self):
+        endpoint = resource_endpoint()
+        endpoint.api_client.call_api.side_effect = [_deployments('first', token='next'), _deployments('second')]
+        first, second = _client(endpoint, 'first'), _client(endpoint, 'second')
+        live_state = LiveState()
+        live_state.prefetch([first, second])
+
+        self.assertTrue(live_state.exists(first))
+        self.assertTrue(live_state.exists(second))
+        self.assertEqual(endpoint.api_client.call_api.call_args[1]['query_params'],
+                         [('limit', 500), ('continue', 'next')])
+
+    def test_prefetch_single(self):
+        endpoint = resource_endpoint()
+        endpoint.api_client.call_api.return_value = _deployments()
+        single = _client(endpoint, 'single')
+        live_state = LiveState()
+        live_state.prefetch([single])
+
+        self.assertFalse(live_state.exists(single))
+        self.assertEqual(endpoint.api_client.call_api.call_args[1]['query_params'],
+                         [('fieldSelector', 'metadata.name=single'), ('limit', 500)])
+
+    def test_prefetch_namespaces(self):
+        endpoint = resource_endpoint()
+        endpoint.api_client.call_api.return_value = _deployments('test')
+        live_state = LiveState(workers=2)
+        live_state.prefetch([_client(endpoint, 'test', 'first'), _client(endpoint, 'test', 'second')])
+
+        self.assertEqual(endpoint.api_client.call_api.call_count, 2)
+
+    def test_list_failure(self):
+        endpoint = resource_endpoint()
+        endpoint.api_client.call_api.side_effect = ApiException(status=403, reason='Forbidden')
+        kube_client = _client(endpoint, 'test')
+        live_state = LiveState()
+        live_state.prefetch([kube_client])
+
+        self.assertEqual(live_state.get(kube_client), 'from GET')
+
+    def test_not_listed(self):
+        live_state = LiveState()
+        not_listable = _client(resource_endpoint(verbs=['get']), 'test')
+        secret = _client(resource_endpoint('Secret', 'secrets', 'v1'), 'test')
+        live_state.prefetch([not_listable, secret])
+
+        not_listable.endpoint.api_client.call_api.assert_not_called()
+        secret.endpoint.api_client.call_api.assert_not_called()
+        self.assertEqual(live_state.get(not_listable), 'from GET')
+        self.assertIsNone(live_state.exists(secret))
+
+    def test_metadata_only(self):
+        endpoint = resource_endpoint()
+        endpoint.api_client.call_api.return_value = {'items': [{'metadata': {'name': 'first'}}], 'metadata': {}}
+        first, second = _client(endpoint, 'first'), _client(endpoint, 'second')
+        live_state = LiveState(metadata_only=lambda kube_client: kube_client.kind == 'deployment')
+        live_state.prefetch([first, second])
+
+        self.assertEqual(live_state.get(first), {'metadata': {'name': 'first'}})
+        self.assertEqual(endpoint.api_client.call_api.call_args[1]['response_type'], 'object')
+        self.assertIn('PartialObjectMetadataList', endpoint.api_client.call_api.call_args[1]['header_params']['Accept'])
+
+        # resources are read from the server once they are served
+        self.assertEqual(live_state.get(first), 'from metadata GET')
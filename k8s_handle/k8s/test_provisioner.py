@@ -1,13 +1,29 @@
+import json
 import unittest
+from collections import namedtuple
+from unittest.mock import Mock, patch
+
+from kubernetes.client import V1Deployment, V1DeploymentCondition, V1DeploymentSpec, V1DeploymentStatus, \
+    V1LabelSelector, V1ObjectMeta, V1PodTemplateSpec
+from kubernetes.client.rest import ApiException
 
 from k8s_handle import settings
-from k8s_handle.exceptions import ProvisioningError
-from k8s_handle.templating import get_template_contexts
-from .adapters import AdapterBuiltinKind
-from .mocks import K8sClientMock
+from k8s_handle.exceptions import DeadlineExceededError, ProvisioningError
+from k8s_handle.templating import RenderedTemplate, get_template_contexts
+from .adapters import AdapterBuiltinKind, AdapterDynamicKind
+from .api_clients import ApiClientRegistry
+from .discovery import _Response
+from .mocks import K8sClientMock, resource_endpoint
 from .provisioner import Provisioner
 
 
+def _respond(response):
+    if isinstance(response, Exception):
+        raise response
+
+    return response
+
+
 class TestProvisioner(unittest.TestCase):
     def setUp(self):
         settings.GET_ENVIRON_STRICT = False
@@ -120,7 +136,8 @@ class TestProvisioner(unittest.TestCase):
     def test_deploy_unknown_api(self):
         with self.assertRaises(RuntimeError) as context:
             Provisioner('deploy', False, None).run("k8s_handle/k8s/fixtures/deployment_no_api.yaml")
-        self.assertTrue('Unknown apiVersion "test" in template "k8s_handle/k8s/fixtures/deployment_no_api.yaml"'
+        self.assertTrue('Unknown apiVersion "test" of kind "Deployment" in template '
+                        '"k8s_handle/k8s/fixtures/deployment_no_api.yaml"'
                         in str(context.exception), context.exception)
 
     def test_service_replace(self):
@@ -132,7 +149,8 @@ class TestProvisioner(unittest.TestCase):
     def test_destroy_unknown_api(self):
         with self.assertRaises(RuntimeError) as context:
             Provisioner('destroy', False, None).run("k8s_handle/k8s/fixtures/deployment_no_api.yaml")
-        self.assertTrue('Unknown apiVersion "test" in template "k8s_handle/k8s/fixtures/deployment_no_api.yaml"'
+        self.assertTrue('Unknown apiVersion "test" of kind "Deployment" in template '
+                        '"k8s_handle/k8s/fixtures/deployment_no_api.yaml"'
                         in str(context.exception), context.exception)
 
     def test_destroy_not_found(self):
@@ -146,6 +164,245 @@ class TestProvisioner(unittest.TestCase):
     def test_destroy_success(self):
         Provisioner('destroy', False, None).run("k8s_handle/k8s/fixtures/deployment.yaml")
 
+    def test_run_all_parallel(self):
+        Provisioner('deploy', False, None, parallel=2).run_all(
+            ["k8s_handle/k8s/fixtures/deployment.yaml", "k8s_handle/k8s/fixtures/service.yaml"])
+
+    def test_run_all_parallel_fail(self):
+        with self.assertRaises(ProvisioningError) as context:
+            Provisioner('deploy', False, None, parallel=2).run_all(
+                ["k8s_handle/k8s/fixtures/deployment.yaml", "k8s_handle/k8s/fixtures/pvc2.yaml"])
+        self.assertTrue('Replace persistent volume claim fail' in str(context.exception), context.exception)
+
+    def test_crd_wait_established(self):
+        condition = namedtuple('condition', 'type status')
+        status = namedtuple('status', 'conditions')
+        client = Mock()
+        client.watch.return_value = None
+        client.get.side_effect = [
+            namedtuple('crd', 'status')(status([condition('NamesAccepted', 'True')])),
+            namedtuple('crd', 'status')(status([condition('Established', 'True')])),
+        ]
+        Provisioner('deploy', False, None)._wait_crd_established(client, tries=2, timeout=0)
+
+    def test_crd_wait_established_fail(self):
+        client = Mock()
+        client.name = 'crd'
+        client.watch.return_value = None
+        client.get.return_value = namedtuple('crd', 'status')(None)
+        with self.assertRaises(RuntimeError) as context:
+            Provisioner('deploy', False, None)._wait_crd_established(client, tries=1, timeout=0)
+        self.assertTrue('CustomResourceDefinition "crd" establishment not completed for 1 tries'
+                        in str(context.exception), context.exception)
+
+    @staticmethod
+    def _deployment(generation, observed_generation, available_replicas):
+        return V1Deployment(
+            metadata=V1ObjectMeta(generation=generation, resource_version=str(generation)),
+            spec=V1DeploymentSpec(replicas=2, selector=V1LabelSelector(), template=V1PodTemplateSpec()),
+            status=V1DeploymentStatus(observed_generation=observed_generation, replicas=2,
+                                      available_replicas=available_replicas, ready_replicas=available_replicas,
+                                      updated_replicas=available_replicas,
+                                      unavailable_replicas=2 - available_replicas or None))
+
+    def test_deployment_wait_watch(self):
+        client = Mock()
+        client.get.return_value = self._deployment(2, 1, 2)
+        client.watch.return_value = iter([
+            ('MODIFIED', self._deployment(2, 1, 2)),
+            ('MODIFIED', self._deployment(2, 2, 1)),
+            ('MODIFIED', self._deployment(2, 2, 2)),
+        ])
+        Provisioner('deploy', True, None)._wait_deployment_complete(client, tries=1, timeout=10, resource_version='1')
+        self.assertEqual(client.watch.call_args.args[0], '2')
+        client.get.assert_called_once_with(raw=True)
+
+    def test_deployment_wait_completed(self):
+        client = Mock()
+        client.get.return_value = self._deployment(2, 2, 2)
+        Provisioner('deploy', True, None)._wait_deployment_complete(client, tries=1, timeout=10, resource_version='2')
+        client.watch.assert_not_called()
+
+    def test_deployment_wait_watch_deleted(self):
+        client = Mock()
+        client.name = 'test'
+        client.get.return_value = self._deployment(2, 1, 2)
+        client.watch.return_value = iter([('DELETED', self._deployment(2, 2, 1))])
+        with self.assertRaises(RuntimeError) as context:
+            Provisioner('deploy', True, None)._wait_deployment_complete(client, tries=1, timeout=10,
+                                                                        resource_version='1')
+        self.assertTrue('Deployment "test" not found' in str(context.exception), context.exception)
+
+    def test_deployment_wait_watch_expired(self):
+        client = Mock()
+        client.watch.side_effect = [ApiException(status=410), iter([('MODIFIED', self._deployment(2, 2, 2))])]
+        client.get.return_value = self._deployment(2, 2, 1)
+        Provisioner('deploy', True, None)._wait_deployment_complete(client, tries=1, timeout=10, resource_version='1')
+        self.assertEqual(client.watch.call_args.args[0], '2')
+
+    def test_deployment_wait_watch_failure(self):
+        client = Mock()
+        client.watch.side_effect = ApiException(status=500)
+        client.get.side_effect = [self._deployment(2, 2, 1), self._deployment(2, 2, 2)]
+        Provisioner('deploy', True, None)._wait_deployment_complete(client, tries=1, timeout=10, resource_version='1')
+        client.watch.assert_called_once()
+        self.assertEqual(client.get.call_count, 2)
+
+    def test_deployment_wait_progress_deadline_exceeded(self):
+        deployment = self._deployment(2, 2, 1)
+        deployment.status.conditions = [V1DeploymentCondition(type='Progressing', status='False',
+                                                              reason='ProgressDeadlineExceeded', message='timed out')]
+        client = Mock()
+        client.name = 'test'
+        client.watch.return_value = iter([])
+        client.get.return_value = deployment
+        with self.assertRaises(RuntimeError) as context:
+            Provisioner('deploy', True, None)._wait_deployment_complete(client, tries=1, timeout=10,
+                                                                        resource_version='1')
+        self.assertEqual(str(context.exception),
+                         'Deployment "test" rollout failed: ProgressDeadlineExceeded: timed out')
+        client.watch.assert_not_called()
+
+    def test_destruction_wait_watch(self):
+        client = Mock()
+        client.get_metadata.return_value = self._deployment(1, 1, 1)
+        client.watch.return_value = iter([('MODIFIED', self._deployment(1, 1, 1)),
+                                          ('DELETED', self._deployment(1, 1, 1))])
+        Provisioner('destroy', True, None)._wait_destruction_complete(client, 'Deployment', tries=1, timeout=10)
+        self.assertEqual(client.watch.call_args.args[0], '1')
+        client.get.assert_not_called()
+
+    def test_run_all_deferred_wait(self):
+        provisioner = Provisioner('deploy', True, None, deferred_wait=True)
+        provisioner.run_all(["k8s_handle/k8s/fixtures/deployment.yaml", "k8s_handle/k8s/fixtures/service.yaml"])
+        self.assertEqual(provisioner._tracker._pending, [])
+
+    def test_run_all_timeout(self):
+        provisioner = Provisioner('deploy', True, None, timeout=1)
+        with patch.object(provisioner, '_deploy', side_effect=lambda *args: provisioner._sleep(10)):
+            with self.assertRaises(DeadlineExceededError) as context:
+                provisioner.run_all(["k8s_handle/k8s/fixtures/deployment.yaml"])
+        self.assertEqual(str(context.exception), 'Deploy not completed in 1 sec., pending: Deployment "test2"')
+
+    def test_run_all_crd_and_custom_resource(self):
+        resources = {
+            '/api': {'kind': 'APIVersions', 'versions': []},
+            '/apis': {'kind': 'APIGroupList', 'groups': [
+                {'name': 'apiextensions.k8s.io', 'versions': [{'groupVersion': 'apiextensions.k8s.io/v1'}]}]},
+            '/apis/apiextensions.k8s.io/v1': {'groupVersion': 'apiextensions.k8s.io/v1', 'resources': [
+                {'name': 'customresourcedefinitions', 'kind': 'CustomResourceDefinition', 'namespaced': False,
+                 'singularName': '', 'verbs': ['get', 'list', 'create']}]},
+        }
+        created = []
+
+        def call_api(path, method, *args, **kwargs):
+            if method == 'POST':
+                created.append(path)
+
+                # the kind of the CRD is served once it's created
+                if path.endswith('/customresourcedefinitions'):
+                    resources['/apis/example.com/v1'] = {'groupVersion': 'example.com/v1', 'resources': [
+                        {'name': 'widgets', 'kind': 'Widget', 'namespaced': True, 'singularName': '',
+                         'verbs': ['get', 'create']}]}
+
+                return json.loads(kwargs['body'])
+
+            if path in resources:
+                return _Response(json.dumps(resources[path]))
+
+            if path.endswith('/customresourcedefinitions'):
+                return {'items': [], 'metadata': {}}
+
+            raise ApiException(status=404, reason='Not Found')
+
+        registry = ApiClientRegistry()
+        registry.api_client.call_api = Mock(side_effect=call_api)
+        registry.discovery.warm_up()
+        template = RenderedTemplate('/tmp/widget.yaml', '\n---\n'.join([
+            'apiVersion: apiextensions.k8s.io/v1\nkind: CustomResourceDefinition\nmetadata: {name: widgets.example.com}'
+            '\nspec: {group: example.com}',
+            'apiVersion: example.com/v1\nkind: Widget\nmetadata: {name: test, namespace: ns}',
+        ]))
+
+        Provisioner('deploy', False, None, api_registry=registry).run_all([template])
+
+        self.assertEqual(created, ['/apis/apiextensions.k8s.io/v1/customresourcedefinitions',
+                                   '/apis/example.com/v1/namespaces/ns/widgets'])
+
+    @patch('k8s_handle.k8s.provisioner.Adapter.get_instance')
+    def test_deploy_server_side_apply(self, mocked_get_instance):
+        client = mocked_get_instance.return_value
+        client.name = 'test'
+        client.apply.return_value = self._deployment(1, 1, 1)
+        Provisioner('deploy', False, None, server_side_apply=True).run("k8s_handle/k8s/fixtures/pvc.yaml")
+        client.apply.assert_called_once_with()
+        client.get.assert_not_called()
+        client.replace.assert_not_called()
+
+    @patch('k8s_handle.k8s.provisioner.Adapter.get_instance')
+    def test_deploy_unchanged(self, mocked_get_instance):
+        client = mocked_get_instance.return_value
+        client.name = 'test'
+        client.endpoint = None
+        provisioner = Provisioner('deploy', False, None)
+
+        with patch('k8s_handle.k8s.content_hash.is_unchanged', return_value=True):
+            provisioner.run_all(["k8s_handle/k8s/fixtures/deployment.yaml"])
+            client.replace.assert_not_called()
+
+            Provisioner('deploy', False, None, force=True).run_all(["k8s_handle/k8s/fixtures/deployment.yaml"])
+            client.replace.assert_called_once()
+
+        self.assertEqual(provisioner._summary, {'unchanged': 1})
+
+    @patch('k8s_handle.k8s.provisioner.Adapter.get_instance')
+    def test_deploy_service_reads_whole_object(self, mocked_get_instance):
+        client = mocked_get_instance.return_value
+        client.name = 'test'
+        client.endpoint = None
+        client.kind = 'service'
+        with patch('k8s_handle.k8s.content_hash.is_unchanged', return_value=False):
+            Provisioner('deploy', False, None).run("k8s_handle/k8s/fixtures/service.yaml")
+        client.get.assert_called_once_with()
+        client.get_metadata.assert_not_called()
+
+    @patch('k8s_handle.k8s.provisioner.Adapter.get_instance')
+    def test_deploy_created_after_prefetch(self, mocked_get_instance):
+        # the default ServiceAccount of a new namespace is created by a controller after the prefetch
+        endpoint = resource_endpoint('ServiceAccount', 'serviceaccounts', 'v1')
+        responses = {
+            'GET': [{'items': [], 'metadata': {}}, {'metadata': {'name': 'default', 'resourceVersion': '5'}}],
+            'POST': [ApiException(status=409, reason='Conflict')],
+            'PATCH': [{'metadata': {'name': 'default'}}],
+        }
+        endpoint.api_client.call_api.side_effect = lambda path, method, **kwargs: _respond(responses[method].pop(0))
+        body = {'apiVersion': 'v1', 'kind': 'ServiceAccount', 'metadata': {'name': 'default', 'namespace': 'ns'}}
+        mocked_get_instance.return_value = AdapterDynamicKind(body, endpoint)
+        provisioner = Provisioner('deploy', False, None)
+
+        with patch('k8s_handle.k8s.content_hash.is_unchanged', return_value=False):
+            provisioner.run_all([RenderedTemplate('/tmp/sa.yaml', 'kind: ServiceAccount\nmetadata: {name: default}')])
+
+        self.assertEqual(provisioner._summary, {'replaced': 1})
+        self.assertEqual(responses, {'GET': [], 'POST': [], 'PATCH': []})
+
+    @patch('k8s_handle.k8s.provisioner.Adapter.get_instance')
+    def test_deploy_custom_service(self, mocked_get_instance):
+        # Service of Knative is served as dicts and isn't handled like the builtin one
+        client = AdapterDynamicKind(
+            {'apiVersion': 'serving.knative.dev/v1', 'kind': 'Service', 'metadata': {'name': 'test'}, 'spec': {}},
+            resource_endpoint('Service', 'services', 'serving.knative.dev/v1'))
+        client.get = Mock()
+        client.get_metadata = Mock(return_value={'metadata': {'name': 'test', 'resourceVersion': '5'}})
+        client.replace = Mock()
+        mocked_get_instance.return_value = client
+
+        with patch('k8s_handle.k8s.content_hash.is_unchanged', return_value=False):
+            Provisioner('deploy', False, None)._deploy(client.body, 'knative.yaml')
+
+        client.get.assert_not_called()
+        client.replace.assert_called_once_with({'resourceVersion': '5'})
+
     def test_pvc_replace_equals(self):
         Provisioner('deploy', False, None).run("k8s_handle/k8s/fixtures/pvc.yaml")
 
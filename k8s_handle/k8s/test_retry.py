@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import Mock
+
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import ProtocolError
+
+from k8s_handle.exceptions import ProvisioningError
+from .adapters import AdapterDynamicKind
+from .mocks import resource_endpoint
+from .retry import CONFLICT, CONNECTION_ERROR, SERVER_ERROR, RetryPolicy, classify
+
+
+def _policy(retries=3):
+    return RetryPolicy(retries=retries, sleep=Mock())
+
+
+def _adapter(kind='Widget', api_version='example.com/v1', plural='widgets', retries=3):
+    endpoint = resource_endpoint(kind, plural, api_version)
+    return AdapterDynamicKind({'kind': kind, 'apiVersion': api_version, 'metadata': {'name': 'test', 'namespace': 'ns'},
+                               'spec': {}}, endpoint, retry_policy=_policy(retries))
+
+
+class TestClassify(unittest.TestCase):
+    def test_classify(self):
+        self.assertEqual(classify(ApiException(status=409)), CONFLICT)
+        self.assertIsNone(classify(ApiException(status=429)))
+        self.assertEqual(classify(ApiException(status=503)), SERVER_ERROR)
+        self.assertEqual(classify(ProtocolError('Connection reset by peer')), CONNECTION_ERROR)
+        self.assertIsNone(classify(ApiException(status=422)))
+        self.assertIsNone(classify(ApiException(status=404)))
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_transient(self):
+        policy = _policy()
+        request = Mock(side_effect=[ApiException(status=503), ProtocolError('reset'), 'done'])
+
+        self.assertEqual(policy.call(request, 'read test'), 'done')
+        self.assertEqual(policy.counts, {SERVER_ERROR: 1, CONNECTION_ERROR: 1})
+        first, second = [args[0] for args, _ in policy._sleep.call_args_list]
+        self.assertTrue(0 < first < second, (first, second))
+
+    def test_exhausted(self):
+        policy = _policy(retries=2)
+        request = Mock(side_effect=ApiException(status=500))
+
+        with self.assertRaises(ApiException):
+            policy.call(request, 'read test')
+
+        self.assertEqual(request.call_count, 3)
+
+    def test_not_retried(self):
+        request = Mock(side_effect=ApiException(status=422))
+
+        with self.assertRaises(ApiException):
+            _policy().call(request, 'replace test', on_conflict=Mock())
+
+        with self.assertRaises(ApiException):
+            _policy().call(Mock(side_effect=ApiException(status=409)), 'replace test')
+
+        request.assert_called_once_with()
+
+    def test_conflict(self):
+        policy = _policy()
+        on_conflict = Mock()
+
+        self.assertEqual(policy.call(Mock(side_effect=[ApiException(status=409), 'done']), 'replace test',
+                                     on_conflict=on_conflict), 'done')
+        on_conflict.assert_called_once_with()
+        policy._sleep.assert_called_once_with(0)
+
+    def test_create_made_by_failed_attempt(self):
+        on_exists = Mock(return_value='existing')
+        request = Mock(side_effect=[ProtocolError('reset'), ApiException(status=409)])
+
+        self.assertEqual(_policy().call(request, 'create test', on_exists=on_exists), 'existing')
+
+        # the object existed before the first attempt
+        with self.assertRaises(ApiException):
+            _policy().call(Mock(side_effect=ApiException(status=409)), 'create test', on_exists=on_exists)
+
+
+class TestAdapterRetries(unittest.TestCase):
+    def test_replace_conflict_refreshes_resource_version(self):
+        adapter = _adapter()
+        call_api = adapter.endpoint.api_client.call_api
+        call_api.side_effect = [ApiException(status=409, reason='Conflict'),
+                                {'metadata': {'name': 'test', 'resourceVersion': '11'}},
+                                {'metadata': {'name': 'test', 'resourceVersion': '12'}}]
+
+        adapter.replace({'resourceVersion': '10'})
+
+        self.assertEqual(adapter.body['metadata']['resourceVersion'], '11')
+        self.assertEqual([args[1] for args, _ in call_api.call_args_list], ['PUT', 'GET', 'PUT'])
+        self.assertIn(b'"resourceVersion":"11"', call_api.call_args[1]['body'])
+        self.assertEqual(adapter.retry_policy.counts, {CONFLICT: 1})
+
+    def test_replace_failure(self):
+        adapter = _adapter(retries=1)
+        adapter.endpoint.api_client.call_api.side_effect = ApiException(status=500, reason='Internal Server Error')
+
+        with self.assertRaises(ProvisioningError):
+            adapter.replace({})
+
+        self.assertEqual(adapter.endpoint.api_client.call_api.call_count, 2)
+
+    def test_create_made_by_failed_attempt(self):
+        adapter = _adapter()
+        adapter.endpoint.api_client.call_api.side_effect = [
+            ApiException(status=504, reason='Gateway Timeout'), ApiException(status=409, reason='Conflict'),
+            {'metadata': {'name': 'test'}}]
+
+        self.assertEqual(adapter.create(), {'metadata': {'name': 'test'}})
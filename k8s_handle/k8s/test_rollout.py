@@ -0,0 +1,129 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from kubernetes.client import V1ContainerState, V1ContainerStateWaiting, V1ContainerStatus, V1Deployment, \
+    V1DeploymentCondition, V1DeploymentStatus, V1LabelSelector, V1ObjectMeta, V1OwnerReference, V1Pod, V1PodStatus, \
+    V1ReplicaSet, V1StatefulSet, V1StatefulSetStatus
+
+from .mocks import kube_client_mock
+from .rollout import RolloutFailureDetector
+
+REVISION = 'deployment.kubernetes.io/revision'
+
+
+def _spec(**match_labels):
+    return Mock(selector=V1LabelSelector(match_labels=match_labels))
+
+
+def _owner(uid):
+    return [V1OwnerReference(api_version='v1', kind='Kind', name='owner', uid=uid)]
+
+
+def _pod(name, owner_uid, reason=None):
+    state = V1ContainerState(waiting=V1ContainerStateWaiting(reason=reason, message='details') if reason else None)
+    return V1Pod(metadata=V1ObjectMeta(name=name, owner_references=_owner(owner_uid)),
+                 status=V1PodStatus(container_statuses=[
+                     V1ContainerStatus(name='app', image='image', image_id='', ready=False, restart_count=0,
+                                       state=state)]))
+
+
+def _deployment(conditions=None, generation=1, observed_generation=1):
+    deployment = V1Deployment(
+        metadata=V1ObjectMeta(name='app', uid='deployment', generation=generation, annotations={REVISION: '2'}),
+        status=V1DeploymentStatus(observed_generation=observed_generation, conditions=conditions))
+    deployment.spec = _spec(app='app')
+    return deployment
+
+
+def _client(pods=None, replica_sets=None):
+    return kube_client_mock('app', **{'list_pods.return_value': pods, 'list_replica_sets.return_value': replica_sets})
+
+
+class TestRolloutFailureDetector(unittest.TestCase):
+    def test_progress_deadline_exceeded(self):
+        detector = RolloutFailureDetector(_client(), 'Deployment')
+        with self.assertRaises(RuntimeError) as context:
+            detector.check(_deployment([V1DeploymentCondition(type='Progressing', status='False',
+                                                              reason='ProgressDeadlineExceeded',
+                                                              message='ReplicaSet "app-1" has timed out')]))
+        self.assertEqual(str(context.exception), 'Deployment "app" rollout failed: '
+                                                 'ProgressDeadlineExceeded: ReplicaSet "app-1" has timed out')
+
+    def test_progress_deadline_of_previous_generation(self):
+        detector = RolloutFailureDetector(_client(), 'Deployment')
+        detector.check(_deployment([V1DeploymentCondition(type='Progressing', status='False',
+                                                          reason='ProgressDeadlineExceeded')],
+                                   generation=2, observed_generation=1))
+
+    def test_deployment_new_pods(self):
+        replica_sets = [
+            V1ReplicaSet(metadata=V1ObjectMeta(name='app-{}'.format(revision), uid=uid,
+                                               annotations={REVISION: revision},
+                                               labels={'pod-template-hash': revision},
+                                               owner_references=_owner('deployment')))
+            for revision, uid in [('1', 'old'), ('2', 'new')]
+        ]
+        client = _client(pods=[_pod('app-2-a', 'new', 'CreateContainerConfigError')], replica_sets=replica_sets)
+
+        with self.assertRaises(RuntimeError) as context:
+            RolloutFailureDetector(client, 'Deployment').check(_deployment())
+
+        self.assertEqual(str(context.exception), 'Deployment "app" rollout failed: '
+                                                 'pod "app-2-a" container "app": CreateContainerConfigError (details)')
+        client.list_replica_sets.assert_called_once_with('app=app')
+        client.list_pods.assert_called_once_with('app=app,pod-template-hash=2')
+
+    def test_statefulset_pods(self):
+        statefulset = V1StatefulSet(metadata=V1ObjectMeta(name='app', uid='statefulset'),
+                                    status=V1StatefulSetStatus(replicas=1, update_revision='app-2'))
+        statefulset.spec = _spec(app='app')
+        client = _client(pods=[_pod('app-0', 'statefulset', 'ContainerCreating'),
+                               _pod('other-0', 'other', 'CrashLoopBackOff'),
+                               _pod('app-1', 'statefulset', 'CrashLoopBackOff')])
+
+        with self.assertRaises(RuntimeError) as context:
+            RolloutFailureDetector(client, 'StatefulSet').check(statefulset)
+
+        self.assertTrue('pod "app-1" container "app": CrashLoopBackOff' in str(context.exception), context.exception)
+        client.list_pods.assert_called_once_with('app=app,controller-revision-hash=app-2')
+
+    @patch('k8s_handle.k8s.rollout.monotonic')
+    def test_image_pull_failure_persisted(self, mocked_monotonic):
+        statefulset = V1StatefulSet(metadata=V1ObjectMeta(name='app', uid='statefulset'),
+                                    status=V1StatefulSetStatus(replicas=1))
+        statefulset.spec = _spec(app='app')
+        client = _client(pods=[_pod('app-0', 'statefulset', 'ErrImagePull')])
+        detector = RolloutFailureDetector(client, 'StatefulSet', interval=0, image_pull_timeout=60)
+
+        mocked_monotonic.return_value = 100
+        detector.check(statefulset)
+
+        # the image is pulled again after a transient failure
+        client.list_pods.return_value = [_pod('app-0', 'statefulset', 'ContainerCreating')]
+        mocked_monotonic.return_value = 130
+        detector.check(statefulset)
+
+        client.list_pods.return_value = [_pod('app-0', 'statefulset', 'ImagePullBackOff')]
+        mocked_monotonic.return_value = 150
+        detector.check(statefulset)
+        mocked_monotonic.return_value = 200
+        detector.check(statefulset)
+
+        mocked_monotonic.return_value = 210
+        with self.assertRaises(RuntimeError) as context:
+            detector.check(statefulset)
+
+        self.assertTrue('pod "app-0" container "app": ImagePullBackOff' in str(context.exception), context.exception)
+
+    def test_healthy_pods_checked_once_per_interval(self):
+        client = _client(pods=[_pod('app-0', 'statefulset', 'ContainerCreating')])
+        statefulset = V1StatefulSet(metadata=V1ObjectMeta(name='app', uid='statefulset'),
+                                    status=V1StatefulSetStatus(replicas=1))
+        statefulset.spec = _spec(app='app')
+        detector = RolloutFailureDetector(client, 'StatefulSet', interval=60)
+        detector.check(statefulset)
+        detector.check(statefulset)
+        client.list_pods.assert_called_once_with('app=app')
+
+    def test_pods_not_supported(self):
+        RolloutFailureDetector(_client(), 'DaemonSet').check(_deployment())
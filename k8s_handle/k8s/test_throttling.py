@@ -0,0 +1,109 @@
+import threading
+import unittest
+
+from k8s_handle.exceptions import DeadlineExceededError
+from .throttling import RateLimiter
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+def _limiter(fake, **kwargs):
+    return RateLimiter(clock=fake.clock, sleep=fake.sleep, **kwargs)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_unlimited(self):
+        fake = FakeTime()
+        limiter = _limiter(fake)
+
+        for _ in range(100):
+            with limiter.limit():
+                pass
+
+        self.assertEqual(fake.sleeps, [])
+        self.assertEqual(limiter.throttled_requests, 0)
+
+    def test_burst_then_qps(self):
+        fake = FakeTime()
+        limiter = _limiter(fake, qps=2, burst=3)
+
+        for _ in range(5):
+            with limiter.limit():
+                pass
+
+        self.assertEqual(fake.sleeps, [0.5, 0.5])
+        self.assertEqual(limiter.throttled_requests, 2)
+        self.assertEqual(limiter.throttled_time, 1.0)
+
+        # tokens are refilled while there are no requests
+        fake.now += 10
+        with limiter.limit():
+            pass
+        self.assertEqual(len(fake.sleeps), 2)
+
+    def test_deadline(self):
+        fake = FakeTime()
+        limiter = _limiter(fake, qps=1, burst=1)
+
+        with limiter.limit():
+            pass
+
+        with self.assertRaises(DeadlineExceededError):
+            with limiter.limit(deadline=fake.now + 0.5):
+                pass
+
+        # the token of the request which is not sent is returned
+        with limiter.limit(deadline=fake.now + 1):
+            pass
+        self.assertEqual(fake.sleeps, [1.0])
+
+    def test_pause(self):
+        fake = FakeTime()
+        limiter = _limiter(fake)
+        limiter.pause(3)
+
+        with limiter.limit():
+            pass
+
+        self.assertEqual(fake.sleeps, [3])
+        self.assertEqual(limiter.rejected_requests, 1)
+
+    def test_max_in_flight(self):
+        limiter = RateLimiter(max_in_flight=1)
+        entered = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with limiter.limit():
+                entered.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        entered.wait(5)
+
+        with self.assertRaises(DeadlineExceededError):
+            with limiter.limit(deadline=limiter._clock() + 0.05):
+                pass
+
+        # watches are long running and don't take places in flight
+        with limiter.limit(long_running=True):
+            pass
+
+        release.set()
+        thread.join(5)
+
+        with limiter.limit():
+            pass
+        self.assertEqual(limiter.throttled_requests, 0)
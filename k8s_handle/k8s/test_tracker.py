@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import Mock
+
+from kubernetes.client import V1ObjectMeta
+
+from .mocks import kube_client_mock
+from .polling import PollingPolicy
+from .tracker import RolloutTracker
+
+
+def _client(name, kind='deployment', namespace='default', api=None):
+    return kube_client_mock(name, kind=kind, namespace=namespace, api=api or Mock(),
+                            **{'get.return_value': _resource(name, True)})
+
+
+def _resource(name, complete):
+    resource = Mock()
+    resource.metadata = V1ObjectMeta(name=name)
+    resource.complete = complete
+    return resource
+
+
+class TestRolloutTracker(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+        self.tracker = RolloutTracker({'Deployment': lambda resource: resource.complete}, self.sleeps.append)
+
+    def test_nothing_to_wait(self):
+        self.tracker.wait(PollingPolicy(0))
+
+    def test_list_once_per_kind_and_namespace(self):
+        api = Mock()
+        first, second = _client('first', api=api), _client('second', api=api)
+        first.list.return_value = [_resource('first', True), _resource('second', False), _resource('other', False)]
+        self.tracker.add(first, 'Deployment')
+        self.tracker.add(second, 'Deployment')
+        self.tracker.wait(PollingPolicy(10, min_delay=1, max_delay=5, jitter=0))
+
+        first.list.assert_called_once_with(raw=True)
+        second.list.assert_not_called()
+        first.get.assert_not_called()
+        second.get.assert_called_once_with(raw=True)
+        self.assertEqual(self.sleeps, [1])
+
+    def test_get_single_resource(self):
+        client = _client('first')
+        self.tracker.add(client, 'Deployment')
+        self.tracker.wait(PollingPolicy(0))
+        client.list.assert_not_called()
+        client.get.assert_called_once_with(raw=True)
+
+    def test_get_if_list_not_supported(self):
+        api = Mock()
+        first, second = _client('first', api=api), _client('second', api=api)
+        first.list.return_value = None
+        self.tracker.add(first, 'Deployment')
+        self.tracker.add(second, 'Deployment')
+        self.tracker.wait(PollingPolicy(0))
+        first.get.assert_called_once_with(raw=True)
+        second.get.assert_called_once_with(raw=True)
+
+    def test_not_found(self):
+        client = _client('first')
+        client.get.return_value = None
+        self.tracker.add(client, 'Deployment')
+        with self.assertRaises(RuntimeError) as context:
+            self.tracker.wait(PollingPolicy(0))
+        self.assertEqual(str(context.exception), 'Deployment "first" not found')
+
+    def test_not_completed(self):
+        first, second = _client('first', namespace='first'), _client('second', namespace='second')
+        second.get.return_value = _resource('second', False)
+        self.tracker.add(first, 'Deployment')
+        self.tracker.add(second, 'Deployment')
+        with self.assertRaises(RuntimeError) as context:
+            self.tracker.wait(PollingPolicy(0))
+        self.assertEqual(str(context.exception), 'Resources not completed for 1 tries in 0 sec.: Deployment "second"')
+        self.assertEqual(first.get.call_count, 1)
+        self.assertEqual(second.get.call_count, 1)
@@ -0,0 +1,86 @@
+import json
+import unittest
+from unittest.mock import Mock
+
+
+from .diff import to_dict
+from .mocks import resource_endpoint
+from .provisioner import Provisioner
+from .view import ResourceView, decode, view
+
+DEPLOYMENT = {
+    'apiVersion': 'apps/v1',
+    'kind': 'Deployment',
+    'metadata': {'name': 'test', 'generation': 2, 'resourceVersion': '10',
+                 'annotations': {'deployment.kubernetes.io/revision': '3'}},
+    'spec': {'replicas': 2, 'template': {'metadata': {'creationTimestamp': None}}},
+    'status': {'observedGeneration': 2, 'replicas': 2, 'availableReplicas': 2, 'readyReplicas': 2,
+               'updatedReplicas': 2, 'conditions': [{'type': 'Available', 'status': 'True'}]},
+}
+
+
+class TestResourceView(unittest.TestCase):
+    def test_attributes(self):
+        deployment = view(DEPLOYMENT, 'V1Deployment')
+
+        self.assertEqual(deployment.metadata.resource_version, '10')
+        self.assertEqual(deployment.metadata.annotations, {'deployment.kubernetes.io/revision': '3'})
+        self.assertEqual(deployment.status.ready_replicas, 2)
+        self.assertEqual(deployment.status.conditions[0].type, 'Available')
+        self.assertIsNone(deployment.status.unavailable_replicas)
+        self.assertIsNone(deployment.metadata.labels)
+
+        with self.assertRaises(AttributeError):
+            deployment.status.unknown
+
+    def test_irregular_names(self):
+        service = view({'spec': {'clusterIP': '10.0.0.1'}}, 'V1Service')
+        self.assertEqual(service.spec.cluster_ip, '10.0.0.1')
+
+        page = view({'items': [], 'metadata': {'continue': 'next'}}, 'V1DeploymentList')
+        self.assertEqual(page.metadata._continue, 'next')
+
+    def test_untyped(self):
+        self.assertEqual(view({'spec': {}}, 'object'), {'spec': {}})
+
+    def test_equality(self):
+        self.assertEqual(view(DEPLOYMENT, 'V1Deployment').status, view(dict(DEPLOYMENT), 'V1Deployment').status)
+        self.assertNotEqual(view(DEPLOYMENT, 'V1Deployment').status, view(DEPLOYMENT, 'V1Deployment').spec)
+
+    def test_decode(self):
+        response = Mock(data=json.dumps(DEPLOYMENT).encode('utf-8'))
+        deployment = decode(response, 'V1Deployment')
+
+        self.assertIsInstance(deployment, ResourceView)
+        self.assertEqual(deployment.raw, DEPLOYMENT)
+        response.release_conn.assert_called_once_with()
+
+    def test_checks_of_provisioner(self):
+        deployment = view(DEPLOYMENT, 'V1Deployment')
+        self.assertTrue(Provisioner('deploy', True, None)._is_deployment_complete(deployment))
+        self.assertEqual(Provisioner._resource_version(deployment), '10')
+
+    def test_to_dict(self):
+        self.assertEqual(to_dict(view(DEPLOYMENT, 'V1Deployment'))['spec'],
+                         {'replicas': 2, 'template': {'metadata': {}}})
+
+
+class TestRawResponses(unittest.TestCase):
+    def setUp(self):
+        self.endpoint = resource_endpoint(verbs=['get', 'list'])
+
+    def test_read(self):
+        self.endpoint.api_client.call_api.return_value = Mock(data=json.dumps(DEPLOYMENT))
+        deployment = self.endpoint.read('test', namespace='ns', raw=True)
+
+        self.assertEqual(deployment.spec.replicas, 2)
+        self.assertFalse(self.endpoint.api_client.call_api.call_args[1]['_preload_content'])
+
+    def test_list(self):
+        self.endpoint.api_client.call_api.return_value = Mock(data=json.dumps({'items': [DEPLOYMENT]}))
+        deployments = self.endpoint.list(namespace='ns', limit=10, raw=True)
+
+        self.assertEqual(deployments.items[0].metadata.name, 'test')
+        kwargs = self.endpoint.api_client.call_api.call_args[1]
+        self.assertFalse(kwargs['_preload_content'])
+        self.assertEqual(kwargs['query_params'], [('limit', 10)])
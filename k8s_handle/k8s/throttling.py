@@ -0,0 +1,100 @@
+import logging
+import threading
+from contextlib import contextmanager
+from time import monotonic, sleep
+
+from k8s_handle.exceptions import DeadlineExceededError
+
+log = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Client-side limits of requests to the API server shared by all threads of a run: a token bucket of qps requests
+    per second with bursts of up to burst requests, and a cap of max_in_flight requests in progress. Watches are long
+    running, so they take tokens but not places in flight. Zero values disable the limits.
+
+    The API server may reject requests with 429 Too Many Requests, then all requests are paused for the time
+    it asks for.
+    """
+
+    def __init__(self, qps=0, burst=0, max_in_flight=0, clock=monotonic, sleep=sleep):
+        self.qps = qps
+        self.burst = max(burst, 1)
+        self.max_in_flight = max_in_flight
+        self.throttled_time = 0.0
+        self.throttled_requests = 0
+        self.rejected_requests = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, deadline=None, long_running=False):
+        """
+        Waits until the request may be sent and keeps its place in flight until the block is exited.
+        """
+        waited = self._wait_for_token(deadline)
+        in_flight = self._in_flight if not long_running else None
+
+        if in_flight is not None and not in_flight.acquire(blocking=False):
+            started = self._clock()
+            timeout = None if deadline is None else max(deadline - started, 0)
+
+            if not in_flight.acquire(timeout=timeout):
+                raise DeadlineExceededError('Deadline exceeded, request is not sent')
+
+            waited += self._clock() - started
+
+        if waited > 0:
+            with self._lock:
+                self.throttled_time += waited
+                self.throttled_requests += 1
+
+        try:
+            yield
+        finally:
+            if in_flight is not None:
+                in_flight.release()
+
+    def pause(self, delay):
+        """
+        Postpones all requests by delay seconds, e.g. when the server asks to retry after that time.
+        """
+        with self._lock:
+            self.rejected_requests += 1
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+
+    def _wait_for_token(self, deadline):
+        with self._lock:
+            now = self._clock()
+            delay = max(self._paused_until - now, 0)
+
+            if self.qps:
+                # tokens are reserved in advance, a negative balance is the queue of waiting requests
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.qps)
+                self._updated = now
+                self._tokens -= 1
+
+                if self._tokens < 0:
+                    delay = max(delay, -self._tokens / self.qps)
+
+            if deadline is not None and now + delay > deadline:
+                if self.qps:
+                    self._tokens += 1
+
+                raise DeadlineExceededError('Deadline exceeded, request is not sent')
+
+        if delay > 0:
+            self._sleep(delay)
+
+        return delay
+
+    def report(self):
+        if self.throttled_requests or self.rejected_requests:
+            log.info('Requests to the API server were throttled for {:.1f} sec. in total: {} delayed, {} rejected '
+                     'by the server'.format(self.throttled_time, self.throttled_requests, self.rejected_requests))
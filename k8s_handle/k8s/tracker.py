@@ -0,0 +1,101 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class RolloutTracker:
+    """
+    Tracks the rollout of many resources at once: every tick the resources of one kind and namespace
+    are fetched with a single LIST request (or GET if there is only one of them or the kind can't be listed).
+    """
+
+    def __init__(self, checks, sleep):
+        self._checks = checks
+        self._sleep = sleep
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, kube_client, kind, detector=None):
+        with self._lock:
+            self._pending.append((kube_client, kind, detector))
+
+    @property
+    def pending(self):
+        return ['{} "{}"'.format(kind, kube_client.name) for kube_client, kind, _ in self._pending]
+
+    def wait(self, policy, deadline=None):
+        if not self._pending:
+            return
+
+        total = len(self._pending)
+        poller = policy.start(deadline)
+        log.info('Waiting for {} resources to complete'.format(total))
+
+        while True:
+            resources = self._fetch(self._pending)
+            pending = [entry for entry in self._pending if not self._is_complete(entry, resources)]
+
+            if len(pending) < len(self._pending):
+                poller.progress()
+
+            self._pending = pending
+
+            if not self._pending:
+                log.info('All {} resources completed'.format(total))
+                return
+
+            log.info('{} of {} resources completed, pending: {}'.format(
+                total - len(self._pending), total, self._describe(self._pending)))
+
+            delay = poller.next_delay()
+            if delay is None:
+                break
+
+            self._sleep(delay)
+
+        raise RuntimeError('Resources not completed for {} tries in {:.0f} sec.: {}'.format(
+            poller.attempts, poller.elapsed(), self._describe(self._pending)))
+
+    def _is_complete(self, entry, resources):
+        kube_client, kind, detector = entry
+        resource = resources.get((self._group_key(kube_client), kube_client.name))
+
+        if resource is None:
+            raise RuntimeError('{} "{}" not found'.format(kind, kube_client.name))
+
+        if not self._checks[kind](resource):
+            if detector is not None:
+                detector.check(resource)
+
+            return False
+
+        log.info('{} "{}" completed'.format(kind, kube_client.name))
+        return True
+
+    def _fetch(self, entries):
+        groups = {}
+        for kube_client, _, _ in entries:
+            groups.setdefault(self._group_key(kube_client), []).append(kube_client)
+
+        resources = {}
+        for key, kube_clients in groups.items():
+            items = kube_clients[0].list(raw=True) if len(kube_clients) > 1 else None
+
+            if items is None:
+                for kube_client in kube_clients:
+                    resources[(key, kube_client.name)] = kube_client.get(raw=True)
+                continue
+
+            for item in items:
+                resources[(key, item.metadata.name)] = item
+
+        return resources
+
+    @staticmethod
+    def _group_key(kube_client):
+        return type(kube_client.api), kube_client.kind, kube_client.namespace
+
+    @staticmethod
+    def _describe(entries):
+        return ', '.join('{} "{}"'.format(kind, kube_client.name) for kube_client, kind, _ in entries)
@@ -0,0 +1,68 @@
+import json
+import re
+
+from kubernetes.client import models
+
+LIST_TYPE = re.compile(r'^list\[(.+)\]$')
+
+
+class ResourceView:
+    """
+    Read-only view of an object decoded from JSON with attributes of the model of the client, e.g.
+    view.status.ready_replicas reads raw['status']['readyReplicas'] when it's accessed. Nested objects of models
+    are views as well, other values, including timestamps, are left as they are in JSON.
+    """
+    __slots__ = ('raw', '_model')
+
+    def __init__(self, raw, model):
+        self.raw = raw
+        self._model = model
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name not in self._model.attribute_map:
+            raise AttributeError('{} has no attribute "{}"'.format(self._model.__name__, name))
+
+        return _view(self.raw.get(self._model.attribute_map[name]), self._model.openapi_types[name])
+
+    def __eq__(self, other):
+        return isinstance(other, ResourceView) and self.raw == other.raw
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({})'.format(self._model.__name__, self.raw)
+
+
+def view(raw, model_name):
+    """
+    Returns the view of the decoded JSON object as the model of the client, or the object itself if there is
+    no such model, e.g. for custom resources.
+    """
+    return _view(raw, model_name)
+
+
+def decode(response, model_name):
+    """
+    Decodes the body of the not preloaded response into a view without deserialization into models.
+    """
+    try:
+        return view(json.loads(response.data), model_name)
+    finally:
+        response.release_conn()
+
+
+def _view(value, openapi_type):
+    if value is None:
+        return None
+
+    match = LIST_TYPE.match(openapi_type)
+
+    if match and isinstance(value, list):
+        return [_view(item, match.group(1)) for item in value]
+
+    model = getattr(models, openapi_type, None)
+
+    if model is None or not isinstance(value, dict):
+        return value
+
+    return ResourceView(value, model)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+
+import jinja2
+from jinja2 import meta
+
+from k8s_handle.filesystem import prune_directory
+
+log = logging.getLogger(__name__)
+
+# outputs cached by previous versions of rendering are not reused
+CACHE_VERSION = 1
+
+PATTERN = 'render-%s.json'
+
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+
+
+def recorded(env, name, function):
+    """
+    Wraps a global function of templates which reads files, so its calls made while a template is rendered for
+    the cache are recorded as dependencies of the output.
+    """
+    def wrapper(*args):
+        result = function(*args)
+        reads = getattr(env, 'recorded_reads', None)
+
+        if reads is not None:
+            reads.append([name, list(args), digest(result)])
+
+        return result
+
+    return wrapper
+
+
+class RenderCache:
+    """
+    Content-addressed cache of rendered templates, its directory may be shared by runs and CI jobs. The key of an
+    output is made of sources of the template and of templates it includes, imports or extends, and of values of
+    context variables they refer to. Files read by include_file and list_files are recorded with the output and it's
+    reused only if they're unchanged. Templates referring to other templates by names computed while rendering are
+    not cached.
+    """
+
+    def __init__(self, env, directory, max_size):
+        os.makedirs(directory, exist_ok=True)
+        self._env = env
+        self._directory = directory
+        self._analyses = {}
+        prune_directory(directory, PATTERN % '*', max_size)
+
+    def render(self, name, context):
+        """
+        Returns the output of the template and True if it's taken from the cache, False if it's rendered and cached,
+        None if the template can't be cached.
+        """
+        key = self._key(name, context)
+
+        if key is None:
+            return self._env.get_template(name).render(context), None
+
+        path = os.path.join(self._directory, PATTERN % key)
+        entry = self._load(path)
+
+        if entry is not None and all(self._read(*read) == result for *read, result in entry['reads']):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+            return entry['output'], True
+
+        self._env.recorded_reads = reads = []
+
+        try:
+            output = self._env.get_template(name).render(context)
+        finally:
+            self._env.recorded_reads = None
+
+        self._store(path, {'output': output, 'reads': reads})
+        return output, False
+
+    def _key(self, name, context):
+        sources, variables = {}, set()
+        pending = [name]
+
+        while pending:
+            current = pending.pop()
+
+            if current in sources:
+                continue
+
+            try:
+                sources[current], _, _ = self._env.loader.get_source(self._env, current)
+            except jinja2.TemplateNotFound:
+                if current == name:
+                    raise
+
+                # includes with "ignore missing" or under false conditions may refer to absent templates,
+                # the output is reused until they're added
+                sources[current] = None
+                continue
+
+            references, names = self._analyze(sources[current])
+
+            if None in references:
+                return None
+
+            pending.extend(references)
+            variables.update(names)
+
+        return digest([CACHE_VERSION, jinja2.__version__, name, sources,
+                       {variable: context[variable] for variable in variables if variable in context}])
+
+    def _analyze(self, source):
+        key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+        if key not in self._analyses:
+            ast = self._env.parse(source)
+            self._analyses[key] = (list(meta.find_referenced_templates(ast)), meta.find_undeclared_variables(ast))
+
+        return self._analyses[key]
+
+    def _read(self, name, args):
+        try:
+            return digest(self._env.globals[name](*args))
+        except (KeyError, OSError):
+            return None
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.debug('Unable to read render cache "{}": {}'.format(path, e))
+            return None
+
+    @staticmethod
+    def _store(path, entry):
+        try:
+            temp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+            with open(temp_path, 'w') as f:
+                json.dump(entry, f)
+
+            os.replace(temp_path, path)
+        except OSError as e:
+            log.debug('Unable to write render cache "{}": {}'.format(path, e))
@@ -8,6 +8,15 @@ CONFIG_FILE = os.environ.get('CONFIG_FILE', 'config.yaml')
 
 COMMON_SECTION_NAME = 'common'
 TEMPLATES_DIR = os.environ.get('TEMPLATES_DIR', 'templates')
+# compiled templates are cached on disk only if the directory is set, files used least recently are removed above
+# the max size in megabytes
+TEMPLATES_CACHE_DIR = os.environ.get('TEMPLATES_CACHE_DIR')
+TEMPLATES_CACHE_MAX_SIZE = int(os.environ.get('TEMPLATES_CACHE_MAX_SIZE', 64)) * 1024 * 1024
+# rendered templates are cached on disk only if the directory is set, the max size is in megabytes as well
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR')
+RENDER_CACHE_MAX_SIZE = int(os.environ.get('RENDER_CACHE_MAX_SIZE', 256)) * 1024 * 1024
+# templates are rendered by this count of processes
+RENDER_JOBS = int(os.environ.get('RENDER_JOBS', 1))
 
 K8S_CONFIG_DIR = os.environ.get('K8S_CONFIG_DIR', '{}/.kube/'.format(os.path.expanduser('~')))
 
@@ -15,9 +24,37 @@ K8S_NAMESPACE = None
 
 TEMP_DIR = os.environ.get('TEMP_DIR', '/tmp/k8s-handle')
 
+K8S_POOL_MAXSIZE = int(os.environ.get('K8S_POOL_MAXSIZE', 10))
+K8S_CONNECT_TIMEOUT = int(os.environ.get('K8S_CONNECT_TIMEOUT', 10))
+K8S_READ_TIMEOUT = int(os.environ.get('K8S_READ_TIMEOUT', 60))
+
+# client-side limits of requests to the API server: requests per second, bursts of them and requests in progress
+K8S_QPS = float(os.environ.get('K8S_QPS', 0))
+K8S_BURST = int(os.environ.get('K8S_BURST', 10))
+K8S_MAX_IN_FLIGHT = int(os.environ.get('K8S_MAX_IN_FLIGHT', 0))
+# transient failures of requests (conflicts, 5xx responses, broken connections) are retried up to this count
+K8S_RETRIES = int(os.environ.get('K8S_RETRIES', 5))
+# JSON file to write the report of requests to the API server made by a run to
+K8S_API_REPORT = os.environ.get('K8S_API_REPORT')
+
+# discovery results are cached on disk only if the directory is set
+K8S_DISCOVERY_CACHE_DIR = os.environ.get('K8S_DISCOVERY_CACHE_DIR')
+K8S_DISCOVERY_CACHE_TTL = int(os.environ.get('K8S_DISCOVERY_CACHE_TTL', 600))
+
+# server-side apply is made on behalf of the field manager, conflicts with other managers fail it unless forced
+K8S_FIELD_MANAGER = os.environ.get('K8S_FIELD_MANAGER', 'k8s-handle')
+K8S_FORCE_CONFLICTS = False
+
 CHECK_STATUS_TRIES = 360
 CHECK_STATUS_TIMEOUT = 5
 
+# wall-clock limit of waiting for a resource in seconds, CHECK_STATUS_TRIES * CHECK_STATUS_TIMEOUT if not set
+WAIT_TIMEOUT = None
+# delay between checks starts from POLL_MIN_DELAY and grows up to CHECK_STATUS_TIMEOUT
+POLL_MIN_DELAY = float(os.environ.get('POLL_MIN_DELAY', 1))
+POLL_BACKOFF_FACTOR = float(os.environ.get('POLL_BACKOFF_FACTOR', 2))
+POLL_JITTER = float(os.environ.get('POLL_JITTER', 0.2))
+
 CHECK_CONTAINERS_IN_POD_TRIES = 360
 CHECK_CONTAINERS_IN_POD_TIMEOUT = 5
 
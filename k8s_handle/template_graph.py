@@ -0,0 +1,196 @@
+import logging
+import os
+from collections import namedtuple
+from pathlib import PurePath
+
+from jinja2 import meta, nodes
+from jinja2.exceptions import TemplateNotFound, TemplateSyntaxError
+
+from k8s_handle import config
+from k8s_handle import settings
+from k8s_handle.filesystem import load_yaml
+from k8s_handle.templating import Renderer, get_env
+
+log = logging.getLogger(__name__)
+
+# global functions of templates reading files by paths relative to the parent of the templates directory
+FILE_FUNCTIONS = ['include_file', 'list_files']
+
+# variables of the config which change how all resources of a section are deployed
+DEPLOY_VARIABLES = {config.KEY_K8S_MASTER_URI, config.KEY_K8S_CA_BASE64, config.KEY_K8S_TOKEN, config.KEY_K8S_NAMESPACE,
+                    config.KEY_USE_KUBECONFIG}
+
+# dependencies of a template and of all templates it includes, imports or extends: names of the templates, patterns of
+# files read by the functions, context variables, and whether some of the templates or files are named by expressions
+Dependencies = namedtuple('Dependencies', ['templates', 'files', 'variables', 'dynamic_templates', 'dynamic_files'])
+
+
+class TemplateGraph:
+    """
+    Dependencies of templates found in their Jinja AST: templates they include, import or extend, arguments of
+    include_file and list_files, and context variables they refer to.
+    """
+
+    def __init__(self, templates_dir):
+        self.templates_dir = templates_dir
+        self._env = get_env(templates_dir)
+        self._nodes = {}
+
+    def node(self, name):
+        """
+        Returns direct dependencies of the template, the template which doesn't exist has none.
+        """
+        if name not in self._nodes:
+            try:
+                source, _, _ = self._env.loader.get_source(self._env, name)
+                ast = self._env.parse(source)
+            except TemplateNotFound:
+                self._nodes[name] = Dependencies(set(), set(), set(), False, False)
+                return self._nodes[name]
+            except TemplateSyntaxError as e:
+                raise RuntimeError('Unable to parse template {}: {}'.format(name, e))
+
+            templates = list(meta.find_referenced_templates(ast))
+            files = [call.args[0].value if call.args and isinstance(call.args[0], nodes.Const) else None
+                     for call in ast.find_all(nodes.Call)
+                     if isinstance(call.node, nodes.Name) and call.node.name in FILE_FUNCTIONS]
+
+            self._nodes[name] = Dependencies({template for template in templates if template is not None},
+                                             {path for path in files if path is not None},
+                                             meta.find_undeclared_variables(ast) - set(FILE_FUNCTIONS),
+                                             None in templates, None in files)
+
+        return self._nodes[name]
+
+    def dependencies(self, name):
+        """
+        Returns dependencies of the template including ones of templates it refers to, transitively.
+        """
+        templates, files, variables = set(), set(), set()
+        dynamic_templates = dynamic_files = False
+        pending = [name]
+
+        while pending:
+            current = pending.pop()
+
+            if current in templates:
+                continue
+
+            templates.add(current)
+            node = self.node(current)
+            pending.extend(node.templates)
+            files |= node.files
+            variables |= node.variables
+            dynamic_templates = dynamic_templates or node.dynamic_templates
+            dynamic_files = dynamic_files or node.dynamic_files
+
+        return Dependencies(templates, files, variables, dynamic_templates, dynamic_files)
+
+    def is_affected(self, name, changed_files, changed_variables=()):
+        """
+        Returns True if the template depends on any of changed files, given by absolute paths, or variables.
+        """
+        dependencies = self.dependencies(name)
+        templates_dir = os.path.abspath(self.templates_dir)
+        files_dir = os.path.dirname(templates_dir)
+        templates = {os.path.join(templates_dir, template) for template in dependencies.templates}
+
+        for path in changed_files:
+            if path in templates:
+                return True
+
+            if dependencies.dynamic_templates and path.startswith(templates_dir + os.sep):
+                return True
+
+            if dependencies.dynamic_files:
+                return True
+
+            for pattern in dependencies.files:
+                pattern = os.path.normpath(os.path.join(files_dir, pattern))
+
+                # list_files lists files of a directory as well
+                if PurePath(path).match(pattern) or os.path.dirname(path) == pattern:
+                    return True
+
+        return not dependencies.variables.isdisjoint(changed_variables)
+
+
+def affected(changed_files, sections=None, base_config=None, tags=None, skip_tags=None):
+    """
+    Returns templates of sections of the config affected by changed files, by sections. Any change of the config makes
+    all templates affected, unless base_config, the config before the changes, is given: then templates referring to
+    changed variables of their section and templates added to it are affected, or all templates of the section if
+    its connection or namespace is changed. Sections which can't be loaded or have no templates are skipped.
+    """
+    changed_files = {os.path.abspath(path) for path in changed_files}
+    config_changed = os.path.abspath(settings.CONFIG_FILE) in changed_files
+    graph = TemplateGraph(settings.TEMPLATES_DIR)
+    renderer = Renderer(settings.TEMPLATES_DIR, tags, skip_tags)
+    raw_config = load_yaml(settings.CONFIG_FILE) or {}
+    # the base config may be a pipe, e.g. <(git show HEAD~1:config.yaml), so it's read once
+    base_raw_config = load_yaml(base_config) if config_changed and base_config else None
+    output = {}
+
+    for section in sections or [key for key in raw_config if key != settings.COMMON_SECTION_NAME]:
+        try:
+            context = config.get_context_section(raw_config, section, settings.CONFIG_FILE)
+            entries = renderer.templates_by_context(context)
+        except RuntimeError as e:
+            log.warning('Section "{}" is skipped: {}'.format(section, e))
+            continue
+
+        if not entries:
+            log.info('Section "{}" has no templates to render, skip it'.format(section))
+            continue
+
+        templates = [entry['template'] for entry in entries]
+        changed_variables = _included_variables(raw_config, section, changed_files)
+        # templates affected regardless of their dependencies
+        forced = set()
+
+        if config_changed:
+            base_context = _load_base_section(section, base_raw_config, base_config)
+
+            if base_context is None:
+                forced = set(templates)
+            else:
+                changed_variables |= {key for key in set(context) | set(base_context)
+                                      if context.get(key) != base_context.get(key)}
+                forced = set(templates) - {entry['template']
+                                           for entry in renderer.templates_by_context(base_context) or []}
+
+        if not changed_variables.isdisjoint(DEPLOY_VARIABLES):
+            forced = set(templates)
+
+        section_affected = [template for template in templates
+                            if template in forced or graph.is_affected(template, changed_files, changed_variables)]
+
+        if section_affected:
+            output[section] = section_affected
+
+    return output
+
+
+def _load_base_section(section, base_raw_config, base_config):
+    if base_raw_config is None:
+        return None
+
+    try:
+        return config.get_context_section(base_raw_config, section, base_config)
+    except RuntimeError as e:
+        log.info('Section "{}" is considered new: {}'.format(section, e))
+        return None
+
+
+def _included_variables(raw_config, section, changed_files):
+    """
+    Returns variables of the section and the common section which include changed files with {{ file='...' }}.
+    """
+    variables = set()
+
+    for key in [settings.COMMON_SECTION_NAME, section]:
+        for variable, value in (raw_config.get(key) or {}).items():
+            if any(os.path.abspath(path) in changed_files for path in config.find_included_files(value)):
+                variables.add(variable)
+
+    return variables
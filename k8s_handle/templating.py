@@ -1,44 +1,85 @@
 import base64
+import copy
 import glob
 import itertools
 import logging
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import sha256
 
 import yaml
-from jinja2 import Environment, FileSystemLoader, StrictUndefined
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, StrictUndefined
 from jinja2.exceptions import TemplateNotFound, TemplateSyntaxError, UndefinedError
 
 from k8s_handle import settings
 from k8s_handle.exceptions import TemplateRenderingError
+from k8s_handle.filesystem import prune_directory
+from k8s_handle.render_cache import RenderCache, recorded
 
 log = logging.getLogger(__name__)
 
 
-def get_template_contexts(file_path):
-    try:
-        with open(file_path) as f:
+class RenderedTemplate:
+    """
+    Output of a template rendered in memory, path is where it's written if it's kept on disk. Its documents are parsed
+    once, readers get copies of them as they modify documents. cached tells whether the output is taken from
+    the render cache, it's None if the template isn't cached.
+    """
+
+    def __init__(self, path, text, cached=None):
+        self.path = path
+        self.text = text
+        self.cached = cached
+        self._documents = None
+
+    @property
+    def documents(self):
+        if self._documents is None:
             try:
-                contexts = yaml.safe_load_all(f.read())
+                self._documents = list(yaml.safe_load_all(self.text))
             except Exception as e:
-                raise RuntimeError('Unable to load yaml file: {}, {}'.format(file_path, e))
-
-            for context in contexts:
-                if context is None:
-                    continue  # Skip empty YAML documents
-                if 'kind' not in context or context['kind'] is None:
-                    raise RuntimeError('Field "kind" not found (or empty) in file "{}"'.format(file_path))
-                if 'metadata' not in context or context['metadata'] is None:
-                    raise RuntimeError('Field "metadata" not found (or empty) in file "{}"'.format(file_path))
-                if 'name' not in context['metadata'] or context['metadata']['name'] is None:
-                    raise RuntimeError('Field "metadata->name" not found (or empty) in file "{}"'.format(file_path))
-                if 'spec' in context:
-                    # INFO: Set replicas = 1 by default for replaces cases in Deployment and StatefulSet
-                    if 'replicas' not in context['spec'] or context['spec']['replicas'] is None:
-                        if context['kind'] in ['Deployment', 'StatefulSet']:
-                            context['spec']['replicas'] = 1
-                yield context
+                raise RuntimeError('Unable to load yaml file: {}, {}'.format(self.path, e))
+
+        return self._documents
+
+    def __str__(self):
+        return self.path
+
+
+def _load_contexts(file_path):
+    if isinstance(file_path, RenderedTemplate):
+        return [copy.deepcopy(document) for document in file_path.documents]
+
+    with open(file_path) as f:
+        try:
+            return yaml.safe_load_all(f.read())
+        except Exception as e:
+            raise RuntimeError('Unable to load yaml file: {}, {}'.format(file_path, e))
+
+
+def get_template_contexts(file_path):
+    """
+    Yields resources of a rendered template, file_path is either a path of its file or a RenderedTemplate.
+    """
+    try:
+        contexts = _load_contexts(file_path)
+
+        for context in contexts:
+            if context is None:
+                continue  # Skip empty YAML documents
+            if 'kind' not in context or context['kind'] is None:
+                raise RuntimeError('Field "kind" not found (or empty) in file "{}"'.format(file_path))
+            if 'metadata' not in context or context['metadata'] is None:
+                raise RuntimeError('Field "metadata" not found (or empty) in file "{}"'.format(file_path))
+            if 'name' not in context['metadata'] or context['metadata']['name'] is None:
+                raise RuntimeError('Field "metadata->name" not found (or empty) in file "{}"'.format(file_path))
+            if 'spec' in context:
+                # INFO: Set replicas = 1 by default for replaces cases in Deployment and StatefulSet
+                if 'replicas' not in context['spec'] or context['spec']['replicas'] is None:
+                    if context['kind'] in ['Deployment', 'StatefulSet']:
+                        context['spec']['replicas'] = 1
+            yield context
     except FileNotFoundError as e:
         raise RuntimeError(e)
 
@@ -63,6 +104,49 @@ def to_yaml(data, flow_style=True, width=99999):
     return yaml.safe_dump(data, default_flow_style=flow_style, width=width)
 
 
+class BoundedBytecodeCache(FileSystemBytecodeCache):
+    """
+    On-disk cache of compiled templates shared by runs. Bytecode is kept per path and content of a template, so versions
+    of it, e.g. of different branches, don't replace each other, and mtime is not used as checkouts reset it. Files
+    used least recently are removed when the cache exceeds max_size bytes.
+    """
+
+    PATTERN = '__k8s_handle_%s.cache'
+
+    def __init__(self, directory, max_size):
+        os.makedirs(directory, exist_ok=True)
+        FileSystemBytecodeCache.__init__(self, directory, self.PATTERN)
+        self.max_size = max_size
+        self.prune()
+
+    def get_bucket(self, environment, name, filename, source):
+        return FileSystemBytecodeCache.get_bucket(
+            self, environment, name, '{}|{}'.format(filename, self.get_source_checksum(source)), source)
+
+    def load_bytecode(self, bucket):
+        FileSystemBytecodeCache.load_bytecode(self, bucket)
+
+        if bucket.code is not None:
+            try:
+                os.utime(self._get_cache_filename(bucket))
+            except OSError:
+                pass
+
+    def prune(self):
+        prune_directory(self.directory, self.PATTERN % '*', self.max_size)
+
+
+def get_bytecode_cache():
+    if not settings.TEMPLATES_CACHE_DIR:
+        return None
+
+    try:
+        return BoundedBytecodeCache(settings.TEMPLATES_CACHE_DIR, settings.TEMPLATES_CACHE_MAX_SIZE)
+    except OSError as e:
+        log.warning('Unable to use cache of templates in "{}": {}'.format(settings.TEMPLATES_CACHE_DIR, e))
+        return None
+
+
 def get_env(templates_dir):
     # https://stackoverflow.com/questions/9767585/insert-static-files-literally-into-jinja-templates-without-parsing-them
     def include_file(path):
@@ -83,25 +167,71 @@ def get_env(templates_dir):
 
     env = Environment(
         undefined=StrictUndefined,
-        loader=FileSystemLoader([templates_dir]))
+        loader=FileSystemLoader([templates_dir]),
+        bytecode_cache=get_bytecode_cache())
 
     env.filters['b64decode'] = b64decode
     env.filters['b64encode'] = b64encode
     env.filters['hash_sha256'] = hash_sha256
     env.filters['to_yaml'] = to_yaml
-    env.globals['include_file'] = include_file
-    env.globals['list_files'] = list_files
+    # files read by templates are dependencies of their outputs in the render cache
+    env.globals['include_file'] = recorded(env, 'include_file', include_file)
+    env.globals['list_files'] = recorded(env, 'list_files', list_files)
 
     log.debug('Available templates in path {}: {}'.format(templates_dir, env.list_templates()))
     return env
 
 
+def get_render_cache(env):
+    if not settings.RENDER_CACHE_DIR:
+        return None
+
+    try:
+        return RenderCache(env, settings.RENDER_CACHE_DIR, settings.RENDER_CACHE_MAX_SIZE)
+    except OSError as e:
+        log.warning('Unable to use render cache in "{}": {}'.format(settings.RENDER_CACHE_DIR, e))
+        return None
+
+
+# settings used by rendering, they're passed to worker processes as spawned processes don't inherit ones set by args
+WORKER_SETTINGS = ['TEMP_DIR', 'TEMPLATES_CACHE_DIR', 'TEMPLATES_CACHE_MAX_SIZE', 'RENDER_CACHE_DIR',
+                   'RENDER_CACHE_MAX_SIZE']
+
+# renderer and context of a worker process of Renderer, they're set once per process by _init_worker
+_worker_renderer = None
+_worker_context = None
+
+
+def _init_worker(templates_dir, context, worker_settings):
+    global _worker_renderer, _worker_context
+
+    for name, value in worker_settings.items():
+        setattr(settings, name, value)
+
+    _worker_renderer = Renderer(templates_dir)
+    _worker_context = context
+
+
+def _render_in_worker(template, directory, keep):
+    rendered = _worker_renderer._render_entry(template, directory, _worker_context, keep)
+
+    try:
+        # documents are parsed in the worker as well, errors are raised when they're read by the executor
+        rendered.documents
+    except RuntimeError:
+        pass
+
+    return rendered
+
+
 class Renderer:
-    def __init__(self, templates_dir, tags=None, tags_skip=None):
+    def __init__(self, templates_dir, tags=None, tags_skip=None, jobs=1):
         self._templates_dir = templates_dir
         self._tags = tags
         self._tags_skip = tags_skip
+        self._jobs = jobs
         self._env = get_env(self._templates_dir)
+        self._cache = get_render_cache(self._env)
 
     def _iterate_entries(self, entries, tags=None):
         if tags is None:
@@ -137,6 +267,13 @@ class Renderer:
         return output
 
     def generate_by_context(self, context):
+        rendered = self.render_by_context(context, keep=True)
+        return None if rendered is None else [template.path for template in rendered]
+
+    def templates_by_context(self, context):
+        """
+        Returns entries of templates of the context selected by tags, None if the context has no templates.
+        """
         if context is None:
             raise RuntimeError('Can\'t generate templates from None context')
 
@@ -144,48 +281,92 @@ class Renderer:
         if len(templates) == 0:
             templates = context.get('kubectl', [])
             if len(templates) == 0:
-                return
+                return None
+
+        return list(self._iterate_entries(templates))
+
+    def render_by_context(self, context, keep=False):
+        """
+        Returns templates of the context rendered in memory, they're written to TEMP_DIR as well if keep is set.
+        """
+        entries = self.templates_by_context(context)
+        if entries is None:
+            return
+
+        jobs = min(self._jobs, len(entries))
+
+        if jobs <= 1:
+            output = [self._render_entry(template, settings.TEMP_DIR, context, keep) for template in entries]
+        else:
+            # Jinja rendering is CPU bound, so templates are rendered by processes, each with its own environment
+            worker_settings = {name: getattr(settings, name) for name in WORKER_SETTINGS}
+
+            with ProcessPoolExecutor(jobs, initializer=_init_worker,
+                                     initargs=(self._templates_dir, context, worker_settings)) as pool:
+                output = list(pool.map(_render_in_worker, entries, [settings.TEMP_DIR] * len(entries),
+                                       [keep] * len(entries)))
+
+        if self._cache is not None:
+            log.info('Render cache: {} hits, {} misses, {} templates not cacheable'.format(
+                sum(1 for rendered in output if rendered.cached is True),
+                sum(1 for rendered in output if rendered.cached is False),
+                sum(1 for rendered in output if rendered.cached is None)))
 
-        output = []
-        for template in self._iterate_entries(templates):
-            try:
-                path = self._generate_file(template, settings.TEMP_DIR, context)
-                log.info('File "{}" successfully generated'.format(path))
-                output.append(path)
-            except TemplateNotFound as e:
-                raise TemplateRenderingError(
-                    "Processing {}: template {} hasn't been found".format(template['template'], e.name))
-            except (UndefinedError, TemplateSyntaxError) as e:
-                raise TemplateRenderingError('Unable to render {}, due to: {}'.format(template, e))
         return output
 
-    def _generate_file(self, item, directory, context):
+    def _render(self, name, context):
+        if self._cache is None:
+            return self._env.get_template(name).render(context), None
+
+        return self._cache.render(name, context)
+
+    def _render_entry(self, template, directory, context, keep):
+        try:
+            rendered = self._generate_file(template, directory, context, keep)
+            if keep:
+                log.info('File "{}" successfully generated'.format(rendered))
+            return rendered
+        except TemplateNotFound as e:
+            raise TemplateRenderingError(
+                "Processing {}: template {} hasn't been found".format(template['template'], e.name))
+        except (UndefinedError, TemplateSyntaxError) as e:
+            raise TemplateRenderingError('Unable to render {}, due to: {}'.format(template, e))
+
+    def _generate_file(self, item, directory, context, keep=True):
         try:
-            log.info('Trying to generate file from template "{}" in "{}"'.format(item['template'], directory))
-            template = self._env.get_template(item['template'])
+            name = item['template']
+        except KeyError:
+            raise RuntimeError('Templates section doesn\'t have any template items')
+
+        try:
+            if keep:
+                log.info('Trying to generate file from template "{}" in "{}"'.format(name, directory))
+            else:
+                log.info('Rendering template "{}"'.format(name))
+            text, cached = self._render(name, context)
         except TemplateNotFound as e:
             log.info('Templates path: {}, available templates: {}'.format(self._templates_dir,
                                                                           self._env.list_templates()))
             raise e
-        except KeyError:
-            raise RuntimeError('Templates section doesn\'t have any template items')
 
-        new_name = item['template'].replace('.j2', '')
-        path = os.path.join(directory, new_name)
+        rendered = RenderedTemplate(os.path.join(directory, name.replace('.j2', '')), text, cached)
+
+        if not keep:
+            return rendered
 
         try:
-            if not os.path.exists(os.path.dirname(path)):
-                os.makedirs(os.path.dirname(path))
+            # directories may be made by other processes rendering templates at the same time
+            os.makedirs(os.path.dirname(rendered.path), exist_ok=True)
 
-            with open(path, 'w+') as f:
-                f.write(template.render(context))
+            with open(rendered.path, 'w+') as f:
+                f.write(rendered.text)
 
         except TemplateRenderingError:
             raise
         except (FileNotFoundError, PermissionError) as e:
             raise RuntimeError(e)
 
-        return path
+        return rendered
 
     @staticmethod
     def _get_template_tags(template):
@@ -240,6 +240,12 @@ class TestPriorityEvaluation(unittest.TestCase):
         self.assertEqual(evaluator.k8s_namespace_default(), VALUE_ENV)
         self.assertEqual(evaluator.k8s_namespace_default(KUBECONFIG_NAMESPACE), KUBECONFIG_NAMESPACE)
 
+    def test_k8s_rate_limits(self):
+        evaluator = PriorityEvaluator({'k8s_qps': 20}, {'k8s_qps': 5, 'k8s_burst': '30'}, {'K8S_MAX_IN_FLIGHT': '4'})
+        self.assertEqual(evaluator.k8s_rate_limits(), (20.0, 30, 4))
+        self.assertEqual(PriorityEvaluator({}, {}, {}).k8s_rate_limits(),
+                         (settings.K8S_QPS, settings.K8S_BURST, settings.K8S_MAX_IN_FLIGHT))
+
     def test_k8s_client_configuration_missing_uri(self):
         evaluator = PriorityEvaluator({KEY_K8S_CA_BASE64: VALUE_CLI, KEY_K8S_TOKEN: VALUE_CLI}, {}, {})
 
@@ -18,10 +18,10 @@ class TestDeployHandler(unittest.TestCase):
 
     @patch('k8s_handle.templating.Renderer._generate_file')
     @patch('kubernetes.client.api.version_api.VersionApi.get_code_with_http_info')
-    @patch('k8s_handle.k8s.provisioner.Provisioner.run')
+    @patch('k8s_handle.k8s.provisioner.Provisioner.run_all')
     def test_api_exception_handling(
         self,
-        mocked_provisioner_run,
+        mocked_provisioner_run_all,
         mocked_client_version_api_get_code,
         mocked_generate_file
     ):
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from k8s_handle import settings
+from k8s_handle import templating
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.templates_dir = os.path.join(self.directory, 'templates')
+        os.makedirs(self.templates_dir)
+        settings.RENDER_CACHE_DIR = os.path.join(self.directory, 'cache')
+
+        self._write('templates/deployment.yaml.j2', 'name: {{ name }}\n{% include "labels.yaml.j2" %}\n'
+                                                    'config: {{ include_file("files/*.txt") }}')
+        self._write('templates/labels.yaml.j2', 'app: {{ app }}')
+        self._write('templates/dynamic.yaml.j2', '{% include template_name %}')
+        self._write('files/config.txt', 'value')
+        self.context = {'name': 'test', 'app': 'handle', 'unused': 1, 'template_name': 'labels.yaml.j2',
+                        'templates': [{'template': 'deployment.yaml.j2'}]}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        settings.RENDER_CACHE_DIR = None
+
+    def _write(self, path, text):
+        path = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def _render(self, **changes):
+        rendered, = templating.Renderer(self.templates_dir).render_by_context(dict(self.context, **changes))
+        return rendered
+
+    def test_hit(self):
+        first = self._render()
+        self.assertFalse(first.cached)
+        self.assertEqual(first.text, 'name: test\napp: handle\nconfig: value')
+
+        with self.assertLogs('k8s_handle.templating', level='INFO') as logs:
+            second = self._render(unused=2)
+
+        self.assertTrue(second.cached)
+        self.assertEqual(second.text, first.text)
+        self.assertIn('Render cache: 1 hits, 0 misses, 0 templates not cacheable', logs.output[-1])
+
+    def test_miss(self):
+        self._render()
+
+        self.assertFalse(self._render(app='changed').cached)
+
+        self._write('templates/labels.yaml.j2', 'app: {{ app }}-changed')
+        rendered = self._render(app='changed')
+        self.assertFalse(rendered.cached)
+        self.assertEqual(rendered.text, 'name: test\napp: changed-changed\nconfig: value')
+
+        self._write('files/other.txt', 'other')
+        rendered = self._render(app='changed')
+        self.assertFalse(rendered.cached)
+        self.assertEqual(rendered.text, 'name: test\napp: changed-changed\nconfig: value\nother')
+        self.assertTrue(self._render(app='changed').cached)
+
+    def test_not_cacheable(self):
+        rendered = self._render(templates=[{'template': 'dynamic.yaml.j2'}])
+        self.assertIsNone(rendered.cached)
+        self.assertEqual(rendered.text, 'app: handle')
+
+    def test_missing_include(self):
+        self._write('templates/optional.yaml.j2', 'name: {{ name }}\n{% include "extra.yaml.j2" ignore missing %}')
+        templates = [{'template': 'optional.yaml.j2'}]
+        self.assertEqual(self._render(templates=templates).text, 'name: test\n')
+        self.assertTrue(self._render(templates=templates).cached)
+
+        self._write('templates/extra.yaml.j2', 'app: {{ app }}')
+        rendered = self._render(templates=templates)
+        self.assertFalse(rendered.cached)
+        self.assertEqual(rendered.text, 'name: test\napp: handle')
+
+    def test_render_jobs(self):
+        self._render()
+        templates = [{'template': 'deployment.yaml.j2'}, {'template': 'labels.yaml.j2'}]
+        rendered = templating.Renderer(self.templates_dir, jobs=2).render_by_context(
+            dict(self.context, templates=templates))
+
+        self.assertEqual([r.cached for r in rendered], [True, False])
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import yaml
+
+from k8s_handle import settings
+from k8s_handle.filesystem import load_yaml
+from k8s_handle.template_graph import TemplateGraph, affected
+
+
+class TestTemplateGraph(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.templates_dir = os.path.join(self.directory, 'templates')
+        self.config_file = os.path.join(self.directory, 'config.yaml')
+        self._settings = settings.CONFIG_FILE, settings.TEMPLATES_DIR
+        settings.CONFIG_FILE, settings.TEMPLATES_DIR = self.config_file, self.templates_dir
+
+        self._write('templates/deployment.yaml.j2', '{% include "labels.yaml.j2" %}\nimage: {{ image }}')
+        self._write('templates/labels.yaml.j2', '{% import "macros.j2" as m %}app: {{ m.name(app) }}')
+        self._write('templates/macros.j2', '{% macro name(value) %}{{ value }}{% endmacro %}')
+        self._write('templates/configmap.yaml.j2', 'data: {{ include_file("files/*.conf") }}\n'
+                                                   'list: {{ list_files("scripts") }}\nsettings: {{ settings }}')
+        self._write('templates/dynamic.yaml.j2', '{% include name ~ ".yaml.j2" %}')
+        self._write('files/app.conf', 'value')
+        self._write('scripts/run.sh', 'run')
+        self._write('settings.yaml', 'key: value')
+        self.config = {
+            'common': {'k8s_namespace': 'test', 'settings': "{{ file='%s' }}" % self._path('settings.yaml')},
+            'section-1': {'image': 'app:1', 'app': 'app', 'templates': [{'template': 'deployment.yaml.j2'},
+                                                                        {'template': 'configmap.yaml.j2'}]},
+            'section-2': {'name': 'labels', 'app': 'app', 'templates': [{'template': 'dynamic.yaml.j2'}]},
+        }
+        self._write('config.yaml', yaml.safe_dump(self.config))
+
+    def tearDown(self):
+        settings.CONFIG_FILE, settings.TEMPLATES_DIR = self._settings
+        shutil.rmtree(self.directory)
+
+    def _path(self, path):
+        return os.path.join(self.directory, path)
+
+    def _write(self, path, text):
+        os.makedirs(os.path.dirname(self._path(path)), exist_ok=True)
+
+        with open(self._path(path), 'w') as f:
+            f.write(text)
+
+    def _change_config(self, section, **changes):
+        base_config = self._path('base.yaml')
+        shutil.copy(self.config_file, base_config)
+        self.config[section].update(changes)
+        self._write('config.yaml', yaml.safe_dump(self.config))
+        return base_config
+
+    def test_dependencies(self):
+        dependencies = TemplateGraph(self.templates_dir).dependencies('deployment.yaml.j2')
+
+        self.assertEqual(dependencies.templates, {'deployment.yaml.j2', 'labels.yaml.j2', 'macros.j2'})
+        self.assertEqual(dependencies.variables, {'image', 'app'})
+        self.assertFalse(dependencies.dynamic_templates)
+
+        dependencies = TemplateGraph(self.templates_dir).dependencies('configmap.yaml.j2')
+        self.assertEqual(dependencies.files, {'files/*.conf', 'scripts'})
+        self.assertEqual(dependencies.variables, {'settings'})
+
+    def test_affected_by_templates(self):
+        self.assertEqual(affected([self._path('templates/macros.j2')]),
+                         {'section-1': ['deployment.yaml.j2'], 'section-2': ['dynamic.yaml.j2']})
+        # templates included by names from variables may be any template
+        self.assertEqual(affected([self._path('templates/configmap.yaml.j2')]),
+                         {'section-1': ['configmap.yaml.j2'], 'section-2': ['dynamic.yaml.j2']})
+        self.assertEqual(affected([self._path('README.md')]), {})
+
+    def test_affected_by_files(self):
+        self.assertEqual(affected([self._path('files/new.conf')]), {'section-1': ['configmap.yaml.j2']})
+        self.assertEqual(affected([self._path('scripts/run.sh')]), {'section-1': ['configmap.yaml.j2']})
+        self.assertEqual(affected([self._path('files/app.txt')]), {})
+        self.assertEqual(affected([self._path('settings.yaml')]), {'section-1': ['configmap.yaml.j2']})
+
+    def test_affected_by_config(self):
+        base_config = self._change_config('section-1', image='app:2')
+        self.assertEqual(affected([self.config_file], base_config=base_config), {'section-1': ['deployment.yaml.j2']})
+
+        # without the config before the changes all templates are affected
+        self.assertEqual(affected([self.config_file], sections=['section-2']), {'section-2': ['dynamic.yaml.j2']})
+
+        base_config = self._change_config('section-2', templates=[{'template': 'dynamic.yaml.j2'},
+                                                                  {'template': 'configmap.yaml.j2'}])
+        self.assertEqual(affected([self.config_file], base_config=base_config), {'section-2': ['configmap.yaml.j2']})
+
+        base_config = self._change_config('section-1', k8s_namespace='other')
+        self.assertEqual(affected([self.config_file], base_config=base_config),
+                         {'section-1': ['deployment.yaml.j2', 'configmap.yaml.j2']})
+
+    def test_affected_skips_sections(self):
+        self.config['section-3'] = {'image': 'app:3'}
+        self._write('config.yaml', yaml.safe_dump(self.config))
+        base_config = self._change_config('section-1', image='app:2')
+
+        with patch('k8s_handle.template_graph.load_yaml', wraps=load_yaml) as mocked_load_yaml:
+            self.assertEqual(affected([self.config_file], base_config=base_config),
+                             {'section-1': ['deployment.yaml.j2']})
+
+        # the base config is read once for all sections, so it may be a pipe
+        self.assertEqual([call.args[0] for call in mocked_load_yaml.call_args_list], [self.config_file, base_config])
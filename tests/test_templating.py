@@ -1,7 +1,13 @@
+import glob
+import multiprocessing
 import os
 import yaml
 import shutil
+import tempfile
 import unittest
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from unittest.mock import patch
 from k8s_handle import settings
 from k8s_handle import config
 from k8s_handle import templating
@@ -64,6 +70,30 @@ class TestTemplating(unittest.TestCase):
             content = f.read()
         self.assertEqual(content, "test: |\n  template1.yaml.j2:\n  my_file.txt:\n  my_file1.txt:\n  ")
 
+    def test_render_templates_in_memory(self):
+        r = templating.Renderer(os.path.join(os.path.dirname(__file__), 'templates_tests'))
+        rendered = {template.path: template for template in r.render_by_context(
+            config.load_context_section('test_groups'))}
+        self.assertEqual(rendered['{}/template3.yaml'.format(settings.TEMP_DIR)].text, 'My value')
+        self.assertFalse(os.path.exists(settings.TEMP_DIR))
+
+        r.render_by_context(config.load_context_section('test_groups'), keep=True)
+        self.assertTrue(os.path.exists('{}/template3.yaml'.format(settings.TEMP_DIR)))
+
+    def test_rendered_template_contexts(self):
+        rendered = templating.RenderedTemplate('/tmp/deployment.yaml',
+                                               'kind: Deployment\nmetadata: {name: test}\nspec: {}\n---\n')
+        first = list(templating.get_template_contexts(rendered))
+        self.assertEqual(first, [{'kind': 'Deployment', 'metadata': {'name': 'test'}, 'spec': {'replicas': 1}}])
+
+        # documents are parsed once, every reader gets its own copy
+        first[0]['metadata']['name'] = 'changed'
+        self.assertEqual(next(templating.get_template_contexts(rendered))['metadata']['name'], 'test')
+
+        with self.assertRaises(RuntimeError) as context:
+            list(templating.get_template_contexts(templating.RenderedTemplate('/tmp/invalid.yaml', 'a: [')))
+        self.assertIn('Unable to load yaml file: /tmp/invalid.yaml', str(context.exception))
+
     def test_no_templates_in_kubectl(self):
         r = templating.Renderer(os.path.join(os.path.dirname(__file__), 'templates_tests'))
         with self.assertRaises(RuntimeError) as context:
@@ -196,3 +226,93 @@ class TestTemplating(unittest.TestCase):
         with open(result, 'r') as f:
             actual = yaml.safe_load(f)
         self.assertEqual('do this', actual)
+
+    def test_render_jobs(self):
+        context = config.load_context_section('test_dirs')
+        templates_dir = os.path.join(os.path.dirname(__file__), 'templates_tests')
+        serial = templating.Renderer(templates_dir).render_by_context(context)
+        parallel = templating.Renderer(templates_dir, jobs=4).render_by_context(context)
+
+        self.assertEqual([(t.path, t.text) for t in parallel], [(t.path, t.text) for t in serial])
+        rendered = {t.path: t for t in parallel}
+        self.assertEqual(rendered['{}/template3.yaml'.format(settings.TEMP_DIR)].documents, ['My value'])
+        self.assertFalse(os.path.exists(settings.TEMP_DIR))
+
+        templating.Renderer(templates_dir, jobs=4).generate_by_context(context)
+        self.assertTrue(os.path.exists('{}/template3.yaml'.format(settings.TEMP_DIR)))
+
+    def test_render_jobs_spawn(self):
+        templates_dir = os.path.join(os.path.dirname(__file__), 'templates_tests')
+        context = {'templates': [{'template': 'template3.yaml.j2'}, {'template': 'template1.yaml.j2'}],
+                   'my_file': 'value'}
+        directory = tempfile.mkdtemp()
+        settings.TEMP_DIR, temp_dir = os.path.join(directory, 'rendered'), settings.TEMP_DIR
+        settings.RENDER_CACHE_DIR = os.path.join(directory, 'cache')
+
+        try:
+            with patch('k8s_handle.templating.ProcessPoolExecutor',
+                       partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn'))):
+                paths = templating.Renderer(templates_dir, jobs=2).generate_by_context(context)
+
+            with open(os.path.join(settings.TEMP_DIR, 'template1.yaml')) as f:
+                self.assertEqual(f.read(), 'value')
+            self.assertEqual(len(glob.glob(os.path.join(settings.RENDER_CACHE_DIR, 'render-*.json'))), len(paths))
+        finally:
+            settings.TEMP_DIR, settings.RENDER_CACHE_DIR = temp_dir, None
+            shutil.rmtree(directory)
+
+    def test_render_jobs_error(self):
+        r = templating.Renderer(os.path.join(os.path.dirname(__file__), 'templates_tests'), jobs=2)
+        with self.assertRaises(TemplateRenderingError) as context:
+            r.render_by_context({'templates': [{'template': 'template3.yaml.j2'}, {'template': 'template4.yaml.j2'}]})
+        self.assertTrue('due to: \'undefined_variable\' is undefined' in str(context.exception))
+
+
+class TestBytecodeCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.templates_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        shutil.rmtree(self.templates_dir)
+        settings.TEMPLATES_CACHE_DIR = None
+
+    def _write_template(self, source):
+        with open(os.path.join(self.templates_dir, 'template.yaml.j2'), 'w') as f:
+            f.write(source)
+
+    def _render(self):
+        return templating.get_env(self.templates_dir).get_template('template.yaml.j2').render(name='test')
+
+    def test_cache(self):
+        settings.TEMPLATES_CACHE_DIR = self.cache_dir
+        self._write_template('name: {{ name }}')
+        self.assertEqual(self._render(), 'name: test')
+        cached = os.listdir(self.cache_dir)
+        self.assertEqual(len(cached), 1)
+
+        self.assertEqual(self._render(), 'name: test')
+        self.assertEqual(os.listdir(self.cache_dir), cached)
+
+        # changed template is compiled again, bytecode of its previous version is kept
+        self._write_template('name: {{ name }}-changed')
+        self.assertEqual(self._render(), 'name: test-changed')
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_prune(self):
+        os.makedirs(self.cache_dir)
+        pattern = templating.BoundedBytecodeCache.PATTERN
+
+        for i in range(3):
+            path = os.path.join(self.cache_dir, pattern % i)
+            with open(path, 'wb') as f:
+                f.write(b'0' * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+
+        templating.BoundedBytecodeCache(self.cache_dir, 250)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), [pattern % 1, pattern % 2])
+
+    def test_no_cache(self):
+        self.assertIsNone(templating.get_env(self.templates_dir).bytecode_cache)